@@ -1,7 +1,7 @@
 """
 Database adapter layer for managing different database connections.
 """
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import pandas as pd
 import redis
 from sqlalchemy import create_engine, text
@@ -55,13 +55,15 @@ class DatabaseAdapter:
             logger.error(f"Error storing DataFrame: {str(e)}")
             return False
             
-    def query_db2(self, connection_name: str, query: str) -> Optional[pd.DataFrame]:
-        """Execute query on DB2 database."""
+    def query_db2(self, connection_name: str, query: str, params: Optional[Dict[str, Any]] = None) -> Optional[pd.DataFrame]:
+        """Execute query on DB2 database, binding ``params`` to its :name placeholders."""
         try:
             if connection_name not in self.db_connections:
                 raise ValueError(f"Connection {connection_name} not found")
                 
             engine = self.db_connections[connection_name]
+            if params:
+                return pd.read_sql(text(query), engine, params=params)
             return pd.read_sql(query, engine)
         except Exception as e:
             logger.error(f"Error executing query: {str(e)}")
@@ -95,6 +97,35 @@ class DatabaseAdapter:
             logger.error(f"Error retrieving cached data: {str(e)}")
             return None
             
+    def get_cached_many(self, connection_name: str, keys: List[str]) -> List[Optional[str]]:
+        """Retrieve several cached values from Redis in one round trip."""
+        try:
+            if connection_name not in self.redis_clients:
+                raise ValueError(f"Redis connection {connection_name} not found")
+            if not keys:
+                return []
+            
+            redis_client = self.redis_clients[connection_name]
+            return redis_client.mget(keys)
+        except Exception as e:
+            logger.error(f"Error retrieving cached data: {str(e)}")
+            return [None] * len(keys)
+    
+    def cache_many(self, connection_name: str, values: Dict[str, Any]) -> bool:
+        """Cache several values in Redis in one pipelined round trip."""
+        try:
+            if connection_name not in self.redis_clients:
+                raise ValueError(f"Redis connection {connection_name} not found")
+            if not values:
+                return True
+            
+            redis_client = self.redis_clients[connection_name]
+            redis_client.mset({key: str(value) for key, value in values.items()})
+            return True
+        except Exception as e:
+            logger.error(f"Error caching data: {str(e)}")
+            return False
+    
     def close_connections(self):
         """Close all database connections."""
         for engine in self.db_connections.values():
@@ -2,6 +2,9 @@ import pandas as pd
 import numpy as np
 from .base_agent import BaseAgent
 from utils.config import load_config
+from utils.row_fingerprint import RowFingerprints
+from utils.cleaning_plan import Step, compile_plan, PARALLEL_MIN_CELLS
+from utils.text_normalization import text_options
 
 class CleaningAgent(BaseAgent):
     def __init__(self):
@@ -16,76 +19,78 @@ class CleaningAgent(BaseAgent):
     def cleanup(self):
         pass
     
-    def get_statistics(self, df):
-        """Get basic statistics about the dataset."""
+    def get_statistics(self, df, fingerprints=None):
+        """Get basic statistics about the dataset.
+        
+        Pass the frame's RowFingerprints to count duplicates without rehashing it.
+        """
+        fingerprints = fingerprints or RowFingerprints(df)
         return {
             "rows": len(df),
             "columns": len(df.columns),
-            "missing_values": df.isna().sum().sum(),
-            "duplicates": df.duplicated().sum()
+            "missing_values": int(df.isna().sum().sum()),
+            "duplicates": fingerprints.duplicate_count()
         }
     
-    def clean_dataset(self, df, options):
-        """Clean the dataset based on provided options."""
-        cleaning_report = {"operations": []}
+    def clean_dataset(self, df, options, fingerprints=None, explain=False):
+        """Clean the dataset based on provided options.
         
-        # Make a copy of the dataframe
-        cleaned_df = df.copy()
+        The operations are compiled into a CleaningPlan, which fuses the
+        per-column passes and leaves ``df`` unmodified. ``fingerprints`` of
+        ``df``, if given, are updated to follow the cleaned frame. With
+        ``explain`` the report includes the plan and its timings.
+        """
+        cleaning_report = {"operations": []}
+        steps = []
+        reports = []
         
         # Remove duplicates
         if options.get('removeDuplicates', True):
-            initial_rows = len(cleaned_df)
-            cleaned_df = cleaned_df.drop_duplicates()
-            rows_removed = initial_rows - len(cleaned_df)
-            cleaning_report["operations"].append({
+            steps.append(Step('dedupe'))
+            reports.append(lambda step: {
                 "operation": "remove_duplicates",
-                "rows_affected": rows_removed
+                "rows_affected": plan.cells('dedupe')
             })
         
         # Handle missing values
         missing_strategy = options.get('handleMissingValues', 'impute')
         if missing_strategy == 'impute':
-            for column in cleaned_df.columns:
-                if cleaned_df[column].dtype in [np.number]:
-                    cleaned_df[column].fillna(cleaned_df[column].mean(), inplace=True)
-                else:
-                    cleaned_df[column].fillna(cleaned_df[column].mode()[0], inplace=True)
-            cleaning_report["operations"].append({
+            # Most frequent value of every column, numeric ones included
+            steps.append(Step('impute', df.columns, strategy='mode'))
+            reports.append(lambda step: {
                 "operation": "impute_missing_values",
                 "strategy": "mean/mode"
             })
         elif missing_strategy == 'remove':
-            initial_rows = len(cleaned_df)
-            cleaned_df = cleaned_df.dropna()
-            rows_removed = initial_rows - len(cleaned_df)
-            cleaning_report["operations"].append({
+            steps.append(Step('drop_missing'))
+            reports.append(lambda step: {
                 "operation": "remove_missing_values",
-                "rows_affected": rows_removed
+                "rows_affected": step.rows_in - step.rows_out
             })
         
         # Normalize text
         if options.get('normalizeText', True):
-            text_columns = cleaned_df.select_dtypes(include=['object']).columns
-            for column in text_columns:
-                cleaned_df[column] = cleaned_df[column].str.lower().str.strip()
-            cleaning_report["operations"].append({
+            text_columns = df.select_dtypes(include=['object']).columns
+            steps.append(Step('normalize_text', text_columns, **text_options(options.get('textOptions'))))
+            reports.append(lambda step: {
                 "operation": "normalize_text",
-                "columns_affected": len(text_columns)
+                "columns_affected": len(step.columns)
             })
         
         # Detect outliers
         if options.get('detectOutliers', True):
-            numeric_columns = cleaned_df.select_dtypes(include=[np.number]).columns
-            for column in numeric_columns:
-                mean = cleaned_df[column].mean()
-                std = cleaned_df[column].std()
-                cleaned_df[column] = cleaned_df[column].mask(
-                    np.abs(cleaned_df[column] - mean) > 3 * std,
-                    mean
-                )
-            cleaning_report["operations"].append({
+            numeric_columns = df.select_dtypes(include=[np.number]).columns
+            steps.append(Step('replace_outliers', numeric_columns, sigma=3))
+            reports.append(lambda step: {
                 "operation": "handle_outliers",
-                "columns_affected": len(numeric_columns)
+                "columns_affected": len(step.columns)
             })
         
-        return cleaned_df, cleaning_report
\ No newline at end of file
+        plan = compile_plan(steps, df)
+        cleaned_df = plan.execute(df, fingerprints, workers=self.config.get('workers', 1),
+                                  min_cells=self.config.get('parallel_min_cells', PARALLEL_MIN_CELLS))
+        cleaning_report["operations"] = [report(step) for report, step in zip(reports, steps)]
+        if explain:
+            cleaning_report["plan"] = plan.explain()
+        
+        return cleaned_df, cleaning_report
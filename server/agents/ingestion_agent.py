@@ -1,10 +1,47 @@
+import time
 import pandas as pd
 from .base_agent import BaseAgent
 from utils.config import load_config
+from utils.file_detection import detect_file_format, read_csv_kwargs
+from utils.arrow_csv import read_delimited
+from utils.excel_reader import iter_excel_batches, read_excel_sheet
+from utils.json_reader import JSON_EXTENSIONS, iter_json_batches, read_json_file
+
+
+def _chunk_dtypes(sample, text_columns=()):
+    """Reader dtypes that hold the text columns of every chunk of a CSV file
+    to the types of its first rows.
+    
+    The reader infers each chunk on its own, so a text column with a chunk of
+    digits only (zip codes, ids) would come back as numbers and lose leading
+    zeros. Text columns, columns with no values in ``sample`` yet and
+    ``text_columns`` are read as text. Numeric columns are left to the
+    reader: a chunk with missing values reads integers as floats, which the
+    Parquet writer takes back as integers without loss, and a chunk with text
+    in a numeric column is left for the writer to refuse.
+    """
+    return {col: str for col, dtype in sample.dtypes.items()
+            if dtype == object or sample[col].isna().all() or str(col) in text_columns}
+
+
+def _as_text(chunk, text_columns):
+    """Convert ``text_columns`` of a chunk to text, keeping missing values."""
+    columns = [col for col in chunk.columns if str(col) in text_columns]
+    if not columns:
+        return chunk
+    chunk = chunk.copy()
+    for col in columns:
+        chunk[col] = chunk[col].astype(str).where(chunk[col].notna())
+    return chunk
 
 class IngestionAgent(BaseAgent):
     def __init__(self):
         self.config = load_config()['agents']['ingestion']
+        self.batch_size = self.config.get('batch_size', 1000)
+        self.timeout = self.config.get('timeout', 300)
+        self.engine = self.config.get('engine', 'pandas')
+        self.dtype_backend = self.config.get('dtype_backend')
+        self.null_values = self.config.get('null_values')
     
     def initialize(self):
         pass
@@ -19,12 +56,68 @@ class IngestionAgent(BaseAgent):
         """Ingest data from a file."""
         try:
             if file_path.endswith('.csv'):
-                return pd.read_csv(file_path)
+                return self.read_text(file_path, detect_file_format(file_path, 'csv'))
             elif file_path.endswith(('.xlsx', '.xls')):
-                return pd.read_excel(file_path)
-            elif file_path.endswith('.json'):
-                return pd.read_json(file_path)
+                return read_excel_sheet(file_path)
+            elif file_path.endswith(tuple(f'.{ext}' for ext in JSON_EXTENSIONS)):
+                file_type = file_path.rsplit('.', 1)[1].lower()
+                return read_json_file(file_path, detect_file_format(file_path, file_type))
             else:
-                return pd.read_csv(file_path, sep='\t')
+                detection = detect_file_format(file_path, 'txt')
+                return self.read_text(file_path, dict(detection, delimiter='\t'))
         except Exception as e:
-            raise Exception(f"Error ingesting file: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Error ingesting file: {str(e)}")
+    
+    def read_text(self, file_path, detection, schema=None):
+        """Parse a delimited text file with the configured engine, using the stored schema if any."""
+        return read_delimited(file_path, detection, engine=self.engine, null_values=self.null_values,
+                              dtype_backend=self.dtype_backend, schema=schema)
+    
+    def iter_chunks(self, file_path, batch_size=None, timeout=None, detection=None, text_columns=()):
+        """
+        Stream data from a file as DataFrame chunks.
+        
+        Args:
+            file_path: path of the file to ingest
+            batch_size: rows per chunk (defaults to agents.ingestion.batch_size)
+            timeout: seconds allowed for the whole file (defaults to agents.ingestion.timeout)
+            detection: previously detected file format (detected from a sample if None)
+            text_columns: names of columns to read as text in every chunk
+        """
+        batch_size = batch_size or self.batch_size
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        
+        try:
+            for chunk in self._read_chunks(file_path, batch_size, detection, text_columns):
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Ingestion exceeded the {timeout}s timeout")
+                yield chunk
+        except TimeoutError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error ingesting file: {str(e)}")
+    
+    def _read_chunks(self, file_path, batch_size, detection=None, text_columns=()):
+        if file_path.endswith(('.csv', '.txt')):
+            file_type = file_path.rsplit('.', 1)[1].lower()
+            detection = detection or detect_file_format(file_path, file_type)
+            options = read_csv_kwargs(detection)
+            # Types come from the first batch and hold for all of them
+            sample = pd.read_csv(file_path, nrows=batch_size, **options)
+            dtypes = _chunk_dtypes(sample, text_columns)
+            with pd.read_csv(file_path, chunksize=batch_size, dtype=dtypes, **options) as reader:
+                yield from reader
+        elif file_path.endswith(('.xlsx', '.xls')):
+            sheet_name = (detection or {}).get('sheet_name')
+            for chunk in iter_excel_batches(file_path, sheet_name, batch_size):
+                yield _as_text(chunk, text_columns)
+        elif file_path.endswith(tuple(f'.{ext}' for ext in JSON_EXTENSIONS)):
+            file_type = file_path.rsplit('.', 1)[1].lower()
+            detection = detection or detect_file_format(file_path, file_type)
+            for chunk in iter_json_batches(file_path, detection, batch_size):
+                yield _as_text(chunk, text_columns)
+        else:
+            df = _as_text(self.ingest_file(file_path), text_columns)
+            for start in range(0, len(df), batch_size):
+                yield df.iloc[start:start + batch_size]
\ No newline at end of file
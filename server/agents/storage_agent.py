@@ -1,10 +1,26 @@
 import os
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
 import json
 from datetime import datetime
 from .base_agent import BaseAgent
 from utils.config import load_config
 from adapters.db_adapter import DatabaseAdapter
+from utils.parquet import (write_parquet, write_partitioned, open_dataset, filter_expression,
+                           delete_parquet, dataset_size, read_footer, resolve_codec, compact_parquet,
+                           COMMON_METADATA)
+from utils.codec_benchmark import benchmark_codecs, SAMPLE_ROWS
+from utils.errors import InvalidRequest
+from utils.schema_inference import infer_schema_chunks, apply_schema, date_formats, format_dates, SchemaMismatch
+from utils.dataframe_cache import dataframe_cache, file_key
+from storage.schema_catalog import save_schema, load_schema, delete_schema, SOURCE_STORAGE
+from storage.dataset_listing import list_datasets as list_catalog, sync_datasets
+from storage.hot_tier import HotTier
+from storage import database
+
+# SQL spelling of the comparison operators accepted in read filters
+SQL_OPERATORS = {'==': '=', '!=': '<>', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
 
 class StorageAgent(BaseAgent):
     def __init__(self):
@@ -12,6 +28,10 @@ class StorageAgent(BaseAgent):
         self.storage_dir = 'storage/datasets'
         os.makedirs(self.storage_dir, exist_ok=True)
         
+        # Memory-mapped copies of frequently read datasets, shared by worker processes
+        hot_config = dict(self.config.get('hot_tier') or {})
+        self.hot_tier = HotTier('storage/hot', **hot_config) if hot_config.pop('enabled', False) else None
+        
         # Initialize database adapter
         self.db_adapter = DatabaseAdapter(self.config)
         self._setup_connections()
@@ -35,51 +55,153 @@ class StorageAgent(BaseAgent):
     def cleanup(self):
         self.db_adapter.close_connections()
     
-    def store_dataset(self, df, dataset_name, storage_type='file'):
+    def store_dataset(self, df, dataset_name, storage_type='file', partition_by=None, codec=None, codec_level=None,
+                      date_formats=None, text_columns=()):
         """
         Store a dataset using the specified storage type.
         
         Args:
-            df: pandas DataFrame to store
+            df: pandas DataFrame, or an iterable of DataFrame chunks, to store,
+                or a function taking ``text_columns=`` and returning such an iterable,
+                with those columns read as text, so the data can be read again
             dataset_name: name of the dataset
             storage_type: 'file', 'db2', or 'both'
+            partition_by: column to partition the file by (None for a single file)
+            codec: 'zstd', 'snappy', 'lz4', 'gzip' or 'none' (None for
+                agents.storage.compression)
+            codec_level: compression level of the codec (None for its default)
+            date_formats: source format of each parsed date column, by name, for
+                data cleaned from a stored dataset (see infer_schema)
+            text_columns: names of columns to store as text
+        
+        Chunks are appended to the Parquet file as row groups of at most
+        agents.storage.row_group_size rows (and to the DB2 table batch by
+        batch), so memory use tracks the chunk size. With ``partition_by`` the
+        file becomes a hive-partitioned directory, one subdirectory per value.
+        Column types are inferred from the first chunk, applied to every chunk
+        and stored in the schema catalog. When a later chunk breaks a date
+        format found in the first, or has text in a column the first chunk
+        typed as numbers, data given as a function is read again with that
+        column as text; other data raises SchemaMismatch.
         """
         result = {"success": True, "storage_info": {}}
+        chunks = [df] if isinstance(df, pd.DataFrame) else df(text_columns=text_columns) if callable(df) else df
+        stats = {"rows": 0, "columns": [], "db2_success": True}
+        
+        def tee(chunks):
+            for i, chunk in enumerate(chunks):
+                if i == 0:
+                    stats["columns"] = list(chunk.columns)
+                stats["rows"] += len(chunk)
+                if storage_type in ('db2', 'both'):
+                    stored = self.db_adapter.store_dataframe('default', dataset_name, chunk,
+                                                             if_exists='replace' if i == 0 else 'append')
+                    stats["db2_success"] = stats["db2_success"] and stored
+                yield chunk
         
         try:
+            codec, codec_level = self._codec(codec, codec_level)
+            schema, chunks = infer_schema_chunks(chunks, text_columns, date_formats)
+            
             # Store in file system
             if storage_type in ('file', 'both'):
-                file_path = os.path.join(self.storage_dir, f"{dataset_name}.parquet")
-                df.to_parquet(file_path, compression='gzip' if self.config['compression'] else None)
+                row_group_size = self.config.get('row_group_size')
+                previous_path = self._dataset_path(dataset_name)
+                if partition_by:
+                    file_path = self._storage_path(dataset_name)
+                    write_info = write_partitioned(tee(chunks), file_path, partition_by, compression=codec,
+                                                   row_group_size=row_group_size, compression_level=codec_level)
+                else:
+                    file_path = self._storage_path(dataset_name, '.parquet')
+                    write_info = write_parquet(tee(chunks), file_path, compression=codec,
+                                               row_group_size=row_group_size, compression_level=codec_level)
+                if previous_path != file_path:
+                    # The dataset switched between the single-file and partitioned layouts
+                    delete_parquet(previous_path)
+                # Frames and hot copies of the previous version can never be hit again
+                dataframe_cache.invalidate(previous_path)
+                dataframe_cache.invalidate(file_path)
+                if self.hot_tier:
+                    self.hot_tier.evict(dataset_name)
                 result["storage_info"]["file"] = {
                     "path": file_path,
-                    "size": os.path.getsize(file_path)
+                    "size": dataset_size(file_path),
+                    "row_groups": write_info["row_groups"],
+                    "partition_by": partition_by,
+                    "codec": codec,
+                    "codec_level": codec_level
                 }
+            else:
+                for _ in tee(chunks):
+                    pass
             
             # Store in DB2
             if storage_type in ('db2', 'both'):
-                success = self.db_adapter.store_dataframe('default', dataset_name, df)
                 result["storage_info"]["db2"] = {
-                    "success": success,
+                    "success": stats["db2_success"],
                     "table": dataset_name
                 }
                 
             # Cache metadata in Redis
             metadata = {
                 "name": dataset_name,
-                "rows": len(df),
-                "columns": list(df.columns),
+                "rows": stats["rows"],
+                "columns": stats["columns"],
                 "storage_type": storage_type,
                 "last_modified": datetime.now().isoformat()
             }
+            if "file" in result["storage_info"]:
+                # Types and column statistics come from the footer just written
+                metadata = dict(self._file_metadata(dataset_name), storage_type=storage_type)
             self.db_adapter.cache_data('default', f"dataset:{dataset_name}:metadata", 
                                      json.dumps(metadata))
+            file_info = result["storage_info"].get("file", {})
+            save_schema(SOURCE_STORAGE, dataset_name, schema, 'parquet' if file_info else storage_type,
+                        file_info.get("path", dataset_name), file_info.get("size", 0), stats["rows"])
             
+            result["rows"] = stats["rows"]
+            result["columns"] = stats["columns"]
+            result["schema"] = schema
             return result
+        except SchemaMismatch as e:
+            if not callable(df) or e.column in text_columns:
+                raise
+            return self.store_dataset(df, dataset_name, storage_type, partition_by, codec, codec_level,
+                                      date_formats, set(text_columns) | {e.column})
+        except (TimeoutError, ValueError):
+            raise
         except Exception as e:
             raise Exception(f"Error storing dataset: {str(e)}")
     
-    def get_dataset(self, dataset_name, nrows=None, source='auto'):
+    def _codec(self, codec=None, level=None):
+        """Codec and level to write a dataset with: the requested ones, else the configured default."""
+        if codec is None:
+            codec = self.config.get('compression')
+            if level is None:
+                level = self.config.get('compression_level')
+            # Older configurations only switch (gzip) compression on or off
+            if isinstance(codec, bool):
+                codec, level = ('gzip', None) if codec else ('none', None)
+        return resolve_codec(codec, level)
+    
+    def benchmark_codecs(self, dataset_name, sample_rows=SAMPLE_ROWS):
+        """
+        Write a sample of a stored dataset with every codec and time it.
+        
+        Args:
+            dataset_name: name of the dataset
+            sample_rows: rows of the dataset to sample
+        
+        Returns:
+            list: size, write and read time per codec (see benchmark_codecs),
+                or None if the dataset does not exist
+        """
+        df = self.get_dataset(dataset_name, nrows=sample_rows, source='file')
+        if df is None:
+            return None
+        return benchmark_codecs(df, row_group_size=self.config.get('row_group_size'))
+    
+    def get_dataset(self, dataset_name, nrows=None, source='auto', categorical=True, columns=None, filters=None):
         """
         Retrieve a dataset from the specified source.
         
@@ -87,65 +209,268 @@ class StorageAgent(BaseAgent):
             dataset_name: name of the dataset
             nrows: number of rows to retrieve (None for all)
             source: 'file', 'db2', or 'auto' (tries DB2 first, then file)
+            categorical: return categorical candidates as ``category`` columns
+            columns: names of the columns to read (None for all)
+            filters: ``[(column, op, value), ...]`` conditions rows must all meet,
+                with op one of ==, !=, <, <=, >, >=, in, not in
+        
+        Columns get the types stored in the schema catalog. Parquet keeps them
+        already; DB2 tables lose dates and categories, which are restored here.
+        
+        Only the requested columns are decoded, and filters skip partitions and
+        row groups whose footer statistics rule them out. DB2 gets the same
+        request as a SELECT list and a parameterised WHERE clause. Rows of a
+        partitioned dataset come back grouped by partition.
+        
+        Frequently read files are promoted to the hot tier and then served from
+        a memory-mapped Arrow copy. With ``categorical=True`` numeric columns of
+        such frames point straight into the shared mapping and are read-only;
+        ``categorical=False`` returns writable columns.
         """
         try:
             df = None
+            # Validates the filters before anything is read
+            filter_expression(filters)
             
             # Try to get from DB2 first if source is auto or db2
             if source in ('auto', 'db2'):
-                query = f"SELECT * FROM {dataset_name}"
-                if nrows:
-                    query += f" FETCH FIRST {nrows} ROWS ONLY"
-                df = self.db_adapter.query_db2('default', query)
+                query, params = self._db2_query(dataset_name, nrows, columns, filters)
+                df = self.db_adapter.query_db2('default', query, params)
             
             # Try file if DB2 failed or if source is file
             if df is None and source in ('auto', 'file'):
-                file_path = os.path.join(self.storage_dir, f"{dataset_name}.parquet")
+                file_path = self._dataset_path(dataset_name)
                 if os.path.exists(file_path):
-                    df = pd.read_parquet(file_path)
-                    if nrows:
-                        df = df.head(nrows)
+                    if self.hot_tier:
+                        promote = self.hot_tier.record_read(dataset_name)
+                        table = self.hot_tier.read(dataset_name, file_path)
+                        if table is None and promote:
+                            table = open_dataset(file_path).to_table()
+                            self.hot_tier.promote(dataset_name, file_path, table)
+                            # Served from the shared copy from now on
+                            dataframe_cache.invalidate(file_path)
+                        if table is not None:
+                            table = self._scan(ds.dataset(table), nrows, columns, filters)
+                            df = table.to_pandas(split_blocks=True) if categorical else table.to_pandas().copy()
+                            return apply_schema(df, load_schema(SOURCE_STORAGE, dataset_name), categorical)
+                    
+                    schema = load_schema(SOURCE_STORAGE, dataset_name)
+                    key = file_key(file_path, schema, categorical)
+                    if not filters:
+                        cached = dataframe_cache.get(key, copy=False)
+                        if cached is not None and all(col in cached.columns for col in columns or []):
+                            cached = cached[columns] if columns else cached
+                            return (cached.head(nrows) if nrows else cached).copy()
+                    df = self._scan(open_dataset(file_path), nrows, columns, filters).to_pandas()
+                    if not (nrows or columns or filters):
+                        df = apply_schema(df, schema, categorical)
+                        dataframe_cache.put(key, df)
+                        return df
             
+            if df is not None:
+                df = apply_schema(df, load_schema(SOURCE_STORAGE, dataset_name), categorical)
             return df
+        except ValueError:
+            raise
         except Exception as e:
             raise Exception(f"Error retrieving dataset: {str(e)}")
     
-    def list_datasets(self):
-        """List all available datasets with their metadata."""
+    @staticmethod
+    def _scan(dataset, nrows=None, columns=None, filters=None):
+        """Read the requested columns and rows of a pyarrow dataset into a table."""
+        names = dataset.schema.names
+        unknown = [col for col in list(columns or []) + [f[0] for f in filters or []] if col not in names]
+        if unknown:
+            raise InvalidRequest(f"Unknown columns: {unknown}")
+        expression = filter_expression(filters)
         try:
+            if nrows:
+                # Stops decoding once enough rows were found
+                return dataset.head(nrows, columns=columns, filter=expression)
+            return dataset.to_table(columns=columns, filter=expression)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+            raise InvalidRequest(f"Invalid filters {filters}: {str(e)}")
+    
+    @staticmethod
+    def _db2_query(dataset_name, nrows=None, columns=None, filters=None):
+        """Build the SELECT statement and bind parameters of a DB2 read."""
+        def quote(name):
+            return '"' + str(name).replace('"', '""') + '"'
+        
+        def bind(value):
+            name = f"p{len(params)}"
+            params[name] = value
+            return f":{name}"
+        
+        select = ', '.join(quote(col) for col in columns) if columns else '*'
+        conditions = []
+        params = {}
+        for column, op, value in filters or []:
+            if op in ('in', 'not in'):
+                values = list(value)
+                if values:
+                    conditions.append(f"{quote(column)} {op.upper()} ({', '.join(bind(item) for item in values)})")
+                elif op == 'in':
+                    conditions.append("1 = 0")
+            else:
+                conditions.append(f"{quote(column)} {SQL_OPERATORS[op]} {bind(value)}")
+        
+        query = f"SELECT {select} FROM {dataset_name}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if nrows:
+            query += f" FETCH FIRST {int(nrows)} ROWS ONLY"
+        return query, params or None
+    
+    def count_rows(self, dataset_name):
+        """Return the row count of a stored dataset from its Parquet footers, or None."""
+        file_path = self._dataset_path(dataset_name)
+        if os.path.exists(file_path):
+            return open_dataset(file_path).count_rows()
+        
+        metadata = self.db_adapter.get_cached_data('default', f"dataset:{dataset_name}:metadata")
+        if metadata:
+            return json.loads(metadata).get('rows')
+        return None
+    
+    def list_datasets(self, limit=None, cursor=None, sort='name', order='asc', prefix=None):
+        """
+        List stored datasets one page at a time.
+        
+        Args:
+            limit: datasets per page
+            cursor: next_cursor of the previous page
+            sort: 'name', 'modified' or 'size'
+            order: 'asc' or 'desc'
+            prefix: only list names starting with this string
+        
+        Returns:
+            dict: datasets and next_cursor (None on the last page)
+        
+        Listings come from the datasets table with one indexed query. Without
+        a database the storage folder is walked and the cached metadata of
+        every dataset is fetched from Redis in a single MGET.
+        """
+        try:
+            if database.Session is not None:
+                return list_catalog(SOURCE_STORAGE, limit=limit, cursor=cursor, sort=sort,
+                                    order=order, prefix=prefix)
+            
+            names = [name for name in self._stored_names() if name.startswith(prefix or '')]
+            cached = self.db_adapter.get_cached_many('default', [f"dataset:{name}:metadata" for name in names])
             datasets = []
+            missing = {}
+            for name, metadata in zip(names, cached):
+                if metadata:
+                    datasets.append(json.loads(metadata))
+                    continue
+                
+                # Rebuild the metadata from the Parquet footer alone if it is not cached
+                metadata = self._file_metadata(name)
+                datasets.append(metadata)
+                missing[f"dataset:{name}:metadata"] = json.dumps(metadata)
             
-            # Get datasets from file system
-            for file in os.listdir(self.storage_dir):
-                if file.endswith('.parquet'):
-                    name = file[:-8]  # Remove .parquet extension
-                    
-                    # Try to get metadata from Redis
-                    metadata = self.db_adapter.get_cached_data('default', f"dataset:{name}:metadata")
-                    if metadata:
-                        datasets.append(json.loads(metadata))
-                    else:
-                        # Create metadata if not in cache
-                        file_path = os.path.join(self.storage_dir, file)
-                        df = pd.read_parquet(file_path)
-                        metadata = {
-                            "name": name,
-                            "rows": len(df),
-                            "columns": list(df.columns),
-                            "storage_type": "file",
-                            "last_modified": datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat(),
-                            "size": os.path.getsize(file_path)
-                        }
-                        datasets.append(metadata)
-                        
-                        # Cache the metadata
-                        self.db_adapter.cache_data('default', f"dataset:{name}:metadata",
-                                                 json.dumps(metadata))
-            
-            return datasets
+            # Repopulate every missing key in one write
+            self.db_adapter.cache_many('default', missing)
+            return {"datasets": datasets, "next_cursor": None}
+        except ValueError:
+            raise
         except Exception as e:
             raise Exception(f"Error listing datasets: {str(e)}")
     
+    def _storage_path(self, dataset_name, suffix=''):
+        """Path of ``dataset_name`` plus ``suffix`` directly inside the storage folder.
+        
+        Raises:
+            InvalidRequest: for a name that is empty, hidden or reaches outside the
+                storage folder (path separators, ``..``)
+        """
+        name = str(dataset_name or '')
+        if (not name or name.startswith('.') or os.path.basename(name) != name
+                or '/' in name or '\\' in name):
+            raise InvalidRequest(f"Invalid dataset name: {dataset_name!r}")
+        path = os.path.join(self.storage_dir, f"{name}{suffix}")
+        root = os.path.realpath(self.storage_dir)
+        if os.path.dirname(os.path.realpath(path)) != root:
+            raise InvalidRequest(f"Invalid dataset name: {dataset_name!r}")
+        return path
+    
+    def _dataset_path(self, dataset_name):
+        """Path of a stored dataset: its partition directory if it has one, else its Parquet file."""
+        partitioned = self._storage_path(dataset_name)
+        if os.path.exists(os.path.join(partitioned, COMMON_METADATA)):
+            return partitioned
+        return self._storage_path(dataset_name, '.parquet')
+    
+    def _stored_names(self):
+        """Names of the datasets in the storage folder, in either layout, sorted."""
+        names = []
+        with os.scandir(self.storage_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith('.parquet') and entry.is_file():
+                    names.append(entry.name[:-8])
+                elif entry.is_dir() and os.path.exists(os.path.join(entry.path, COMMON_METADATA)):
+                    names.append(entry.name)
+        return sorted(names)
+    
+    def _file_metadata(self, dataset_name):
+        """Metadata of a stored dataset read from its Parquet footers."""
+        file_path = self._dataset_path(dataset_name)
+        footer = read_footer(file_path)
+        return {
+            "name": dataset_name,
+            "rows": footer["rows"],
+            "columns": footer["columns"],
+            "dtypes": footer["dtypes"],
+            "column_stats": footer["column_stats"],
+            "storage_type": "file",
+            "last_modified": datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat(),
+            "size": dataset_size(file_path)
+        }
+    
+    def sync_catalog(self):
+        """Add stored datasets missing from the datasets table, and drop rows of deleted ones."""
+        entries = []
+        for name in self._stored_names():
+            path = self._dataset_path(name)
+            dataset = open_dataset(path)
+            entries.append({
+                "name": name,
+                "path": path,
+                "type": "parquet",
+                "size": dataset_size(path),
+                "modified": os.path.getmtime(path),
+                "rows": dataset.count_rows(),
+                "columns": len(dataset.schema.names)
+            })
+        sync_datasets(SOURCE_STORAGE, self.storage_dir, entries)
+    
+    def compact_dataset(self, dataset_name):
+        """
+        Merge the small row groups and files that chunked writes left in a stored dataset.
+        
+        Returns:
+            dict: the dataset name and the report of compact_parquet, or None
+                if the dataset has no file
+        """
+        file_path = self._dataset_path(dataset_name)
+        if not os.path.exists(file_path):
+            return None
+        report = compact_parquet(file_path, self.config.get('row_group_size'))
+        if report['compacted']:
+            dataframe_cache.invalidate(file_path)
+            if self.hot_tier:
+                self.hot_tier.evict(dataset_name)
+            metadata = self._file_metadata(dataset_name)
+            self.db_adapter.cache_data('default', f"dataset:{dataset_name}:metadata", json.dumps(metadata))
+            save_schema(SOURCE_STORAGE, dataset_name, load_schema(SOURCE_STORAGE, dataset_name), 'parquet',
+                        file_path, metadata["size"], metadata["rows"])
+        return dict(report, name=dataset_name)
+    
+    def compact_datasets(self):
+        """Compact every stored dataset; returns the per-dataset reports."""
+        return [self.compact_dataset(name) for name in self._stored_names()]
+    
     def delete_dataset(self, dataset_name, storage_type='all'):
         """
         Delete a dataset from the specified storage.
@@ -159,9 +484,11 @@ class StorageAgent(BaseAgent):
             
             # Delete from file system
             if storage_type in ('file', 'all'):
-                file_path = os.path.join(self.storage_dir, f"{dataset_name}.parquet")
-                if os.path.exists(file_path):
-                    os.remove(file_path)
+                file_path = self._dataset_path(dataset_name)
+                delete_parquet(file_path)
+                dataframe_cache.invalidate(file_path)
+                if self.hot_tier:
+                    self.hot_tier.evict(dataset_name)
             
             # Delete from DB2
             if storage_type in ('db2', 'all'):
@@ -173,8 +500,11 @@ class StorageAgent(BaseAgent):
             # Remove metadata from Redis
             if storage_type == 'all':
                 self.db_adapter.cache_data('default', f"dataset:{dataset_name}:metadata", '')
+                delete_schema(SOURCE_STORAGE, dataset_name)
             
             return success
+        except ValueError:
+            raise
         except Exception as e:
             raise Exception(f"Error deleting dataset: {str(e)}")
     
@@ -192,7 +522,9 @@ class StorageAgent(BaseAgent):
             if df is None:
                 return None
             
-            export_path = os.path.join(self.storage_dir, f"{dataset_name}_export.{format}")
+            export_path = self._storage_path(dataset_name, f"_export.{format}")
+            # Dates are written in the format of the uploaded file, not as ISO 8601
+            df = format_dates(df, date_formats(load_schema(SOURCE_STORAGE, dataset_name)))
             
             if format == 'csv':
                 df.to_csv(export_path, index=False)
@@ -204,5 +536,7 @@ class StorageAgent(BaseAgent):
                 df.to_csv(export_path, sep='\t', index=False)
             
             return export_path
+        except ValueError:
+            raise
         except Exception as e:
             raise Exception(f"Error exporting dataset: {str(e)}")
\ No newline at end of file
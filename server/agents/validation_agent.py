@@ -1,6 +1,9 @@
 import pandas as pd
 from .base_agent import BaseAgent
 from utils.config import load_config
+from utils.excel_reader import iter_excel_batches
+from utils.file_detection import detect_file_format
+from utils.json_reader import JSON_EXTENSIONS, iter_json_batches
 
 class ValidationAgent(BaseAgent):
     def __init__(self):
@@ -22,9 +25,11 @@ class ValidationAgent(BaseAgent):
             if file_path.endswith('.csv'):
                 df = pd.read_csv(file_path, nrows=5)
             elif file_path.endswith(('.xlsx', '.xls')):
-                df = pd.read_excel(file_path, nrows=5)
-            elif file_path.endswith('.json'):
-                df = pd.read_json(file_path)
+                df = next(iter_excel_batches(file_path, batch_size=5))
+            elif file_path.endswith(tuple(f'.{ext}' for ext in JSON_EXTENSIONS)):
+                # Only the first batch of records is parsed
+                file_type = file_path.rsplit('.', 1)[1].lower()
+                df = next(iter_json_batches(file_path, detect_file_format(file_path, file_type), batch_size=5))
             else:
                 df = pd.read_csv(file_path, sep='\t', nrows=5)
             
@@ -1,10 +1,19 @@
+from functools import partial
 from flask import Blueprint, request, jsonify
 from werkzeug.utils import secure_filename
+from werkzeug.wsgi import get_input_stream
 from agents.ingestion_agent import IngestionAgent
 from agents.cleaning_agent import CleaningAgent
 from agents.validation_agent import ValidationAgent
 from agents.storage_agent import StorageAgent
 from utils.config import load_config
+from utils.streaming import save_stream
+from services.workbook_ingestion import ingest_workbook
+from utils.codec_benchmark import SAMPLE_ROWS
+from utils.row_fingerprint import RowFingerprints
+from utils.errors import InvalidRequest
+from utils.schema_inference import date_formats, format_dates
+from storage.schema_catalog import load_schema, SOURCE_STORAGE
 import os
 
 bp = Blueprint('data', __name__)
@@ -46,23 +55,35 @@ def upload_file():
             os.remove(temp_path)
             return jsonify({"error": "File validation failed", "details": validation_result['errors']}), 400
         
-        # Ingest the data
-        df = ingestion_agent.ingest_file(temp_path)
+        is_workbook = filename.rsplit('.', 1)[1].lower() in ('xlsx', 'xls')
+        if is_workbook and request.form.get('all_sheets', '').lower() in ('true', '1'):
+            # Every sheet becomes its own dataset, ingested in parallel
+            sheets = ingest_workbook(temp_path, dataset_name)
+            return jsonify({
+                "success": True,
+                "message": f"Workbook uploaded and {len(sheets)} sheets processed successfully",
+                "datasets": sheets
+            })
+        
+        # Stream the data into storage in agents.ingestion.batch_size chunks
+        detection = {'file_type': 'xlsx', 'sheet_name': request.form.get('sheet')} if is_workbook else None
+        storage_result = storage_agent.store_dataset(partial(ingestion_agent.iter_chunks, temp_path, detection=detection),
+                                                     dataset_name,
+                                                     partition_by=request.form.get('partition_by'),
+                                                     codec=request.form.get('codec'),
+                                                     codec_level=request.form.get('codec_level', type=int))
         
         # Get initial info
         info = {
             "name": dataset_name,
             "original_filename": filename,
-            "rows": len(df),
-            "columns": len(df.columns),
-            "column_names": df.columns.tolist(),
+            "rows": storage_result["rows"],
+            "columns": len(storage_result["columns"]),
+            "column_names": storage_result["columns"],
             "file_size": os.path.getsize(temp_path),
             "validation": validation_result
         }
         
-        # Store the data
-        storage_result = storage_agent.store_dataset(df, dataset_name)
-        
         return jsonify({
             "success": True,
             "message": "File uploaded and processed successfully",
@@ -70,6 +91,69 @@ def upload_file():
             "storage_info": storage_result
         })
         
+    except TimeoutError as e:
+        return jsonify({"error": str(e)}), 504
+    except InvalidRequest as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/upload/stream', methods=['POST'])
+def upload_stream():
+    """Upload a file sent as the raw request body, streamed to disk in chunks."""
+    filename = secure_filename(request.args.get('filename') or request.headers.get('X-Filename', ''))
+    if not filename:
+        return jsonify({"error": "No filename provided"}), 400
+    
+    if not allowed_file(filename):
+        return jsonify({"error": "File type not allowed"}), 400
+    
+    temp_path = os.path.join(config['storage']['upload_folder'], filename)
+    try:
+        dataset_name = request.args.get('dataset_name', filename)
+        
+        # The form size limit does not apply here; the body is copied in
+        # fixed-size chunks while its hash and line count are computed
+        stream = get_input_stream(request.environ, max_content_length=None)
+        try:
+            stream_info = save_stream(stream, temp_path, config['storage'].get('stream_chunk_size', 1024 * 1024),
+                                      max_bytes=config['storage'].get('max_stream_size'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 413
+        
+        validation_result = validation_agent.validate_file(temp_path)
+        if not validation_result['valid']:
+            os.remove(temp_path)
+            return jsonify({"error": "File validation failed", "details": validation_result['errors']}), 400
+        
+        storage_result = storage_agent.store_dataset(partial(ingestion_agent.iter_chunks, temp_path), dataset_name,
+                                                     partition_by=request.args.get('partition_by'),
+                                                     codec=request.args.get('codec'),
+                                                     codec_level=request.args.get('codec_level', type=int))
+        
+        info = {
+            "name": dataset_name,
+            "original_filename": filename,
+            "rows": storage_result["rows"],
+            "columns": len(storage_result["columns"]),
+            "column_names": storage_result["columns"],
+            "file_size": stream_info["bytes"],
+            "sha256": stream_info["sha256"],
+            "lines": stream_info["lines"],
+            "validation": validation_result
+        }
+        
+        return jsonify({
+            "success": True,
+            "message": "File uploaded and processed successfully",
+            "dataset_info": info,
+            "storage_info": storage_result
+        })
+    
+    except TimeoutError as e:
+        return jsonify({"error": str(e)}), 504
+    except InvalidRequest as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -83,23 +167,28 @@ def clean_data():
         if not dataset_name:
             return jsonify({"error": "Dataset name is required"}), 400
         
-        # Retrieve dataset
-        df = storage_agent.get_dataset(dataset_name)
+        # Retrieve dataset; cleaning writes new values, so categories stay plain objects
+        df = storage_agent.get_dataset(dataset_name, categorical=False)
         if df is None:
             return jsonify({"error": "Dataset not found"}), 404
         
+        # Rows are hashed once and the hashes follow the frame through cleaning
+        fingerprints = RowFingerprints(df)
+        
         # Get initial statistics
-        initial_stats = cleaning_agent.get_statistics(df)
+        initial_stats = cleaning_agent.get_statistics(df, fingerprints)
         
-        # Clean the data
-        cleaned_df, cleaning_report = cleaning_agent.clean_dataset(df, options)
+        # Clean the data; with explain the report includes the plan and its timings
+        explain = bool(data.get('explain'))
+        cleaned_df, cleaning_report = cleaning_agent.clean_dataset(df, options, fingerprints, explain)
         
         # Get final statistics
-        final_stats = cleaning_agent.get_statistics(cleaned_df)
+        final_stats = cleaning_agent.get_statistics(cleaned_df, fingerprints)
         
-        # Store cleaned dataset
+        # Store cleaned dataset; its dates keep the format of the uploaded file
         cleaned_name = f"cleaned_{dataset_name}"
-        storage_result = storage_agent.store_dataset(cleaned_df, cleaned_name)
+        formats = date_formats(load_schema(SOURCE_STORAGE, dataset_name))
+        storage_result = storage_agent.store_dataset(cleaned_df, cleaned_name, date_formats=formats)
         
         return jsonify({
             "success": True,
@@ -108,19 +197,31 @@ def clean_data():
             "final_stats": final_stats,
             "cleaning_report": cleaning_report,
             "storage_info": storage_result,
-            "preview": cleaned_df.head(10).to_dict(orient='records')
+            "preview": format_dates(cleaned_df.head(10), formats).to_dict(orient='records')
         })
         
+    except InvalidRequest as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @bp.route('/datasets', methods=['GET'])
 def list_datasets():
     try:
-        datasets = storage_agent.list_datasets()
+        try:
+            page = storage_agent.list_datasets(
+                limit=request.args.get('limit', type=int),
+                cursor=request.args.get('cursor'),
+                sort=request.args.get('sort', 'name'),
+                order=request.args.get('order', 'asc'),
+                prefix=request.args.get('prefix')
+            )
+        except InvalidRequest as e:
+            return jsonify({"error": str(e)}), 400
         return jsonify({
             "success": True,
-            "datasets": datasets
+            "datasets": page["datasets"],
+            "next_cursor": page["next_cursor"]
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -129,16 +230,70 @@ def list_datasets():
 def preview_dataset(dataset_name):
     try:
         rows = int(request.args.get('rows', 10))
-        df = storage_agent.get_dataset(dataset_name, nrows=rows)
+        columns = request.args.get('columns')
+        try:
+            df = storage_agent.get_dataset(dataset_name, nrows=rows,
+                                           columns=columns.split(',') if columns else None)
+        except InvalidRequest as e:
+            return jsonify({"error": str(e)}), 400
+        
+        if df is None:
+            return jsonify({"error": "Dataset not found"}), 404
+        
+        return jsonify({
+            "success": True,
+            "preview": format_dates(df, date_formats(load_schema(SOURCE_STORAGE, dataset_name)))
+                .to_dict(orient='records'),
+            "columns": df.columns.tolist(),
+            "total_rows": storage_agent.count_rows(dataset_name) or len(df)
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/datasets/<dataset_name>/query', methods=['POST'])
+def query_dataset(dataset_name):
+    """Read chosen columns of the rows matching ``filters``; nothing else is decoded."""
+    try:
+        data = request.get_json() or {}
+        try:
+            df = storage_agent.get_dataset(
+                dataset_name,
+                nrows=data.get('limit'),
+                columns=data.get('columns'),
+                filters=[tuple(condition) for condition in data.get('filters') or []]
+            )
+        except InvalidRequest as e:
+            return jsonify({"error": str(e)}), 400
         
         if df is None:
             return jsonify({"error": "Dataset not found"}), 404
         
         return jsonify({
             "success": True,
-            "preview": df.to_dict(orient='records'),
+            "rows": df.to_dict(orient='records'),
             "columns": df.columns.tolist(),
-            "total_rows": len(df)
+            "count": len(df)
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/datasets/<dataset_name>/codecs', methods=['GET'])
+def benchmark_codecs(dataset_name):
+    """Compare the size, write time and read time of a dataset sample under each codec."""
+    try:
+        results = storage_agent.benchmark_codecs(dataset_name,
+                                                 sample_rows=request.args.get('rows', SAMPLE_ROWS, type=int))
+        
+        if results is None:
+            return jsonify({"error": "Dataset not found"}), 404
+        
+        return jsonify({
+            "success": True,
+            "results": results,
+            "default": {
+                "codec": config['agents']['storage'].get('compression'),
+                "level": config['agents']['storage'].get('compression_level')
+            }
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -157,6 +312,8 @@ def download_dataset(dataset_name):
             as_attachment=True,
             download_name=f"{dataset_name}.{format}"
         )
+    except InvalidRequest as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -172,5 +329,7 @@ def delete_dataset(dataset_name):
             "success": True,
             "message": f"Dataset {dataset_name} deleted successfully"
         })
+    except InvalidRequest as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
\ No newline at end of file
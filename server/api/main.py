@@ -6,8 +6,9 @@ from api.endpoints import data, reports
 from utils.logging import setup_logging
 from utils.config import load_config
 from storage.database import init_db
+from services.scheduler import MaintenanceService
 
-def create_app():
+def create_app(start_maintenance=False):
     # Load configuration
     config = load_config()
     
@@ -30,17 +31,27 @@ def create_app():
     # Initialize database
     init_db(config['database'])
     
+    # Catalogue datasets stored before the datasets table backed the listing
+    data.storage_agent.sync_catalog()
+    
+    # Compact stored datasets and demote idle hot copies in the background,
+    # when the configuration opts in and the caller asks for it
+    if start_maintenance and (config.get('maintenance') or {}).get('enabled', False):
+        MaintenanceService(config['storage']['upload_folder'], storage_agent=data.storage_agent,
+                           config=config.get('maintenance')).start()
+    
     # Register blueprints
     app.register_blueprint(data.bp, url_prefix='/api/data')
     app.register_blueprint(reports.bp, url_prefix='/api/reports')
     
     return app
 
-app = create_app()
-
 if __name__ == '__main__':
+    app = create_app(start_maintenance=True)
     app.run(
         host=app.config.get('API_HOST', '0.0.0.0'),
         port=app.config.get('API_PORT', 5000),
         debug=app.config.get('DEBUG', True)
-    )
\ No newline at end of file
+    )
+else:
+    app = create_app()
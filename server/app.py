@@ -2,11 +2,36 @@ from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
-from sklearn.impute import SimpleImputer
 import os
 from pathlib import Path
 from werkzeug.utils import secure_filename
+from werkzeug.wsgi import get_input_stream
 from utils.logging import get_logger
+from utils.streaming import save_stream
+from utils.excel_reader import read_excel_sheet
+from utils.json_reader import JSON_EXTENSIONS, JSON_LINES_EXTENSIONS, read_json_file
+from agents.ingestion_agent import IngestionAgent
+from utils.file_detection import detect_file_format, read_csv_kwargs, count_rows
+from storage.dataset_metadata import load_metadata, save_metadata, delete_metadata
+from storage.content_index import claim_content, release_content
+from storage.canonical import (write_canonical, read_canonical, read_canonical_head, iter_canonical,
+                               delete_canonical, canonical_path)
+from storage.schema_catalog import save_schema, load_schema, delete_schema, SOURCE_UPLOADS
+from storage.dataset_listing import list_datasets as list_catalog, sync_datasets, DEFAULT_PAGE_SIZE
+from storage.upload_catalog import UploadCatalog
+from storage.database import init_db
+from services.scheduler import MaintenanceService
+from utils.config import load_config
+from utils.schema_inference import (infer_schema, infer_schema_chunks, apply_schema, pandas_read_options,
+                                    date_formats, format_dates, SchemaMismatch)
+from utils.dataframe_cache import dataframe_cache, file_key
+from utils.row_fingerprint import RowFingerprints
+from utils.cleaning_plan import Step, compile_plan, PARALLEL_MIN_CELLS
+from utils.parquet import read_footer
+from utils.quantile_sketch import ColumnSketches, k_for_error, DEFAULT_K
+from utils.text_normalization import text_options
+from utils.cleaning_fit import Vocabulary, fit_record, fitted_steps, normalized_columns
+from services.out_of_core_cleaning import OutOfCoreCleaning
 from datetime import datetime
 import json
 
@@ -35,7 +60,40 @@ if not os.path.exists(UPLOAD_FOLDER):
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
-ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls', 'json', 'txt'}
+# Holds the schema catalog (Dataset.column_types)
+init_db(load_config()['database'])
+
+ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls', 'json', 'ndjson', 'jsonl', 'txt'}
+
+# Default number of rows returned by the preview endpoint
+PREVIEW_ROWS = 10
+
+# Uploads are written to disk in chunks of storage.stream_chunk_size bytes;
+# streaming uploads are capped at storage.max_stream_size bytes (no cap if
+# null) and parsed into the canonical copy in batches of this many rows
+storage_config = load_config()['storage']
+STREAM_CHUNK_SIZE = storage_config.get('stream_chunk_size', 1024 * 1024)
+MAX_STREAM_SIZE = storage_config.get('max_stream_size')
+STREAM_BATCH_ROWS = 100000
+
+# Cleaned files the out-of-core mode can write, since they are appended chunk by chunk
+OUT_OF_CORE_TYPES = {'csv', 'txt'} | set(JSON_LINES_EXTENSIONS)
+
+ingestion_agent = IngestionAgent()
+
+# Worker processes for wide cleaning passes (see CleaningPlan.execute)
+cleaning_config = load_config()['agents']['cleaning']
+
+# Size of the quantile sketches stored with streamed datasets and used by out-of-core cleaning
+QUANTILE_K = k_for_error(cleaning_config['quantile_error']) if cleaning_config.get('quantile_error') else DEFAULT_K
+
+# Index of the upload folder, so lookups by dataset name never list the folder.
+# Each rebuild (at startup, or after outside changes) also reconciles the
+# datasets table that backs the listing.
+upload_catalog = UploadCatalog(
+    UPLOAD_FOLDER, ALLOWED_EXTENSIONS,
+    on_rebuild=lambda entries: sync_datasets(SOURCE_UPLOADS, UPLOAD_FOLDER, entries)
+)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -52,7 +110,7 @@ def upload_file():
             return jsonify({'success': False, 'error': 'No file selected'}), 400
         
         if not allowed_file(file.filename):
-            return jsonify({'success': False, 'error': 'File type not allowed. Supported formats: CSV, Excel, JSON, TXT'}), 400
+            return jsonify({'success': False, 'error': 'File type not allowed. Supported formats: CSV, Excel, JSON, JSON Lines, TXT'}), 400
             
         original_name = secure_filename(file.filename)
         name, ext = os.path.splitext(original_name)
@@ -64,16 +122,45 @@ def upload_file():
         os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
         
         try:
-            file.save(filepath)
+            # Hash the content while it is written to disk
+            stream_info = save_stream(file.stream, filepath, STREAM_CHUNK_SIZE)
             logger.info(f"File saved successfully: {filepath}")
         except Exception as e:
             logger.error(f"Error saving file: {str(e)}")
             return jsonify({'success': False, 'error': 'Failed to save file'}), 500
         
+        # Different sheets of one workbook are different datasets
+        sheet = request.form.get('sheet')
+        content_key = workbook_content_key(stream_info['sha256'], sheet)
+        duplicate = claim_content(app.config['UPLOAD_FOLDER'], content_key, filename)
+        if duplicate:
+            os.remove(filepath)
+            return duplicate_upload_response(duplicate, original_name)
+        
         # Read and validate the file
         try:
             file_type = filename.rsplit('.', 1)[1].lower()
-            df = read_file_with_encoding(filepath, file_type)
+            detection = select_sheet(detect_file_format(filepath, file_type), sheet)
+            df = read_file_with_encoding(filepath, file_type, detection)
+            
+            # Infer column types once; later reads pass them to the parser
+            schema = infer_schema(df)
+            df = apply_schema(df, schema)
+            save_schema(SOURCE_UPLOADS, filename, schema, file_type, filepath, stream_info['bytes'], len(df))
+            
+            # Store the detected format and a typed columnar copy so later
+            # reads skip both detection and parsing
+            save_metadata(app.config['UPLOAD_FOLDER'], filename, {
+                'original_filename': original_name,
+                'detection': detection,
+                'sha256': content_key,
+                'bytes': stream_info['bytes'],
+                'rows': len(df),
+                'columns': [str(col) for col in df.columns],
+                'dtypes': {str(col): str(dtype) for col, dtype in df.dtypes.items()},
+                'canonical': write_canonical(app.config['UPLOAD_FOLDER'], filename, df)
+            })
+            upload_catalog.add(filename)
                 
             return jsonify({
                 'success': True,
@@ -81,12 +168,15 @@ def upload_file():
                 'filename': filename,
                 'original_filename': original_name,
                 'rows': len(df),
-                'columns': list(df.columns)
+                'columns': list(df.columns),
+                'detection': detection,
+                'schema': schema
             })
             
         except Exception as e:
             # Clean up invalid file
             os.remove(filepath)
+            release_content(app.config['UPLOAD_FOLDER'], content_key, filename)
             logger.error(f"Error processing file: {str(e)}")
             return jsonify({'success': False, 'error': f'Error processing file: {str(e)}'}), 400
         
@@ -94,20 +184,164 @@ def upload_file():
         logger.error(f"Upload error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def workbook_content_key(sha256, sheet=None):
+    """Content index key of an upload, which for workbooks depends on the sheet read."""
+    return f"{sha256}-{secure_filename(sheet)}" if sheet else sha256
+
+def select_sheet(detection, sheet=None):
+    """Point a workbook's detection result at the requested sheet."""
+    if not sheet or 'sheets' not in detection:
+        return detection
+    if sheet not in detection['sheets']:
+        raise ValueError(f"Sheet '{sheet}' not found. Available sheets: {detection['sheets']}")
+    return dict(detection, sheet_name=sheet)
+
+def duplicate_upload_response(existing, original_name):
+    """Answer an upload whose content matches an existing dataset without parsing it."""
+    logger.info(f"Upload of {original_name} is identical to existing dataset {existing}")
+    metadata = load_metadata(app.config['UPLOAD_FOLDER'], existing)
+    return jsonify({
+        'success': True,
+        'message': 'Identical dataset already uploaded',
+        'duplicate': True,
+        'filename': existing,
+        'original_filename': original_name,
+        'rows': metadata.get('rows'),
+        'columns': metadata.get('columns', []),
+        'detection': metadata.get('detection')
+    })
+
+@app.route('/datasets/stream', methods=['POST'])
+def upload_stream():
+    """Upload a dataset sent as the raw request body, without the form size limit."""
+    try:
+        original_name = secure_filename(request.args.get('filename') or request.headers.get('X-Filename', ''))
+        if not original_name:
+            return jsonify({'success': False, 'error': 'No filename provided'}), 400
+        
+        if not allowed_file(original_name):
+            return jsonify({'success': False, 'error': 'File type not allowed. Supported formats: CSV, Excel, JSON, JSON Lines, TXT'}), 400
+        
+        name, ext = os.path.splitext(original_name)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"{name}_{timestamp}{ext}"
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        
+        try:
+            # MAX_CONTENT_LENGTH guards form uploads; the raw body is read in
+            # fixed-size chunks so its size does not affect server memory
+            stream = get_input_stream(request.environ, max_content_length=None)
+            stream_info = save_stream(stream, filepath, STREAM_CHUNK_SIZE, max_bytes=MAX_STREAM_SIZE)
+            logger.info(f"File streamed successfully: {filepath}")
+        except ValueError as e:
+            logger.warning(f"Rejected streamed file: {str(e)}")
+            return jsonify({'success': False, 'error': str(e)}), 413
+        except Exception as e:
+            logger.error(f"Error saving streamed file: {str(e)}")
+            return jsonify({'success': False, 'error': 'Failed to save file'}), 500
+        
+        if stream_info['bytes'] == 0:
+            os.remove(filepath)
+            return jsonify({'success': False, 'error': 'No file content provided'}), 400
+        
+        sheet = request.args.get('sheet')
+        content_key = workbook_content_key(stream_info['sha256'], sheet)
+        duplicate = claim_content(app.config['UPLOAD_FOLDER'], content_key, filename)
+        if duplicate:
+            os.remove(filepath)
+            return duplicate_upload_response(duplicate, original_name)
+        
+        try:
+            file_type = filename.rsplit('.', 1)[1].lower()
+            detection = select_sheet(detect_file_format(filepath, file_type), sheet)
+            
+            # The schema comes from the first batch and types every batch after it. A
+            # date or numeric column a later batch does not fit is read again as text.
+            text_columns = set()
+            while True:
+                # Parse in bounded batches straight into the canonical copy
+                chunks = ingestion_agent.iter_chunks(filepath, batch_size=STREAM_BATCH_ROWS, detection=detection,
+                                                     text_columns=text_columns)
+                schema, chunks = infer_schema_chunks(chunks, text_columns)
+                # Numeric columns are sketched on the way, for outlier bounds without a pass over the data
+                sketches = ColumnSketches(QUANTILE_K)
+                try:
+                    canonical = write_canonical(app.config['UPLOAD_FOLDER'], filename, sketches.track(chunks))
+                    break
+                except SchemaMismatch as e:
+                    if e.column in text_columns:
+                        raise
+                    text_columns.add(e.column)
+            if canonical:
+                rows, columns, dtypes = canonical['rows'], canonical['columns'], canonical['dtypes']
+            elif file_type in ['csv', 'txt']:
+                rows = count_rows(filepath, detection)
+                columns = [str(col) for col in pd.read_csv(filepath, nrows=0, **read_csv_kwargs(detection)).columns]
+                dtypes = {}
+            else:
+                rows, columns, dtypes = None, [], {}
+            
+            save_metadata(app.config['UPLOAD_FOLDER'], filename, {
+                'original_filename': original_name,
+                'detection': detection,
+                'sha256': content_key,
+                'bytes': stream_info['bytes'],
+                'rows': rows,
+                'columns': columns,
+                'dtypes': dtypes,
+                'canonical': canonical,
+                'quantile_sketches': sketches.to_dict() if canonical else None
+            })
+            save_schema(SOURCE_UPLOADS, filename, schema, file_type, filepath, stream_info['bytes'], rows or 0)
+            upload_catalog.add(filename)
+            
+            return jsonify({
+                'success': True,
+                'message': 'File uploaded successfully',
+                'filename': filename,
+                'original_filename': original_name,
+                'rows': rows,
+                'columns': columns,
+                'detection': detection,
+                'schema': schema,
+                'stream': stream_info
+            })
+        
+        except Exception as e:
+            os.remove(filepath)
+            delete_canonical(app.config['UPLOAD_FOLDER'], filename)
+            release_content(app.config['UPLOAD_FOLDER'], content_key, filename)
+            logger.error(f"Error processing streamed file: {str(e)}")
+            status = 504 if isinstance(e, TimeoutError) else 400
+            return jsonify({'success': False, 'error': f'Error processing file: {str(e)}'}), status
+    
+    except Exception as e:
+        logger.error(f"Streaming upload error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/datasets', methods=['GET'])
 def list_datasets():
-    """List all available datasets."""
+    """List datasets one page at a time.
+    
+    Query parameters: limit, cursor (next_cursor of the previous page),
+    sort (name, modified or size), order (asc or desc) and prefix.
+    """
     try:
-        files = []
-        for filename in os.listdir(app.config['UPLOAD_FOLDER']):
-            if allowed_file(filename):
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                files.append({
-                    'name': filename,
-                    'size': os.path.getsize(filepath),
-                    'modified': os.path.getmtime(filepath)
-                })
-        return jsonify({'success': True, 'datasets': files})
+        # Pick up files added or removed outside the app
+        upload_catalog.refresh()
+        try:
+            page = list_catalog(
+                SOURCE_UPLOADS,
+                limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+                cursor=request.args.get('cursor'),
+                sort=request.args.get('sort', 'name'),
+                order=request.args.get('order', 'asc'),
+                prefix=request.args.get('prefix')
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        return jsonify({'success': True, 'datasets': page['datasets'], 'next_cursor': page['next_cursor']})
     except Exception as e:
         logger.error(f"Error listing datasets: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -126,7 +360,7 @@ def preview_dataset(name):
             }), 400
             
         # Find the actual file with timestamp
-        filename = find_timestamped_file(name)
+        filename = upload_catalog.resolve(secure_filename(name))
         if not filename:
             logger.warning(f"Dataset not found: {name}")
             return jsonify({
@@ -137,6 +371,7 @@ def preview_dataset(name):
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         if not os.path.exists(filepath):
             logger.error(f"File exists in directory listing but not on disk: {filepath}")
+            upload_catalog.remove(filename)
             return jsonify({
                 'success': False, 
                 'error': 'Dataset file is missing'
@@ -144,7 +379,8 @@ def preview_dataset(name):
             
         try:
             file_type = name.rsplit('.', 1)[1].lower()
-            df = read_file_with_encoding(filepath, file_type)
+            preview_rows = request.args.get('rows', PREVIEW_ROWS, type=int)
+            df, total_rows = load_preview(filename, file_type, preview_rows)
             
             if df is None or df.empty:
                 logger.warning(f"Empty dataset: {filename}")
@@ -153,8 +389,9 @@ def preview_dataset(name):
                     'error': 'Dataset is empty'
                 }), 400
             
-            preview_rows = min(10, len(df))
-            preview_data = df.head(preview_rows).to_dict('records')
+            # Dates are shown the way the file writes them
+            formats = date_formats(load_schema(SOURCE_UPLOADS, filename))
+            preview_data = format_dates(df.head(preview_rows), formats).to_dict('records')
             
             # Convert any numpy types to Python native types for JSON serialization
             for row in preview_data:
@@ -163,6 +400,8 @@ def preview_dataset(name):
                         row[key] = value.item()
                     elif isinstance(value, (np.ndarray, list)):
                         row[key] = str(value)
+                    elif isinstance(value, pd.Timestamp):
+                        row[key] = value.isoformat()
                     elif pd.isna(value):
                         row[key] = None
             
@@ -170,7 +409,7 @@ def preview_dataset(name):
                 'success': True,
                 'preview': preview_data,
                 'columns': list(df.columns),
-                'total_rows': len(df),
+                'total_rows': total_rows,
                 'filename': filename
             })
             
@@ -195,7 +434,7 @@ def download_dataset(name):
         if not allowed_file(name):
             return jsonify({'success': False, 'error': 'Invalid file type'}), 400
             
-        filename = find_timestamped_file(name)
+        filename = upload_catalog.resolve(secure_filename(name))
         if not filename:
             return jsonify({'success': False, 'error': 'Dataset not found'}), 404
             
@@ -213,18 +452,38 @@ def delete_dataset(name):
         if not allowed_file(name):
             return jsonify({'success': False, 'error': 'Invalid file type'}), 400
             
-        filename = find_timestamped_file(name)
+        filename = upload_catalog.resolve(secure_filename(name))
         if not filename:
             return jsonify({'success': False, 'error': 'Dataset not found'}), 404
             
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        os.remove(filepath)
+        remove_upload(filename)
         return jsonify({'success': True, 'message': 'Dataset deleted successfully'})
         
     except Exception as e:
         logger.error(f"Error deleting dataset: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/maintenance', methods=['POST'])
+def run_maintenance():
+    """Apply upload retention now and report the disk space reclaimed.
+    
+    Unless maintenance.enabled is set, retention only reports the upload
+    versions it would delete.
+    """
+    try:
+        report = maintenance.run()
+        if report is None:
+            return jsonify({'success': False, 'error': 'Maintenance is already running'}), 409
+        return jsonify({'success': True, **report})
+    except Exception as e:
+        logger.error(f"Error running maintenance: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Report hit, miss and eviction counters of the DataFrame cache."""
+    return jsonify({'success': True, 'cache': dataframe_cache.stats()})
+
 def convert_to_native_types(obj):
     """Convert numpy types to native Python types for JSON serialization."""
     if isinstance(obj, dict):
@@ -249,30 +508,36 @@ def clean_data():
         if not data or 'filename' not in data:
             return jsonify({'success': False, 'error': 'No filename provided'}), 400
             
-        filename = find_timestamped_file(data['filename'])
+        filename = upload_catalog.resolve(secure_filename(data['filename']))
         if not filename:
             return jsonify({'success': False, 'error': 'Dataset not found'}), 404
+        
+        if data.get('out_of_core'):
+            return clean_out_of_core(data, filename)
             
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         
         # Read the dataset
         try:
             file_type = filename.rsplit('.', 1)[1].lower()
-            df = read_file_with_encoding(filepath, file_type)
+            # Cleaning writes new values into text columns, so they stay plain objects
+            df = load_dataset(filename, file_type, categorical=False)
         except Exception as e:
             logger.error(f"Error reading file {filename}: {str(e)}")
             return jsonify({'success': False, 'error': f'Error reading file: {str(e)}'}), 400
             
-        # Extract operations from the request
-        ops = data.get('operations', {})
-        logger.info(f"Operations received: {ops}")
+        logger.info(f"Operations received: {data.get('operations', {})}")
+        
+        # Rows are hashed once; every duplicate count below reuses the hashes
+        fingerprints = RowFingerprints(df)
+        missing = df.isna().sum()
         
         # Initialize statistics
         initial_rows = int(len(df))
         initial_stats = {
             'rows': initial_rows,
-            'missing_values': int(df.isna().sum().sum()),
-            'duplicates': int(len(df) - len(df.drop_duplicates()))
+            'missing_values': int(missing.sum()),
+            'duplicates': fingerprints.duplicate_count()
         }
         
         changes = {
@@ -281,94 +546,20 @@ def clean_data():
             'rows_removed': 0
         }
         
-        # Track applied operations for reporting
-        applied_operations = []
-        
-        # Text normalization
-        if isinstance(ops, dict) and (ops.get('normalizeText') or ops.get('normalize_text')):
-            logger.info("Applying text normalization")
-            # Get selected text columns or use all text columns
-            text_columns = ops.get('selectedColumns', {}).get('textColumns', [])
-            if not text_columns:
-                text_columns = df.select_dtypes(include=['object']).columns
-            
-            for col in text_columns:
-                if col in df.columns:
-                    df[col] = df[col].str.lower().str.strip()
-            applied_operations.append('text_normalization')
-        
-        # Missing values
-        if isinstance(ops, dict):
-            missing_values_strategy = ops.get('handleMissingValues') or ops.get('handle_missing_values')
-            if missing_values_strategy and missing_values_strategy != 'none':
-                logger.info(f"Handling missing values with strategy: {missing_values_strategy}")
-                
-                # Count missing values before handling
-                missing_before = int(df.isna().sum().sum())
-                
-                # Get selected numeric columns or use all numeric columns
-                numeric_columns = ops.get('selectedColumns', {}).get('numericColumns', [])
-                if not numeric_columns:
-                    numeric_columns = df.select_dtypes(include=np.number).columns
-                
-                if missing_values_strategy == 'impute':
-                    imputer = SimpleImputer(strategy='mean')
-                    df[numeric_columns] = imputer.fit_transform(df[numeric_columns])
-                elif missing_values_strategy == 'custom':
-                    custom_value = ops.get('customMissingValue', '')
-                    try:
-                        # Try to convert custom value to float for numeric columns
-                        custom_value = float(custom_value)
-                        df[numeric_columns] = df[numeric_columns].fillna(custom_value)
-                    except (ValueError, TypeError):
-                        # If conversion fails, treat it as a string value
-                        logger.warning(f"Could not convert custom value '{custom_value}' to float, using as string")
-                        df = df.fillna(custom_value)
-                elif missing_values_strategy == 'remove':
-                    df = df.dropna(subset=numeric_columns)
-                
-                # Count handled missing values
-                missing_after = int(df.isna().sum().sum())
-                changes['missing_values_handled'] = missing_before - missing_after
-                applied_operations.append('missing_values')
-        
-        # Outliers
-        if isinstance(ops, dict) and (ops.get('detectOutliers') or ops.get('detect_outliers')):
-            logger.info("Detecting and handling outliers")
-            
-            # Get selected outlier columns or use all numeric columns
-            outlier_columns = ops.get('selectedColumns', {}).get('outlierColumns', [])
-            if not outlier_columns:
-                outlier_columns = df.select_dtypes(include=np.number).columns
-            
-            for col in outlier_columns:
-                if col in df.columns:
-                    Q1 = float(df[col].quantile(0.25))
-                    Q3 = float(df[col].quantile(0.75))
-                    IQR = Q3 - Q1
-                    lower_bound = Q1 - 1.5 * IQR
-                    upper_bound = Q3 + 1.5 * IQR
-                    df[col] = df[col].clip(lower=lower_bound, upper=upper_bound)
-            applied_operations.append('outliers')
-        
-        # Duplicates
-        if isinstance(ops, dict) and (ops.get('removeDuplicates') or ops.get('remove_duplicates')):
-            logger.info("Removing duplicates")
-            
-            # Count duplicates before removal
-            duplicates_before = int(len(df))
-            
-            # Get selected duplicate check columns or use all columns
-            duplicate_columns = ops.get('selectedColumns', {}).get('duplicateCheckColumns', [])
-            if duplicate_columns:
-                df = df.drop_duplicates(subset=duplicate_columns)
-            else:
-                df = df.drop_duplicates()
-            
-            # Count removed duplicates
-            duplicates_removed = duplicates_before - int(len(df))
-            changes['duplicates_removed'] = duplicates_removed
-            applied_operations.append('duplicates')
+        try:
+            steps, applied_operations, stored_fit = requested_steps(data, df, missing)
+        except FileNotFoundError as e:
+            return jsonify({'success': False, 'error': str(e)}), 404
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        plan = compile_plan(steps, df)
+        df = plan.execute(df, fingerprints, workers=cleaning_config.get('workers', 1),
+                          min_cells=cleaning_config.get('parallel_min_cells', PARALLEL_MIN_CELLS))
+        vocabulary = Vocabulary(normalized_columns(steps))
+        vocabulary.update(df)
+        fit = cleaning_fit(data, filename, steps, applied_operations, vocabulary, stored_fit)
+        changes['missing_values_handled'] = plan.cells('impute', 'fill_missing', 'drop_missing')
+        changes['duplicates_removed'] = plan.cells('dedupe')
         
         # Calculate final statistics
         final_rows = int(len(df))
@@ -377,7 +568,7 @@ def clean_data():
         final_stats = {
             'rows': final_rows,
             'missing_values': int(df.isna().sum().sum()),
-            'duplicates': int(len(df) - len(df.drop_duplicates()))
+            'duplicates': fingerprints.duplicate_count()
         }
         
         # Save cleaned dataset
@@ -391,14 +582,34 @@ def clean_data():
         cleaned_filename = f"{base_name}_cleaned_{timestamp}{extension}"
         cleaned_filepath = os.path.join(app.config['UPLOAD_FOLDER'], cleaned_filename)
         
+        # Dates are written in the format of the uploaded file, not as ISO 8601
+        formats = date_formats(load_schema(SOURCE_UPLOADS, filename))
+        written = format_dates(df, formats)
         if extension.lower() == '.csv':
-            df.to_csv(cleaned_filepath, index=False)
+            written.to_csv(cleaned_filepath, index=False)
         elif extension.lower() in ('.xls', '.xlsx'):
-            df.to_excel(cleaned_filepath, index=False)
+            written.to_excel(cleaned_filepath, index=False)
         elif extension.lower() == '.json':
-            df.to_json(cleaned_filepath)
+            written.to_json(cleaned_filepath)
+        elif extension.lower().lstrip('.') in JSON_LINES_EXTENSIONS:
+            written.to_json(cleaned_filepath, orient='records', lines=True)
         else:  # .txt
-            df.to_csv(cleaned_filepath, sep='\t', index=False)
+            written.to_csv(cleaned_filepath, sep='\t', index=False)
+        
+        schema = infer_schema(df, date_formats=formats)
+        df = apply_schema(df, schema)
+        save_schema(SOURCE_UPLOADS, cleaned_filename, schema, extension.lower().lstrip('.'), cleaned_filepath,
+                    os.path.getsize(cleaned_filepath), final_rows, is_cleaned=True)
+        save_metadata(app.config['UPLOAD_FOLDER'], cleaned_filename, {
+            'original_filename': data['filename'],
+            'detection': cleaned_file_detection(extension.lower().lstrip('.')),
+            'rows': final_rows,
+            'columns': [str(col) for col in df.columns],
+            'dtypes': {str(col): str(dtype) for col, dtype in df.dtypes.items()},
+            'canonical': write_canonical(app.config['UPLOAD_FOLDER'], cleaned_filename, df),
+            'cleaning_fit': fit
+        })
+        upload_catalog.add(cleaned_filename)
             
         response_data = {
             'success': True,
@@ -409,8 +620,11 @@ def clean_data():
                 'final_stats': final_stats,
                 'changes': changes,
                 'operations_applied': applied_operations
-            }
+            },
+            'fit': fit_summary(fit, vocabulary, stored_fit)
         }
+        if data.get('explain'):
+            response_data['plan'] = plan.explain()
         
         # Convert numpy types to native Python types
         response_data = convert_to_native_types(response_data)
@@ -420,117 +634,437 @@ def clean_data():
         logger.error(f"Error cleaning dataset: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-def find_timestamped_file(base_filename):
-    """Find the most recent timestamped version of a file."""
-    logger.info(f"Looking for file: {base_filename}")
-    base_name, ext = os.path.splitext(secure_filename(base_filename))
-    logger.info(f"Base name: {base_name}, Extension: {ext}")
+def append_cleaned(chunk, filepath, file_type, first):
+    """Write a chunk of a cleaned dataset to the end of its file (starting it if ``first``)."""
+    if file_type in JSON_LINES_EXTENSIONS:
+        chunk.to_json(filepath, orient='records', lines=True, mode='w' if first else 'a')
+    else:
+        chunk.to_csv(filepath, sep='\t' if file_type == 'txt' else ',', index=False,
+                     header=first, mode='w' if first else 'a')
+
+def stored_sketches(filename, rows):
+    """Quantile sketches stored with a dataset, or None if there are none or
+    they were taken from a different number of rows than it has."""
+    data = load_metadata(app.config['UPLOAD_FOLDER'], filename).get('quantile_sketches')
+    if not data or data['rows'] != rows:
+        return None
+    return ColumnSketches.from_dict(data)
+
+def clean_out_of_core(data, filename):
+    """Clean a dataset streamed in chunks from its canonical copy.
     
-    # Get all files in the upload directory
-    all_files = os.listdir(app.config['UPLOAD_FOLDER'])
-    logger.info(f"All files in upload directory: {all_files}")
+    The cleaning plan runs through OutOfCoreCleaning, so memory tracks the
+    chunk size rather than the dataset size; results match the in-memory path
+    within the tolerances documented there. The cleaned chunks are appended to
+    the cleaned file and written as row groups of its canonical copy.
+    """
+    folder = app.config['UPLOAD_FOLDER']
+    file_type = filename.rsplit('.', 1)[1].lower()
+    if file_type not in OUT_OF_CORE_TYPES:
+        return jsonify({'success': False, 'error': f'Out-of-core cleaning cannot write {file_type} files. '
+                                                   f'Supported formats: CSV, TXT, JSON Lines'}), 400
+    first_row = iter_canonical(folder, filename, 1)
+    if first_row is None:
+        return jsonify({'success': False, 'error': 'Out-of-core cleaning needs the canonical Parquet copy '
+                                                   'of the dataset'}), 400
     
-    # Check if the exact file exists
-    exact_match = secure_filename(base_filename)
-    logger.info(f"Secure filename: {exact_match}")
+    schema = load_schema(SOURCE_UPLOADS, filename)
     
-    if exact_match in all_files:
-        logger.info(f"Found exact match for {base_filename}: {exact_match}")
-        return exact_match
+    def read_chunks():
+        # Cleaning writes new values into text columns, so they stay plain objects
+        return (apply_schema(chunk, schema, categorical=False)
+                for chunk in iter_canonical(folder, filename, STREAM_BATCH_ROWS))
     
-    # Look for timestamped versions
-    matching_files = [f for f in all_files 
-                     if f.startswith(base_name + '_') and f.endswith(ext)]
-    logger.info(f"Timestamped matches: {matching_files}")
+    # Steps are built from the column types and footer statistics, without loading the data
+    footer = read_footer(canonical_path(folder, filename))
+    sample = next(first_row, None)
+    if sample is None:
+        return jsonify({'success': False, 'error': 'Dataset is empty'}), 400
+    sample = apply_schema(sample.head(0), schema, categorical=False)
+    missing = pd.Series({col: 1 if stats['null_count'] is None else stats['null_count']
+                         for col, stats in footer['column_stats'].items()})
     
-    # Also look for files that match the base name without timestamp
-    base_matches = [f for f in all_files 
-                   if f.startswith(base_name) and f.endswith(ext) and '_' not in f]
-    logger.info(f"Base matches: {base_matches}")
+    try:
+        steps, applied_operations, stored_fit = requested_steps(data, sample, missing)
+    except FileNotFoundError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    plan = compile_plan(steps, sample, rows=footer['rows'])
+    cleaning = OutOfCoreCleaning(plan, read_chunks, QUANTILE_K, stored_sketches(filename, footer['rows']))
     
-    # Combine both lists
-    all_matches = matching_files + base_matches
-    logger.info(f"All matches: {all_matches}")
+    base_name, extension = os.path.splitext(filename)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    cleaned_filename = f"{base_name}_cleaned_{timestamp}{extension}"
+    cleaned_filepath = os.path.join(folder, cleaned_filename)
     
-    if not all_matches:
-        logger.warning(f"No matching files found for {base_filename}")
-        return None
+    vocabulary = Vocabulary(normalized_columns(steps))
+    # Dates are written in the format of the uploaded file, not as ISO 8601
+    formats = date_formats(schema)
+    
+    def written():
+        for i, chunk in enumerate(cleaning.apply()):
+            append_cleaned(format_dates(chunk, formats), cleaned_filepath, file_type, first=not i)
+            vocabulary.update(chunk)
+            yield chunk
+    
+    chunks = written()
+    cleaned_schema, typed_chunks = infer_schema_chunks(chunks, date_formats=formats)
+    try:
+        canonical = write_canonical(folder, cleaned_filename, typed_chunks)
+    except SchemaMismatch:
+        # The cleaned schema now reads the column as text, so the cleaned file alone serves reads
+        canonical = None
+    # Finishes the cleaned file if the canonical copy gave up part way
+    for _ in chunks:
+        pass
+    if cleaning.sketches_added:
+        save_metadata(folder, filename, {'quantile_sketches': cleaning.sketches.to_dict()})
+    fit = cleaning_fit(data, filename, steps, applied_operations, vocabulary, stored_fit)
+    
+    initial_stats, final_stats = cleaning.initial_stats, cleaning.final_stats
+    changes = {
+        'missing_values_handled': plan.cells('impute', 'fill_missing', 'drop_missing'),
+        'duplicates_removed': plan.cells('dedupe'),
+        'rows_removed': initial_stats['rows'] - final_stats['rows']
+    }
+    
+    save_schema(SOURCE_UPLOADS, cleaned_filename, cleaned_schema, file_type, cleaned_filepath,
+                os.path.getsize(cleaned_filepath), final_stats['rows'], is_cleaned=True)
+    save_metadata(folder, cleaned_filename, {
+        'original_filename': data['filename'],
+        'detection': cleaned_file_detection(file_type),
+        'rows': final_stats['rows'],
+        'columns': canonical['columns'] if canonical else [str(col) for col in sample.columns],
+        'dtypes': canonical['dtypes'] if canonical else {},
+        'canonical': canonical,
+        'quantile_sketches': cleaning.output_sketches.to_dict() if canonical else None,
+        'cleaning_fit': fit
+    })
+    upload_catalog.add(cleaned_filename)
+    
+    response_data = {
+        'success': True,
+        'message': 'Dataset cleaned successfully',
+        'cleaned_dataset_name': cleaned_filename,
+        'report': {
+            'initial_stats': initial_stats,
+            'final_stats': final_stats,
+            'changes': changes,
+            'operations_applied': applied_operations
+        },
+        'out_of_core': {
+            'fit_passes': cleaning.fit_passes,
+            'batch_rows': STREAM_BATCH_ROWS
+        },
+        'fit': fit_summary(fit, vocabulary, stored_fit)
+    }
+    if data.get('explain'):
+        response_data['plan'] = plan.explain()
+    return jsonify(convert_to_native_types(response_data))
+
+def requested_steps(data, df, missing):
+    """Steps of a cleaning request.
+    
+    By default (``mode: 'fit'``) they are built from the request's operations
+    and fit their statistics on the data. With ``mode: 'apply'`` they are
+    loaded, fitted already, from the ``cleaning_fit`` stored with the cleaned
+    dataset named by ``fit``, and the request's operations are ignored.
+    
+    Returns:
+        tuple: (list of Step in requested order, names of the applied
+        operations, the stored fit applied or None)
+    
+    Raises:
+        FileNotFoundError: if the dataset named by ``fit`` does not exist
+        ValueError: for an invalid request or a fit that does not match the data
+    """
+    mode = data.get('mode', 'fit')
+    if mode == 'fit':
+        steps, applied_operations = cleaning_steps(data.get('operations', {}), df, missing)
+        # The fit is stored with the cleaned dataset, to clean new data
+        for step in steps:
+            step.persist_fit = True
+        return steps, applied_operations, None
+    if mode != 'apply':
+        raise ValueError(f"Unsupported cleaning mode: {mode}. Supported: fit, apply")
+    if not data.get('fit'):
+        raise ValueError("Apply mode needs the name of the cleaned dataset whose fit to reuse")
+    fit_filename = upload_catalog.resolve(secure_filename(data['fit']))
+    if not fit_filename:
+        raise FileNotFoundError(f"Dataset {data['fit']} not found")
+    stored_fit = load_metadata(app.config['UPLOAD_FOLDER'], fit_filename).get('cleaning_fit')
+    if not stored_fit:
+        raise ValueError(f"Dataset {fit_filename} has no stored cleaning fit")
+    logger.info(f"Applying the cleaning fit of {fit_filename} without refitting")
+    return fitted_steps(stored_fit, df.columns), stored_fit['operations_applied'], stored_fit
+
+def cleaning_fit(data, filename, steps, applied_operations, vocabulary, stored_fit=None):
+    """Fitted parameters of a cleaning run, stored with the cleaned dataset
+    so later runs can apply them. An applied fit is passed on unchanged."""
+    if stored_fit is not None:
+        return stored_fit
+    return convert_to_native_types(dict(
+        fit_record(steps, vocabulary),
+        fitted_on=filename,
+        fitted_at=datetime.now().isoformat(),
+        operations_applied=applied_operations
+    ))
+
+def fit_summary(fit, vocabulary, stored_fit=None):
+    """Describe the fit of a cleaning run for its response; applying a stored
+    fit also counts the normalized values its vocabulary has not seen."""
+    summary = {
+        'mode': 'fit' if stored_fit is None else 'apply',
+        'fitted_on': fit['fitted_on'],
+        'fitted_at': fit['fitted_at']
+    }
+    if stored_fit is not None:
+        summary['unseen_values'] = vocabulary.unseen(stored_fit['vocabulary'])
+    return summary
+
+def cleaning_steps(ops, df, missing):
+    """Turn the operations of a cleaning request into plan steps.
+    
+    Args:
+        ops: the request's operations
+        df: the dataset, or a sample of it with the same dtypes
+        missing: missing value count of each column
+    
+    Returns:
+        tuple: (list of Step in requested order, names of the applied operations)
+    """
+    # Track applied operations for reporting
+    applied_operations = []
     
-    # Get the most recent file if multiple matches exist
-    # For simplicity, we'll use alphabetical sorting which works for timestamps in YYYYMMDD format
-    latest_file = sorted(all_matches)[-1]
-    logger.info(f"Found match for {base_filename}: {latest_file}")
-    return latest_file
+    # Operations are collected in their documented order, then compiled
+    # into a plan that may run row filters earlier and fuses column passes
+    steps = []
+    numeric = list(df.select_dtypes(include=np.number).columns)
+    
+    # Text normalization
+    if isinstance(ops, dict) and (ops.get('normalizeText') or ops.get('normalize_text')):
+        logger.info("Applying text normalization")
+        # Get selected text columns or use all text columns
+        text_columns = ops.get('selectedColumns', {}).get('textColumns', [])
+        if not text_columns:
+            text_columns = df.select_dtypes(include=['object']).columns
+        
+        # Lowercase and trim unless the request picks other options
+        options = text_options(ops.get('textOptions') or ops.get('text_options'))
+        steps.append(Step('normalize_text', [col for col in text_columns if col in df.columns], **options))
+        applied_operations.append('text_normalization')
+    
+    # Missing values
+    if isinstance(ops, dict):
+        missing_values_strategy = ops.get('handleMissingValues') or ops.get('handle_missing_values')
+        if missing_values_strategy and missing_values_strategy != 'none':
+            logger.info(f"Handling missing values with strategy: {missing_values_strategy}")
+            
+            # Get selected numeric columns or use all numeric columns
+            numeric_columns = ops.get('selectedColumns', {}).get('numericColumns', [])
+            if not numeric_columns:
+                numeric_columns = numeric
+            
+            if missing_values_strategy == 'impute':
+                steps.append(Step('impute', numeric_columns, strategy='mean'))
+            elif missing_values_strategy == 'custom':
+                custom_value = ops.get('customMissingValue', '')
+                try:
+                    # Try to convert custom value to float for numeric columns
+                    custom_value = float(custom_value)
+                    steps.append(Step('fill_missing', numeric_columns, value=custom_value))
+                except (ValueError, TypeError):
+                    # If conversion fails, treat it as a string value
+                    logger.warning(f"Could not convert custom value '{custom_value}' to float, using as string")
+                    steps.append(Step('fill_missing', df.columns, value=custom_value))
+                    # Numeric columns with missing values now hold text
+                    numeric = [col for col in numeric if not missing[col]]
+            elif missing_values_strategy == 'remove':
+                steps.append(Step('drop_missing', numeric_columns))
+            
+            applied_operations.append('missing_values')
+    
+    # Outliers
+    if isinstance(ops, dict) and (ops.get('detectOutliers') or ops.get('detect_outliers')):
+        logger.info("Detecting and handling outliers")
+        
+        # Get selected outlier columns or use all numeric columns
+        outlier_columns = ops.get('selectedColumns', {}).get('outlierColumns', [])
+        if not outlier_columns:
+            outlier_columns = numeric
+        
+        steps.append(Step('clip_outliers', [col for col in outlier_columns if col in df.columns]))
+        applied_operations.append('outliers')
+    
+    # Duplicates
+    if isinstance(ops, dict) and (ops.get('removeDuplicates') or ops.get('remove_duplicates')):
+        logger.info("Removing duplicates")
+        
+        # Get selected duplicate check columns or use all columns
+        duplicate_columns = ops.get('selectedColumns', {}).get('duplicateCheckColumns', [])
+        steps.append(Step('dedupe', duplicate_columns or None))
+        applied_operations.append('duplicates')
+    
+    return steps, applied_operations
 
-def read_file_with_encoding(filepath, file_type='csv'):
-    """Read file with different encodings if UTF-8 fails."""
+def read_file_with_encoding(filepath, file_type='csv', detection=None, schema=None):
+    """Read a file in a single parse using its stored or freshly detected format.
+    
+    With a stored ``schema`` the columns are parsed straight to their types
+    instead of being inferred.
+    """
     logger.info(f"Reading file: {filepath} of type: {file_type}")
     
-    # Try these encodings in order - adding UTF-16 encodings
-    encodings = ['utf-8', 'utf-16', 'utf-16le', 'utf-16be', 'latin1', 'iso-8859-1', 'cp1252']
+    if detection is None:
+        detection = detect_file_format(filepath, file_type)
     
-    # For CSV files, try with and without BOM detection
-    if file_type == 'csv':
-        try:
-            # First try with utf-8-sig to handle BOM characters
-            logger.info(f"Trying to read CSV with utf-8-sig encoding to handle BOM")
-            df = pd.read_csv(filepath, encoding='utf-8-sig')
-            if not df.empty and len(df.columns) > 0:
-                logger.info(f"Successfully read file with utf-8-sig encoding")
-                return df
-        except Exception as e:
-            logger.debug(f"Failed to read with utf-8-sig encoding: {str(e)}")
+    try:
+        if file_type in ['xls', 'xlsx']:
+            return apply_schema(read_excel_sheet(filepath, detection.get('sheet_name')), schema)
+        elif file_type in JSON_EXTENSIONS:
+            return apply_schema(read_json_file(filepath, detection), schema)
+        elif file_type in ['csv', 'txt']:
+            try:
+                return ingestion_agent.read_text(filepath, detection, schema)
+            except UnicodeDecodeError:
+                # The sample decoded cleanly but a byte further into the file did not;
+                # latin1 maps every byte so the second parse cannot fail on decoding
+                logger.warning(f"Encoding {detection.get('encoding')} failed past the sample, retrying with latin1")
+                detection['encoding'] = 'latin1'
+                return ingestion_agent.read_text(filepath, detection, schema)
+        else:
+            raise ValueError(f"Unsupported file type: {file_type}")
+    except ValueError:
+        raise
+    except Exception as e:
+        error_msg = f"Failed to read file with detected format {detection}: {str(e)}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+def remove_upload(filename):
+    """Delete a stored upload with its canonical copy, metadata and catalog entries.
     
-    last_error = None
-    for encoding in encodings:
-        try:
-            if file_type == 'csv':
-                # Try with different CSV parser settings
-                for sep in [',', ';', '\t', '|']:
-                    try:
-                        logger.info(f"Trying to read CSV with encoding: {encoding}, separator: {sep}")
-                        df = pd.read_csv(filepath, encoding=encoding, sep=sep)
-                        # Validate that we have meaningful data
-                        if len(df.columns) > 1 or (len(df.columns) == 1 and len(df) > 0):
-                            # Check if the columns look reasonable (not starting with BOM characters)
-                            if not any(col.startswith('ÿþ') or col.startswith('þÿ') for col in df.columns):
-                                logger.info(f"Successfully read CSV with encoding: {encoding}, separator: {sep}")
-                                return df
-                            else:
-                                logger.warning(f"Found BOM characters in column names with {encoding}, trying next encoding")
-                    except Exception as e:
-                        logger.debug(f"Failed with encoding {encoding}, separator {sep}: {str(e)}")
-                        continue
-            elif file_type in ['xls', 'xlsx']:
-                df = pd.read_excel(filepath)
-                logger.info(f"Successfully read Excel file")
-                return df
-            elif file_type == 'json':
-                df = pd.read_json(filepath, encoding=encoding)
-                logger.info(f"Successfully read JSON with encoding: {encoding}")
-                return df
-            elif file_type == 'txt':
-                # Try different delimiters for txt files
-                for delimiter in ['\t', ',', ';', '|']:
-                    try:
-                        df = pd.read_csv(filepath, encoding=encoding, sep=delimiter)
-                        if len(df.columns) > 1:  # Found a valid delimiter
-                            logger.info(f"Successfully read TXT with encoding: {encoding}, delimiter: {delimiter}")
-                            return df
-                    except Exception as e:
-                        logger.debug(f"Failed with encoding {encoding}, delimiter {delimiter}: {str(e)}")
-                        continue
-            else:
-                raise ValueError(f"Unsupported file type: {file_type}")
-        except Exception as e:
-            last_error = str(e)
-            logger.debug(f"Failed to read with encoding {encoding}: {str(e)}")
-            continue
+    Returns:
+        int: bytes freed on disk
+    """
+    folder = app.config['UPLOAD_FOLDER']
+    filepath = os.path.join(folder, filename)
+    metadata = load_metadata(folder, filename)
+    freed = sum(os.path.getsize(path) for path in (filepath, canonical_path(folder, filename))
+                if os.path.exists(path))
+    os.remove(filepath)
+    upload_catalog.remove(filename)
+    dataframe_cache.invalidate(filepath)
+    release_content(folder, metadata.get('sha256'), filename)
+    delete_canonical(folder, filename)
+    delete_metadata(folder, filename)
+    delete_schema(SOURCE_UPLOADS, filename)
+    return freed
+
+def load_dataset(filename, file_type, categorical=True):
+    """Load an uploaded dataset from its canonical copy, parsing the raw file only if needed.
     
-    # If we get here, all encodings failed
-    error_msg = f"Failed to read file with any encoding. Last error: {last_error}"
-    logger.error(error_msg)
-    raise ValueError(error_msg)
+    Columns get the types of the dataset's stored schema. With
+    ``categorical=False`` categorical candidates are returned as plain object
+    columns, for code that writes new values into them. Loaded frames are kept
+    in the process-wide DataFrame cache, keyed on the raw file's mtime and size
+    and on the stored schema.
+    """
+    key = file_key(os.path.join(app.config['UPLOAD_FOLDER'], filename), load_schema(SOURCE_UPLOADS, filename),
+                   categorical)
+    df = dataframe_cache.get(key)
+    if df is None:
+        df = read_dataset(filename, file_type, categorical)
+        dataframe_cache.put(key, df)
+    return df
+
+def read_dataset(filename, file_type, categorical=True):
+    """Read an uploaded dataset from disk, bypassing the DataFrame cache."""
+    schema = load_schema(SOURCE_UPLOADS, filename)
+    df = read_canonical(app.config['UPLOAD_FOLDER'], filename)
+    if df is not None:
+        logger.info(f"Loaded canonical copy of {filename}")
+        return apply_schema(df, schema, categorical)
+    
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    metadata = load_metadata(app.config['UPLOAD_FOLDER'], filename)
+    df = read_file_with_encoding(filepath, file_type, metadata.get('detection'), schema)
+    if schema is None:
+        # Backfill the schema of uploads that predate the catalog
+        schema = infer_schema(df)
+        df = apply_schema(df, schema)
+        save_schema(SOURCE_UPLOADS, filename, schema, file_type, filepath, os.path.getsize(filepath), len(df))
+    
+    if 'canonical' in metadata and metadata['canonical'] is None:
+        # The data has already been found not to fit in Parquet
+        return apply_schema(df, schema, categorical)
+    
+    # Backfill the canonical copy for uploads that predate it or changed on disk
+    save_metadata(app.config['UPLOAD_FOLDER'], filename, {
+        'dtypes': {str(col): str(dtype) for col, dtype in df.dtypes.items()},
+        'canonical': write_canonical(app.config['UPLOAD_FOLDER'], filename, df)
+    })
+    return apply_schema(df, schema, categorical)
+
+def load_preview(filename, file_type, nrows):
+    """Load the first ``nrows`` rows of a dataset and its total row count.
+    
+    Only the head of the data is decoded: the first Parquet row group of the
+    canonical copy, or ``nrows`` lines of a raw text file, whose rows are then
+    counted by a newline scan. Other raw formats fall back to a full load.
+    A dataset already in the DataFrame cache is not read at all.
+    """
+    key = file_key(os.path.join(app.config['UPLOAD_FOLDER'], filename), load_schema(SOURCE_UPLOADS, filename),
+                   True)
+    cached = dataframe_cache.get(key, copy=False)
+    if cached is not None:
+        return cached.head(nrows).copy(), len(cached)
+    
+    df, total_rows = read_canonical_head(app.config['UPLOAD_FOLDER'], filename, nrows)
+    if df is not None:
+        return df, total_rows
+    
+    metadata = load_metadata(app.config['UPLOAD_FOLDER'], filename)
+    detection = metadata.get('detection')
+    if file_type in ['csv', 'txt'] and detection:
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        schema = load_schema(SOURCE_UPLOADS, filename)
+        options = dict(read_csv_kwargs(detection), **pandas_read_options(schema, detection.get('has_header', True)))
+        df = apply_schema(pd.read_csv(filepath, nrows=nrows, **options), schema)
+        return df, count_rows(filepath, detection)
+    
+    df = load_dataset(filename, file_type)
+    return df, len(df)
+
+def cleaned_file_detection(file_type):
+    """Format of a file written by clean_data, so it never needs detecting."""
+    if file_type in ['xls', 'xlsx']:
+        return {'file_type': file_type, 'encoding': 'utf-8', 'bom': False}
+    if file_type in JSON_EXTENSIONS:
+        return {
+            'file_type': file_type,
+            'encoding': 'utf-8',
+            'bom': False,
+            'json_layout': 'lines' if file_type in JSON_LINES_EXTENSIONS else 'document'
+        }
+    return {
+        'file_type': file_type,
+        'encoding': 'utf-8',
+        'bom': False,
+        'delimiter': '\t' if file_type == 'txt' else ',',
+        'quotechar': '"',
+        'header_row': 0,
+        'has_header': True
+    }
+
+# Deletes upload versions past their retention when enabled; POST /maintenance runs it
+# on demand, as a dry run while it is disabled
+maintenance_config = load_config().get('maintenance') or {}
+maintenance = MaintenanceService(UPLOAD_FOLDER, upload_catalog, remove_upload, config=maintenance_config)
 
 if __name__ == '__main__':
+    # Scheduled only for the server process and when enabled, never on import
+    if maintenance_config.get('enabled', False):
+        maintenance.start()
     app.run(host='127.0.0.1', port=5000)
\ No newline at end of file
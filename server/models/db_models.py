@@ -1,23 +1,34 @@
 from datetime import datetime
 from typing import Dict, Any
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, JSON, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from storage.database import Base
 
 class Dataset(Base):
     """Dataset model for database storage."""
     __tablename__ = 'datasets'
+    # Names are unique within a source. Listings filter by source and page
+    # through one of these orderings
+    __table_args__ = (
+        UniqueConstraint('source', 'name', name='uq_datasets_source_name'),
+        Index('ix_datasets_source_name', 'source', 'name', 'id'),
+        Index('ix_datasets_source_updated_at', 'source', 'updated_at', 'id'),
+        Index('ix_datasets_source_size_bytes', 'source', 'size_bytes', 'id'),
+    )
 
     id = Column(Integer, primary_key=True)
-    name = Column(String, unique=True, nullable=False)
+    name = Column(String, nullable=False)
     description = Column(String)
+    # 'uploads' for files in the upload folder, 'storage' for StorageAgent datasets
+    source = Column(String, nullable=False)
     file_type = Column(String, nullable=False)
     storage_path = Column(String, nullable=False)
     size_bytes = Column(Integer, nullable=False)
     num_rows = Column(Integer, nullable=False)
     num_columns = Column(Integer, nullable=False)
     column_types = Column(JSON)
-    metadata = Column(JSON)
+    # 'metadata' is reserved on declarative classes, so the attribute is renamed
+    dataset_metadata = Column('metadata', JSON)
     is_cleaned = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,9 +1,11 @@
-from typing import List, Dict, Union, Optional
+from typing import Any, List, Dict, Union, Optional
 import pandas as pd
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine
 from pathlib import Path
 import os
+from utils.arrow_csv import read_delimited
+from utils.file_detection import detect_file_format
 
 class DataSource:
     def __init__(self):
@@ -20,7 +22,7 @@ class DataSource:
         Args:
             source_type: Type of source ('file', 'database', 'query')
             **kwargs: Source-specific parameters
-                For file: path
+                For file: path, engine, column_types, null_values, dtype_backend
                 For database: db_name, table_name, schema
                 For query: db_name, query
         """
@@ -33,15 +35,33 @@ class DataSource:
         else:
             raise ValueError(f"Unsupported source type: {source_type}")
     
-    def _read_file(self, path: str) -> pd.DataFrame:
-        """Read data from a file."""
+    def _read_file(self, path: str, engine: str = 'pandas',
+                   column_types: Optional[Dict[str, Any]] = None,
+                   null_values: Optional[List[str]] = None,
+                   dtype_backend: Optional[str] = None) -> pd.DataFrame:
+        """
+        Read data from a file.
+        
+        Args:
+            path: file path
+            engine: CSV parser, 'pandas' or 'pyarrow' (multi-threaded, falls back to pandas)
+            column_types: explicit Arrow types per column for the pyarrow engine
+            null_values: strings read as missing
+            dtype_backend: 'pyarrow' to keep Arrow-backed columns
+        """
         file_ext = Path(path).suffix.lower()
         if file_ext == '.csv':
-            return pd.read_csv(path)
+            if engine == 'pandas' and not (column_types or null_values or dtype_backend):
+                return pd.read_csv(path)
+            return read_delimited(path, detect_file_format(path, 'csv'), engine=engine,
+                                  column_types=column_types, null_values=null_values,
+                                  dtype_backend=dtype_backend)
         elif file_ext in ['.xlsx', '.xls']:
             return pd.read_excel(path)
         elif file_ext == '.json':
             return pd.read_json(path)
+        elif file_ext in ['.ndjson', '.jsonl']:
+            return pd.read_json(path, lines=True)
         else:
             raise ValueError(f"Unsupported file type: {file_ext}")
     
@@ -92,6 +112,8 @@ class DataSource:
             df.to_excel(path, index=False)
         elif file_ext == '.json':
             df.to_json(path, orient='records')
+        elif file_ext in ['.ndjson', '.jsonl']:
+            df.to_json(path, orient='records', lines=True)
         else:
             raise ValueError(f"Unsupported file type: {file_ext}")
     
@@ -0,0 +1,404 @@
+import math
+import time
+import numpy as np
+import pandas as pd
+from utils.cleaning_plan import COLUMN_OPERATIONS, is_row_wise, tukey_fences
+from utils.logging import get_logger
+from utils.quantile_sketch import QuantileSketch, ColumnSketches, DEFAULT_K
+from utils.row_fingerprint import RowFingerprints
+
+logger = get_logger(__name__)
+
+
+class FingerprintSet:
+    """Row fingerprints seen so far in a stream of chunks.
+    
+    Fingerprints are kept in sorted uint64 arrays whose sizes roughly double
+    from newest to oldest, merged like the digits of a binary counter, so
+    adding a chunk costs O(chunk log n) amortized and membership tests are
+    binary searches. Memory is 8 bytes per distinct row.
+    """
+    
+    def __init__(self):
+        self.levels = []
+    
+    def __len__(self):
+        return sum(len(level) for level in self.levels)
+    
+    def add(self, fingerprints):
+        """Add a chunk's fingerprints.
+        
+        Returns:
+            numpy.ndarray: mask of the rows whose fingerprint was not seen
+            before, in earlier chunks or earlier in this one
+        """
+        new = ~pd.Series(fingerprints, copy=False).duplicated().to_numpy()
+        candidates = np.flatnonzero(new)
+        for level in self.levels:
+            values = fingerprints[candidates]
+            positions = np.minimum(np.searchsorted(level, values), len(level) - 1)
+            seen = level[positions] == values
+            new[candidates[seen]] = False
+            candidates = candidates[~seen]
+        if not len(candidates):
+            return new
+        added = np.sort(fingerprints[candidates])
+        while self.levels and len(self.levels[-1]) <= len(added):
+            added = np.sort(np.concatenate([self.levels.pop(), added]))
+        self.levels.append(added)
+        return new
+
+
+class _Imputation:
+    # Streams the mean (sum and count) or mode (merged value counts) of a column
+    
+    def __init__(self, step):
+        self.step = step
+        self.missing = False
+        self.total = 0.0
+        self.count = 0
+        self.counts = None
+        self.strategy = step.params.get('strategy', 'mean')
+    
+    def update(self, values):
+        self.missing = self.missing or values.hasnans
+        if self.strategy == 'mean':
+            values = values.astype('float64')
+            self.total += float(values.sum())
+            self.count += int(values.count())
+            return
+        counts = values.value_counts()
+        self.counts = counts if self.counts is None else self.counts.add(counts, fill_value=0)
+    
+    def result(self):
+        if not self.missing and not self.step.persist_fit:
+            return {'value': None}
+        if self.strategy == 'mean':
+            return {'value': self.total / self.count if self.count else float('nan')}
+        if self.counts is None or not len(self.counts):
+            return {'value': None}
+        # Series.mode breaks ties by taking the smallest value
+        modes = self.counts.index[self.counts == self.counts.max()]
+        try:
+            return {'value': sorted(modes)[0]}
+        except TypeError:
+            return {'value': modes[0]}
+
+
+class _TextFill:
+    # Whether a column holds missing values a text fill turns it to object for
+    
+    def __init__(self, step):
+        self.to_object = False
+    
+    def update(self, values):
+        self.to_object = self.to_object or (values.dtype != object and values.hasnans)
+    
+    def result(self):
+        return {'to_object': self.to_object}
+
+
+class _Range:
+    # Streams the minimum and maximum of a column
+    
+    def __init__(self, step):
+        self.min = float('nan')
+        self.max = float('nan')
+    
+    def update(self, values):
+        values = values.astype('float64')
+        if values.count():
+            self.min = float(np.fmin(self.min, values.min()))
+            self.max = float(np.fmax(self.max, values.max()))
+
+
+def sketch_fences(sketch):
+    """Fitted clip_outliers statistics of a column from its quantile sketch."""
+    q1, q3 = sketch.quantiles([0.25, 0.75])
+    return tukey_fences(q1, q3, sketch.min, sketch.max)
+
+
+class _Quartiles:
+    # Streams the Tukey fences of a column through a quantile sketch
+    
+    def __init__(self, step, k=DEFAULT_K):
+        self.sketch = QuantileSketch(k)
+    
+    def update(self, values):
+        self.sketch.update(values.to_numpy(dtype='float64', na_value=np.nan))
+    
+    def result(self):
+        return sketch_fences(self.sketch)
+
+
+class _Moments(_Range):
+    # Streams the mean and sample standard deviation of a column, merging
+    # chunk moments with Chan's parallel update
+    
+    def __init__(self, step):
+        super().__init__(step)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+    
+    def update(self, values):
+        super().update(values)
+        values = values.astype('float64').dropna()
+        count = len(values)
+        if not count:
+            return
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+    
+    def result(self):
+        return {
+            'mean': self.mean if self.count else float('nan'),
+            'std': math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else float('nan'),
+            'min': self.min,
+            'max': self.max
+        }
+
+
+ACCUMULATORS = {
+    'impute': _Imputation,
+    'fill_missing': _TextFill,
+    'clip_outliers': _Quartiles,
+    'replace_outliers': _Moments,
+}
+
+
+def fit_levels(steps):
+    """Number the fit pass of each step that needs column statistics.
+    
+    A step's statistics are taken on its columns as they stand when it runs.
+    They depend on an earlier fitted step when that step rewrites the same
+    columns, or when a row filter between the two reads what it rewrote.
+    Each step is fitted one pass after the latest step it depends on, so
+    independent steps share a pass. Steps fitted already need no pass.
+    
+    Returns:
+        dict: step number -> fit pass (from 1)
+    """
+    levels = {}
+    for number, step in enumerate(steps):
+        if step.filters_rows or is_row_wise(step) or all(column in step.fitted for column in step.columns):
+            continue
+        level = 1
+        for earlier, earlier_level in levels.items():
+            written = set(steps[earlier].columns)
+            filtered = any(other.filters_rows and (other.columns is None or written & set(other.columns))
+                           for other in steps[earlier + 1:number])
+            if filtered or written & set(step.columns):
+                level = max(level, earlier_level + 1)
+        levels[number] = level
+    return levels
+
+
+class OutOfCoreCleaning:
+    """Run a compiled cleaning plan over a dataset streamed in chunks.
+    
+    Statistics steps (imputation, outlier bounds, filling with text) first
+    stream the data in fit passes that collect global statistics: sums and
+    counts for means, merged value counts for modes, moments for standard
+    deviations and quantile sketches for the interquartile range. Steps that
+    depend on each other's output are fitted in successive passes (see
+    :func:`fit_levels`); a plan without such steps needs none. The apply pass
+    then cleans chunk by chunk with the fitted statistics. Dedupes stream
+    exactly: a row is dropped when its fingerprint was seen earlier in the
+    stream, which keeps first occurrences like ``drop_duplicates``.
+    
+    Only a few chunks and the statistics are held in memory: per column a
+    sketch of a few KB, or the distinct values for modes, plus a
+    :class:`FingerprintSet` per dedupe and for the duplicate counts.
+    
+    Results match :meth:`CleaningPlan.execute` on the whole frame, given
+    chunks with the dtypes of the whole frame, within these tolerances:
+    
+    - means and standard deviations are summed chunk by chunk, so they (and
+      the values they fill) may differ from pandas by about 1e-9 relative
+    - outlier fences come from quantiles off by at most
+      :func:`utils.quantile_sketch.rank_error` in rank (exact while a column
+      fits the sketch, about 200 values), so values near a fence may be
+      clipped differently
+    - everything else is exact, up to fingerprint collisions (about 2**-64
+      per pair of rows)
+    
+    Outlier steps that see the data as read (no filter or transform of
+    their columns runs before them) take their fences from stored sketches
+    of the data when given, which can save the fit pass altogether. Sketches
+    such steps build are added to ``sketches`` for storing, and the apply
+    pass sketches the numeric columns of the cleaned data in
+    ``output_sketches``.
+    """
+    
+    def __init__(self, plan, read_chunks, sketch_k=DEFAULT_K, sketches=None):
+        """
+        Args:
+            plan: CleaningPlan from ``compile_plan``
+            read_chunks: callable returning a new iterator over the data's
+                DataFrame chunks, called once per pass
+            sketch_k: parameter of the quantile sketches
+            sketches: ColumnSketches of the data, or None; ignored when
+                coarser than ``sketch_k``
+        """
+        self.plan = plan
+        self.read_chunks = read_chunks
+        self.sketch_k = sketch_k
+        if sketches is None or sketches.k < sketch_k:
+            sketches = ColumnSketches(sketch_k)
+        self.sketches = sketches
+        self.sketches_added = False
+        self.output_sketches = ColumnSketches(sketch_k)
+        for number, step in enumerate(plan.steps):
+            if step.operation != 'clip_outliers':
+                continue
+            for column in self._unchanged(number):
+                if column in sketches.columns and column not in step.fitted:
+                    step.fitted[column] = sketch_fences(sketches.columns[column])
+        self.levels = fit_levels(plan.steps)
+        self.fit_passes = max(self.levels.values(), default=0)
+        self.initial_stats = None
+        self.final_stats = None
+    
+    def _unchanged(self, number):
+        # Columns of step ``number`` that reach it as they were read
+        earlier = self.plan.steps[:number]
+        if any(step.filters_rows for step in earlier):
+            return []
+        written = {column for step in earlier for column in step.columns}
+        return [column for column in self.plan.steps[number].columns if column not in written]
+    
+    def _accumulator(self, step):
+        if step.operation == 'clip_outliers':
+            return _Quartiles(step, self.sketch_k)
+        return ACCUMULATORS[step.operation](step)
+    
+    def _filter(self, chunk, number, step, seen, record):
+        if step.operation == 'dedupe':
+            keep = seen.setdefault(number, FingerprintSet()).add(
+                RowFingerprints(chunk).fingerprints(step.columns))
+        else:
+            subset = chunk if step.columns is None else chunk[step.columns]
+            keep = subset.notna().all(axis=1).to_numpy()
+        if record:
+            step.rows_in += len(chunk)
+            step.rows_out += int(keep.sum())
+            if step.operation == 'dedupe':
+                step.cells += len(chunk) - int(keep.sum())
+            else:
+                step.cells += int(chunk[~keep].isna().sum().sum())
+        return chunk[keep]
+    
+    def _run(self, chunk, steps, seen, fit_level=None, accumulators=None):
+        """Run ``steps`` on a chunk.
+        
+        In a fit pass, steps fitted at ``fit_level`` feed their accumulators
+        instead of running, and steps fitted later are skipped: no step fitted
+        in this pass reads their output.
+        """
+        record = fit_level is None
+        chunk = chunk.copy(deep=False)
+        for number, step in enumerate(steps):
+            start = time.perf_counter()
+            if step.filters_rows:
+                chunk = self._filter(chunk, number, step, seen, record)
+            elif fit_level is not None and self.levels.get(number, 0) >= fit_level:
+                if self.levels[number] == fit_level:
+                    for column, accumulator in accumulators[number].items():
+                        accumulator.update(chunk[column])
+            else:
+                for column in step.columns:
+                    values = chunk[column]
+                    missing = int(values.isna().sum()) if record and step.operation in ('impute', 'fill_missing') else 0
+                    values = COLUMN_OPERATIONS[step.operation](values, step, step.fitted.get(column))
+                    if missing:
+                        step.cells += missing - int(values.isna().sum())
+                    chunk[column] = values
+                if record:
+                    step.rows_in += len(chunk)
+                    step.rows_out = step.rows_in
+            if record:
+                step.seconds += time.perf_counter() - start
+        return chunk
+    
+    def fit(self):
+        """Run the fit passes, recording each step's statistics in ``step.fitted``."""
+        steps = self.plan.steps
+        for level in range(1, self.fit_passes + 1):
+            start = time.perf_counter()
+            fitted = [number for number, step_level in self.levels.items() if step_level == level]
+            accumulators = {number: {column: self._accumulator(steps[number]) for column in steps[number].columns
+                                     if column not in steps[number].fitted}
+                            for number in fitted}
+            # Steps after the last one fitted in this pass do not matter to it
+            prefix = steps[:max(fitted) + 1]
+            seen = {}
+            rows = 0
+            for chunk in self.read_chunks():
+                rows += len(chunk)
+                self._run(chunk, prefix, seen, level, accumulators)
+            for number in fitted:
+                unchanged = self._unchanged(number) if steps[number].operation == 'clip_outliers' else []
+                for column, accumulator in accumulators[number].items():
+                    steps[number].fitted[column] = accumulator.result()
+                    # Sketches of the data as read can be stored and reused
+                    if column in unchanged and column not in self.sketches.columns:
+                        self.sketches.columns[str(column)] = accumulator.sketch
+                        self.sketches.rows = rows
+                        self.sketches_added = True
+            logger.info(f"Fit pass {level} of {self.fit_passes} fitted {len(fitted)} steps "
+                        f"in {time.perf_counter() - start:.3f}s")
+    
+    def apply(self):
+        """Clean the data chunk by chunk, fitting first if needed.
+        
+        Chunks emptied by filters are skipped, except that a result with no
+        rows still yields one empty chunk. ``initial_stats`` and
+        ``final_stats`` (rows, missing values, duplicates) are set once the
+        chunks are consumed.
+        
+        Yields:
+            pandas.DataFrame: cleaned chunks
+        """
+        start = time.perf_counter()
+        if any(column not in self.plan.steps[number].fitted
+               for number in self.levels for column in self.plan.steps[number].columns):
+            self.fit()
+        for step in self.plan.steps:
+            step.seconds = 0.0
+            step.cells = 0
+            step.rows_in = step.rows_out = 0
+        
+        initial = {'rows': 0, 'missing_values': 0}
+        final = {'rows': 0, 'missing_values': 0}
+        initial_rows, final_rows = FingerprintSet(), FingerprintSet()
+        seen = {}
+        yielded = False
+        last = None
+        for chunk in self.read_chunks():
+            initial['rows'] += len(chunk)
+            initial['missing_values'] += int(chunk.isna().sum().sum())
+            initial_rows.add(RowFingerprints(chunk).fingerprints())
+            chunk = self._run(chunk, self.plan.steps, seen)
+            final['rows'] += len(chunk)
+            final['missing_values'] += int(chunk.isna().sum().sum())
+            final_rows.add(RowFingerprints(chunk).fingerprints())
+            self.output_sketches.update(chunk)
+            if len(chunk):
+                yielded = True
+                yield chunk
+            last = chunk
+        if not yielded and last is not None:
+            yield last
+        
+        initial['duplicates'] = initial['rows'] - len(initial_rows)
+        final['duplicates'] = final['rows'] - len(final_rows)
+        self.initial_stats, self.final_stats = initial, final
+        self.plan.seconds = time.perf_counter() - start
+        logger.info(f"Cleaned {initial['rows']} rows out of core in {self.fit_passes} fit passes "
+                    f"and {self.plan.seconds:.3f}s: {final['rows']} rows out")
@@ -0,0 +1,202 @@
+import os
+import re
+import time
+from apscheduler.schedulers.background import BackgroundScheduler
+from storage.upload_catalog import logical_name
+from utils.logging import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: every process runs its own maintenance
+    fcntl = None
+
+logger = get_logger(__name__)
+
+# Newest versions of each logical dataset that are always kept
+KEEP_VERSIONS = 3
+
+# Versions written or read within this many days are kept as well
+KEEP_DAYS = 30
+
+# Seconds between retention runs and between compaction runs
+RETENTION_INTERVAL = 3600
+COMPACTION_INTERVAL = 6 * 3600
+
+# Lock file that lets one worker process at a time run maintenance
+LOCK_FILE = '.maintenance.lock'
+
+# name_YYYYMMDD_HHMMSS_cleaned_YYYYMMDD_HHMMSS.ext was cleaned from name_YYYYMMDD_HHMMSS.ext
+CLEANED_NAME = re.compile(r'^(?P<source>.+)_cleaned_\d{8}_\d{6}(?P<ext>\.[^.]+)$')
+VERSION_TIMESTAMP = re.compile(r'\d{8}_\d{6}')
+
+
+def cleaned_source(filename):
+    """Return the upload a cleaned output was made from, or None."""
+    match = CLEANED_NAME.match(filename)
+    return f"{match.group('source')}{match.group('ext')}" if match else None
+
+
+def _version_order(entry):
+    # A version was written at the last timestamp in its name (the cleaning
+    # time for cleaned outputs)
+    timestamps = VERSION_TIMESTAMP.findall(entry['name'])
+    return timestamps[-1] if timestamps else '', entry['name']
+
+
+def expired_versions(entries, keep_versions=KEEP_VERSIONS, keep_days=KEEP_DAYS, now=None):
+    """Pick the stored upload versions that retention may delete.
+    
+    A version is kept if it is one of the ``keep_versions`` newest versions of
+    its logical dataset (uploads and cleaned outputs alike), if it was written
+    or read in the last ``keep_days`` days, or if a kept cleaned output was
+    made from it.
+    
+    Args:
+        entries: name, modified and optionally last_used time of every upload
+    
+    Returns:
+        list: filenames to delete
+    """
+    cutoff = (now or time.time()) - keep_days * 86400
+    datasets = {}
+    for entry in entries:
+        datasets.setdefault(logical_name(entry['name']), []).append(entry)
+    
+    kept = set()
+    for versions in datasets.values():
+        versions.sort(key=_version_order)
+        for i, entry in enumerate(versions):
+            recent = max(entry['modified'], entry.get('last_used') or 0) >= cutoff
+            if recent or i >= len(versions) - keep_versions:
+                kept.add(entry['name'])
+    
+    for name in list(kept):
+        source = cleaned_source(name)
+        while source and source not in kept:
+            kept.add(source)
+            source = cleaned_source(source)
+    return sorted(entry['name'] for entry in entries if entry['name'] not in kept)
+
+
+class MaintenanceService:
+    """Background retention and compaction of stored datasets.
+    
+    Retention deletes upload versions picked by :func:`expired_versions`
+    through ``delete_upload``, which removes a version with everything
+    derived from it and returns the bytes freed. Compaction merges the small
+    row groups and files that chunked writes leave in the StorageAgent's
+    datasets, and demotes idle datasets from its hot tier. Either part is
+    skipped when its collaborator is not given. Runs take a lock file in the
+    upload folder, so one worker process at a time does the work.
+    
+    Retention is opt-in: unless ``enabled`` is set in the config, runs only
+    report the versions that retention would delete.
+    """
+    
+    def __init__(self, upload_folder, upload_catalog=None, delete_upload=None, storage_agent=None, config=None):
+        config = config or {}
+        self.upload_folder = upload_folder
+        self.upload_catalog = upload_catalog
+        self.delete_upload = delete_upload
+        self.storage_agent = storage_agent
+        self.enabled = config.get('enabled', False)
+        self.keep_versions = config.get('keep_versions', KEEP_VERSIONS)
+        self.keep_days = config.get('keep_days', KEEP_DAYS)
+        self.retention_interval = config.get('retention_interval', RETENTION_INTERVAL)
+        self.compaction_interval = config.get('compaction_interval', COMPACTION_INTERVAL)
+        self.scheduler = None
+    
+    def _locked(self, job):
+        """Run ``job`` unless another process holds the maintenance lock; None if skipped."""
+        if fcntl is None:
+            return job()
+        os.makedirs(self.upload_folder, exist_ok=True)
+        with open(os.path.join(self.upload_folder, LOCK_FILE), 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.info("Maintenance already running in another process, skipping")
+                return None
+            try:
+                return job()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    
+    def apply_retention(self, dry_run=False):
+        """Delete expired upload versions.
+        
+        Args:
+            dry_run: only report the expired versions, deleting nothing
+        
+        Returns:
+            dict: expired and deleted filenames, bytes_reclaimed and dry_run
+        """
+        report = {'expired': [], 'deleted': [], 'bytes_reclaimed': 0, 'dry_run': dry_run}
+        if self.upload_catalog is None or self.delete_upload is None:
+            return report
+        # Access times are unreliable (frozen on noatime mounts), so reads are
+        # the ones the catalog recorded
+        entries = [dict(entry, last_used=self.upload_catalog.last_access(entry['name']))
+                   for entry in self.upload_catalog.entries()]
+        report['expired'] = expired_versions(entries, self.keep_versions, self.keep_days)
+        if dry_run:
+            logger.info(f"Retention would delete {len(report['expired'])} upload versions (dry run)")
+            return report
+        for filename in report['expired']:
+            try:
+                report['bytes_reclaimed'] += self.delete_upload(filename)
+                report['deleted'].append(filename)
+            except OSError as e:
+                logger.error(f"Retention could not delete {filename}: {str(e)}")
+        logger.info(f"Retention deleted {len(report['deleted'])} upload versions, "
+                    f"reclaiming {report['bytes_reclaimed']} bytes")
+        return report
+    
+    def compact_storage(self):
+        """Compact the stored datasets and demote idle ones from the hot tier.
+        
+        Returns:
+            dict: compacted dataset names, bytes_reclaimed and demoted dataset names
+        """
+        report = {'compacted': [], 'bytes_reclaimed': 0, 'demoted': []}
+        if self.storage_agent is None:
+            return report
+        for result in self.storage_agent.compact_datasets():
+            if result and result['compacted']:
+                report['compacted'].append(result['name'])
+                report['bytes_reclaimed'] += result['bytes_before'] - result['bytes_after']
+        if self.storage_agent.hot_tier:
+            report['demoted'] = self.storage_agent.hot_tier.demote()
+        logger.info(f"Compacted {len(report['compacted'])} datasets, "
+                    f"reclaiming {report['bytes_reclaimed']} bytes")
+        return report
+    
+    def run(self):
+        """Run retention and compaction now; retention is a dry run unless enabled.
+        
+        Returns:
+            dict: ``retention`` and ``compaction`` reports, or None if another
+            process is running maintenance
+        """
+        return self._locked(lambda: {'retention': self.apply_retention(dry_run=not self.enabled),
+                                     'compaction': self.compact_storage()})
+    
+    def start(self):
+        """Schedule retention and compaction in a background thread."""
+        self.scheduler = BackgroundScheduler(daemon=True)
+        if self.upload_catalog is not None:
+            self.scheduler.add_job(lambda: self._locked(self.apply_retention), 'interval',
+                                   seconds=self.retention_interval, id='retention',
+                                   max_instances=1, coalesce=True)
+        if self.storage_agent is not None:
+            self.scheduler.add_job(lambda: self._locked(self.compact_storage), 'interval',
+                                   seconds=self.compaction_interval, id='compaction',
+                                   max_instances=1, coalesce=True)
+        self.scheduler.start()
+        logger.info(f"Maintenance scheduled: retention every {self.retention_interval}s, "
+                    f"compaction every {self.compaction_interval}s")
+    
+    def shutdown(self):
+        if self.scheduler is not None:
+            self.scheduler.shutdown(wait=False)
+            self.scheduler = None
@@ -0,0 +1,84 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from utils.excel_reader import list_sheets
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def sheet_dataset_name(dataset_name, sheet_name):
+    """Name of the dataset holding one sheet of a workbook."""
+    return f"{dataset_name}_{re.sub(r'[^0-9A-Za-z_]+', '_', sheet_name).strip('_')}"
+
+
+def sheet_dataset_names(dataset_name, sheets):
+    """Distinct dataset names for the sheets of a workbook, in order.
+    
+    Sheets whose names only differ in the characters sanitizing replaces
+    ("Q1 2024", "Q1-2024") would share a dataset and overwrite each other;
+    every sheet after the first gets a numeric suffix instead.
+    """
+    names = [sheet_dataset_name(dataset_name, sheet) for sheet in sheets]
+    taken = set(names)
+    seen = set()
+    for i, name in enumerate(names):
+        if name in seen:
+            suffix = 2
+            while f"{name}_{suffix}" in taken:
+                suffix += 1
+            names[i] = f"{name}_{suffix}"
+            taken.add(names[i])
+        seen.add(names[i])
+    return names
+
+
+def _ingest_sheet(file_path, sheet_name, dataset_name):
+    # Runs in a worker process, so the agents are created there
+    from agents.ingestion_agent import IngestionAgent
+    from agents.storage_agent import StorageAgent
+    
+    ingestion_agent = IngestionAgent()
+    storage_agent = StorageAgent()
+    try:
+        detection = {'file_type': 'xlsx', 'sheet_name': sheet_name}
+        result = storage_agent.store_dataset(partial(ingestion_agent.iter_chunks, file_path, detection=detection),
+                                             dataset_name)
+        return {
+            "sheet": sheet_name,
+            "dataset_name": dataset_name,
+            "rows": result["rows"],
+            "columns": result["columns"],
+            "storage_info": result["storage_info"]
+        }
+    finally:
+        storage_agent.cleanup()
+
+
+def ingest_workbook(file_path, dataset_name, sheets=None, max_workers=None):
+    """
+    Ingest the sheets of a workbook in parallel, one dataset per sheet.
+    
+    Args:
+        file_path: path of the .xlsx/.xls workbook
+        dataset_name: prefix of the per-sheet dataset names
+        sheets: sheet names to ingest (all sheets if None)
+        max_workers: worker processes (one per sheet, capped at the CPU count, if None)
+    
+    Returns:
+        list of per-sheet results, in workbook order
+    """
+    sheets = sheets or list_sheets(file_path)
+    if not sheets:
+        return []
+    max_workers = max_workers or min(len(sheets), os.cpu_count() or 1)
+    
+    names = sheet_dataset_names(dataset_name, sheets)
+    if max_workers == 1 or len(sheets) == 1:
+        return [_ingest_sheet(file_path, sheet, name) for sheet, name in zip(sheets, names)]
+    
+    logger.info(f"Ingesting {len(sheets)} sheets of {file_path} with {max_workers} workers")
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_ingest_sheet, file_path, sheet, name) for sheet, name in zip(sheets, names)]
+        return [future.result() for future in futures]
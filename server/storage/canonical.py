@@ -0,0 +1,114 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from utils.logging import get_logger
+from utils.parquet import write_parquet, read_footer
+from utils.schema_inference import SchemaMismatch
+
+logger = get_logger(__name__)
+
+# Hidden folder inside the upload folder that holds the typed Parquet copies
+CANONICAL_DIR = '.canonical'
+
+
+def canonical_path(upload_folder, filename):
+    return os.path.join(upload_folder, CANONICAL_DIR, f"{filename}.parquet")
+
+
+def write_canonical(upload_folder, filename, data):
+    """Write the typed Parquet copy of an uploaded dataset.
+    
+    ``data`` is a DataFrame or an iterable of DataFrame chunks. Returns the
+    metadata to record for the copy, or None if the data cannot be represented
+    in Parquet (e.g. object columns mixing numbers and strings), in which case
+    reads keep parsing the raw file.
+    
+    Raises:
+        SchemaMismatch: if a chunk does not fit the schema of the stream, which
+            the caller may fix by reading the data again
+    """
+    path = canonical_path(upload_folder, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        write_info = write_parquet(data, path, compression='snappy')
+    except SchemaMismatch:
+        raise
+    except (pa.ArrowException, ValueError) as e:
+        logger.warning(f"Could not write canonical copy of {filename}: {str(e)}")
+        return None
+    
+    dtypes = pq.read_schema(path).empty_table().to_pandas().dtypes
+    return {
+        'path': os.path.relpath(path, upload_folder),
+        'rows': write_info['rows'],
+        'columns': write_info['columns'],
+        'dtypes': {col: str(dtype) for col, dtype in dtypes.items()},
+        'size': os.path.getsize(path)
+    }
+
+
+def has_canonical(upload_folder, filename):
+    """Whether a canonical copy exists and is at least as new as the raw file."""
+    path = canonical_path(upload_folder, filename)
+    raw_path = os.path.join(upload_folder, filename)
+    if not os.path.exists(path):
+        return False
+    return not os.path.exists(raw_path) or os.path.getmtime(path) >= os.path.getmtime(raw_path)
+
+
+def read_canonical(upload_folder, filename):
+    """Load the canonical copy of an uploaded dataset, or None if there is none."""
+    if not has_canonical(upload_folder, filename):
+        return None
+    return pd.read_parquet(canonical_path(upload_folder, filename))
+
+
+def read_canonical_head(upload_folder, filename, nrows):
+    """Read the first ``nrows`` rows of the canonical copy and its total row count.
+    
+    Only the leading row group(s) are decoded; the row count comes from the
+    Parquet footer. Returns (None, None) if there is no canonical copy.
+    """
+    if not has_canonical(upload_folder, filename):
+        return None, None
+    parquet_file = pq.ParquetFile(canonical_path(upload_folder, filename))
+    batch = next(parquet_file.iter_batches(batch_size=nrows), None)
+    if batch is None:
+        table = parquet_file.schema_arrow.empty_table()
+    else:
+        table = pa.Table.from_batches([batch])
+    return table.to_pandas(), parquet_file.metadata.num_rows
+
+
+def iter_canonical(upload_folder, filename, batch_size):
+    """Read the canonical copy in DataFrame chunks of ``batch_size`` rows.
+    
+    Every chunk gets the dtypes a full read gives: integer and boolean
+    columns holding nulls anywhere in the file (per the footer statistics)
+    are float and object in each chunk, not only in chunks with nulls.
+    Returns None if there is no canonical copy.
+    """
+    if not has_canonical(upload_folder, filename):
+        return None
+    path = canonical_path(upload_folder, filename)
+    parquet_file = pq.ParquetFile(path)
+    column_stats = read_footer(path)['column_stats']
+    nullable = {}
+    for name, dtype in parquet_file.schema_arrow.empty_table().to_pandas().dtypes.items():
+        # An unknown null count (None) may hide nulls; a file without row
+        # groups has no statistics at all
+        if dtype.kind in 'iub' and (column_stats.get(name) or {}).get('null_count') != 0:
+            nullable[name] = 'object' if dtype.kind == 'b' else 'float64'
+    
+    def chunks():
+        for batch in parquet_file.iter_batches(batch_size=batch_size):
+            yield pa.Table.from_batches([batch]).to_pandas().astype(nullable)
+    return chunks()
+
+
+def delete_canonical(upload_folder, filename):
+    """Remove the canonical copy of an uploaded dataset."""
+    path = canonical_path(upload_folder, filename)
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,84 @@
+import os
+import time
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Hidden folder inside the upload folder mapping content hashes to datasets.
+# Each entry is a file named after the hash and file extension (the same bytes
+# uploaded as .csv and .txt parse differently) whose content is the dataset
+# filename; creating it with O_EXCL makes the claim atomic across processes.
+INDEX_DIR = '.hashes'
+
+# How long to wait for a concurrent upload to finish writing its claim
+CLAIM_WAIT_SECONDS = 1.0
+
+
+def _entry_path(upload_folder, sha256, ext):
+    return os.path.join(upload_folder, INDEX_DIR, f"{sha256}{ext.lower()}")
+
+
+def _read_entry(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def lookup_content(upload_folder, sha256, ext):
+    """Return the dataset filename stored under a content hash and extension, or None."""
+    filename = _read_entry(_entry_path(upload_folder, sha256, ext))
+    if filename and os.path.exists(os.path.join(upload_folder, filename)):
+        return filename
+    return None
+
+
+def claim_content(upload_folder, sha256, filename):
+    """Register ``filename`` as the dataset holding content ``sha256``.
+    
+    Returns None if the claim succeeded, or the filename of the dataset that
+    already holds identical content, including one still being processed by
+    another worker.
+    """
+    path = _entry_path(upload_folder, sha256, os.path.splitext(filename)[1])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    
+    deadline = time.monotonic() + CLAIM_WAIT_SECONDS
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            existing = _read_entry(path)
+            if existing is None:
+                # Released between our open and read; try to claim again
+                continue
+            if existing == '' and time.monotonic() < deadline:
+                # Another worker created the entry and is about to write it
+                time.sleep(0.01)
+                continue
+            if existing and existing != filename and os.path.exists(os.path.join(upload_folder, existing)):
+                return existing
+            # The dataset behind the entry is gone, so the entry is stale
+            logger.info(f"Replacing stale content index entry {sha256}")
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            continue
+        
+        with os.fdopen(fd, 'w') as f:
+            f.write(filename)
+        return None
+
+
+def release_content(upload_folder, sha256, filename):
+    """Remove a content hash entry if it still points at ``filename``."""
+    if not sha256:
+        return
+    path = _entry_path(upload_folder, sha256, os.path.splitext(filename)[1])
+    if _read_entry(path) == filename:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -18,6 +18,8 @@ def init_db(config):
     )
     
     Session = scoped_session(sessionmaker(bind=engine))
+    # Register the models on Base before creating their tables
+    import models.db_models
     Base.metadata.create_all(engine)
 
 @contextmanager
@@ -0,0 +1,156 @@
+import base64
+import json
+import os
+from datetime import datetime, timezone
+from sqlalchemy import tuple_
+from sqlalchemy.exc import SQLAlchemyError
+from models.db_models import Dataset
+from storage import database
+from storage.dataset_metadata import load_metadata
+from utils.logging import get_logger
+from utils.errors import InvalidRequest
+
+logger = get_logger(__name__)
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Sort keys accepted by the listing endpoints; each is backed by a
+# (source, column, id) index on the datasets table
+SORT_COLUMNS = {
+    'name': Dataset.name,
+    'modified': Dataset.updated_at,
+    'size': Dataset.size_bytes,
+}
+
+# Sorts after every character, so [prefix, prefix + PREFIX_END) is a range scan
+PREFIX_END = '\U0010ffff'
+
+
+def _timestamp(value):
+    # updated_at is stored as naive UTC
+    return value.replace(tzinfo=timezone.utc).timestamp() if value else None
+
+
+def encode_cursor(value, row_id):
+    """Encode the sort value and id of the last row of a page."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, row_id]).encode()).decode()
+
+
+def decode_cursor(cursor, sort):
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort == 'modified':
+            value = datetime.fromisoformat(value)
+        return value, int(row_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidRequest(f"Invalid cursor: {str(e)}")
+
+
+def list_datasets(source, limit=DEFAULT_PAGE_SIZE, cursor=None, sort='name', order='asc', prefix=None):
+    """Return one page of catalogued datasets with a single indexed query.
+    
+    Pages are keyset-paginated on (sort column, id): the cursor holds the
+    position of the last row returned, so every page costs the same however
+    deep it is.
+    
+    Args:
+        source: 'uploads' or 'storage'
+        limit: rows per page (capped at MAX_PAGE_SIZE)
+        cursor: ``next_cursor`` of the previous page
+        sort: 'name', 'modified' or 'size'
+        order: 'asc' or 'desc'
+        prefix: only list names starting with this string
+    
+    Returns:
+        dict: ``datasets`` and ``next_cursor`` (None on the last page)
+    """
+    if sort not in SORT_COLUMNS:
+        raise InvalidRequest(f"Unsupported sort: {sort}. Supported: {sorted(SORT_COLUMNS)}")
+    if order not in ('asc', 'desc'):
+        raise InvalidRequest(f"Unsupported order: {order}")
+    limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+    column = SORT_COLUMNS[sort]
+    
+    with database.get_db_session() as session:
+        query = session.query(Dataset.id, Dataset.name, Dataset.file_type, Dataset.size_bytes,
+                              Dataset.num_rows, Dataset.num_columns, Dataset.is_cleaned,
+                              Dataset.updated_at).filter(Dataset.source == source)
+        if prefix:
+            query = query.filter(Dataset.name >= prefix, Dataset.name < prefix + PREFIX_END)
+        if cursor:
+            position = tuple_(column, Dataset.id)
+            last = tuple_(*decode_cursor(cursor, sort))
+            query = query.filter(position > last if order == 'asc' else position < last)
+        if order == 'asc':
+            query = query.order_by(column.asc(), Dataset.id.asc())
+        else:
+            query = query.order_by(column.desc(), Dataset.id.desc())
+        # One extra row tells whether there is a next page
+        rows = query.limit(limit + 1).all()
+    
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = page[-1]
+        value = {'name': last.name, 'modified': last.updated_at, 'size': last.size_bytes}[sort]
+        next_cursor = encode_cursor(value, last.id)
+    return {
+        'datasets': [{
+            'name': row.name,
+            'type': row.file_type,
+            'size': row.size_bytes,
+            'rows': row.num_rows,
+            'columns': row.num_columns,
+            'cleaned': bool(row.is_cleaned),
+            'modified': _timestamp(row.updated_at)
+        } for row in page],
+        'next_cursor': next_cursor
+    }
+
+
+def sync_datasets(source, folder, entries):
+    """Reconcile the catalogued datasets of ``source`` with the files of ``folder``.
+    
+    Files missing from the table (uploaded before the catalog existed or
+    copied in by hand) are added from their sidecar metadata, and rows whose
+    file is gone are removed.
+    
+    Args:
+        source: 'uploads' or 'storage'
+        folder: folder holding the files
+        entries: name, size and modified time of every file in the folder,
+            optionally with its path, type, rows and columns
+    """
+    if database.Session is None:
+        return
+    try:
+        with database.get_db_session() as session:
+            known = {name for name, in session.query(Dataset.name).filter(Dataset.source == source)}
+            present = {entry['name'] for entry in entries}
+            for entry in entries:
+                if entry['name'] in known:
+                    continue
+                metadata = load_metadata(folder, entry['name'])
+                modified = datetime.fromtimestamp(entry['modified'], timezone.utc).replace(tzinfo=None)
+                session.add(Dataset(
+                    name=entry['name'],
+                    source=source,
+                    file_type=entry.get('type') or entry['name'].rsplit('.', 1)[-1].lower(),
+                    storage_path=entry.get('path') or os.path.join(folder, entry['name']),
+                    size_bytes=entry['size'],
+                    num_rows=entry.get('rows', metadata.get('rows')) or 0,
+                    num_columns=entry.get('columns', len(metadata.get('columns', []))),
+                    is_cleaned='_cleaned_' in entry['name'],
+                    created_at=modified,
+                    updated_at=modified
+                ))
+            stale = known - present
+            if stale:
+                session.query(Dataset).filter(Dataset.source == source, Dataset.name.in_(stale)) \
+                    .delete(synchronize_session=False)
+            logger.info(f"Synced {source} catalog: {len(present - known)} added, {len(stale)} removed")
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to sync {source} catalog: {str(e)}")
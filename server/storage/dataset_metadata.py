@@ -0,0 +1,48 @@
+import json
+import os
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Hidden folder inside the upload folder that holds per-dataset metadata
+METADATA_DIR = '.meta'
+
+
+def _metadata_path(upload_folder, filename):
+    return os.path.join(upload_folder, METADATA_DIR, f"{filename}.json")
+
+
+def load_metadata(upload_folder, filename):
+    """Load the stored metadata for an uploaded dataset, or an empty dict."""
+    path = _metadata_path(upload_folder, filename)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable metadata for {filename}: {str(e)}")
+        return {}
+
+
+def save_metadata(upload_folder, filename, metadata):
+    """Merge ``metadata`` into the stored metadata for an uploaded dataset."""
+    path = _metadata_path(upload_folder, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    merged = load_metadata(upload_folder, filename)
+    merged.update(metadata)
+
+    # Write to a temporary file first so readers never see a partial document
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(merged, f, default=str)
+    os.replace(tmp_path, path)
+    return merged
+
+
+def delete_metadata(upload_folder, filename):
+    """Remove the stored metadata for an uploaded dataset."""
+    path = _metadata_path(upload_folder, filename)
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+from collections import defaultdict, deque
+import pyarrow as pa
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Reads of a dataset within PROMOTE_WINDOW seconds that promote it to the hot tier
+PROMOTE_HITS = 3
+PROMOTE_WINDOW = 300
+
+# Seconds without reads after which a hot copy is dropped
+DEMOTE_AFTER = 1800
+
+# Total size of the hot copies; the least recently read go first when it is exceeded
+MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# Last reads are recorded in the hot file's mtime, at most this often
+TOUCH_INTERVAL = 60
+
+# Schema metadata recording the version of the Parquet file a hot copy was made from
+SOURCE_MTIME = b'hot_tier.source_mtime_ns'
+SOURCE_SIZE = b'hot_tier.source_size'
+
+
+class HotTier:
+    """Uncompressed Arrow IPC copies of frequently read datasets.
+    
+    Hot copies are opened with memory mapping, so reads are zero-copy and
+    every worker process shares the same page-cache pages instead of holding
+    its own decoded copy of the dataset. A dataset is promoted once one
+    process sees ``promote_hits`` reads of it within ``promote_window``
+    seconds; the copy on disk then serves all processes. The copy's mtime
+    records its last read across processes, and :meth:`demote` drops copies
+    idle for ``demote_after`` seconds, then the least recently read ones
+    until the tier fits in ``max_bytes``.
+    """
+    
+    def __init__(self, folder, promote_hits=PROMOTE_HITS, promote_window=PROMOTE_WINDOW,
+                 demote_after=DEMOTE_AFTER, max_bytes=MAX_BYTES):
+        self.folder = folder
+        self.promote_hits = promote_hits
+        self.promote_window = promote_window
+        self.demote_after = demote_after
+        self.max_bytes = max_bytes
+        self._reads = defaultdict(deque)
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+    
+    def path(self, dataset_name):
+        return os.path.join(self.folder, f"{dataset_name}.arrow")
+    
+    def record_read(self, dataset_name):
+        """Count a read of a dataset and tell whether it should be promoted."""
+        now = time.monotonic()
+        with self._lock:
+            reads = self._reads[dataset_name]
+            reads.append(now)
+            while reads and now - reads[0] > self.promote_window:
+                reads.popleft()
+            return len(reads) >= self.promote_hits
+    
+    def read(self, dataset_name, source_path):
+        """Memory-map the hot copy of a dataset.
+        
+        Returns:
+            pyarrow.Table backed by the mapped file, or None if the dataset is
+            not hot or its copy was made from an older version of ``source_path``
+        """
+        path = self.path(dataset_name)
+        try:
+            table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        except FileNotFoundError:
+            return None
+        except pa.ArrowInvalid as e:
+            logger.warning(f"Dropping unreadable hot copy of {dataset_name}: {str(e)}")
+            self.evict(dataset_name)
+            return None
+        
+        stat = os.stat(source_path)
+        metadata = table.schema.metadata or {}
+        if metadata.get(SOURCE_MTIME) != str(stat.st_mtime_ns).encode() or \
+                metadata.get(SOURCE_SIZE) != str(stat.st_size).encode():
+            logger.info(f"Hot copy of {dataset_name} is stale, dropping it")
+            self.evict(dataset_name)
+            return None
+        
+        try:
+            if time.time() - os.path.getmtime(path) > TOUCH_INTERVAL:
+                os.utime(path)
+        except FileNotFoundError:
+            pass
+        return table
+    
+    def promote(self, dataset_name, source_path, table):
+        """Write ``table``, read from ``source_path``, as the hot copy of a dataset."""
+        stat = os.stat(source_path)
+        metadata = dict(table.schema.metadata or {})
+        metadata[SOURCE_MTIME] = str(stat.st_mtime_ns).encode()
+        metadata[SOURCE_SIZE] = str(stat.st_size).encode()
+        table = table.replace_schema_metadata(metadata)
+        path = self.path(dataset_name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with pa.OSFile(tmp_path, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            # Readers holding the previous copy keep their mapping of it
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with self._lock:
+            self._reads.pop(dataset_name, None)
+        logger.info(f"Promoted {dataset_name} to the hot tier ({os.path.getsize(path)} bytes)")
+        self.demote()
+    
+    def evict(self, dataset_name):
+        """Drop the hot copy of a dataset."""
+        try:
+            os.remove(self.path(dataset_name))
+        except FileNotFoundError:
+            pass
+    
+    def demote(self):
+        """Drop idle hot copies, then the least recently read until the tier fits its budget.
+        
+        Returns:
+            list: names of the demoted datasets
+        """
+        now = time.time()
+        copies = []
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.name.endswith('.arrow'):
+                    stat = entry.stat()
+                    copies.append((stat.st_mtime, stat.st_size, entry.name[:-6]))
+        copies.sort()
+        
+        total = sum(size for _, size, _ in copies)
+        demoted = []
+        for last_read, size, name in copies:
+            if now - last_read <= self.demote_after and total <= self.max_bytes:
+                break
+            self.evict(name)
+            total -= size
+            demoted.append(name)
+        if demoted:
+            logger.info(f"Demoted {len(demoted)} datasets from the hot tier: {demoted}")
+        return demoted
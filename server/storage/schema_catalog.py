@@ -0,0 +1,61 @@
+from sqlalchemy.exc import SQLAlchemyError
+from models.db_models import Dataset
+from storage import database
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# The schema catalog keeps the column types inferred once at upload in
+# Dataset.column_types, so later reads pass them to the parser instead of
+# inferring them again. It is best effort: without a database, reads fall
+# back to inference. Uploads and StorageAgent datasets may share a name, so
+# entries are keyed on (source, name).
+
+# Where a catalogued dataset lives
+SOURCE_UPLOADS = 'uploads'
+SOURCE_STORAGE = 'storage'
+
+
+def save_schema(source, name, schema, file_type, storage_path, size_bytes, num_rows, is_cleaned=False):
+    """Create or update the catalog entry of a dataset of ``source`` with its inferred schema."""
+    if database.Session is None:
+        return
+    try:
+        with database.get_db_session() as session:
+            dataset = session.query(Dataset).filter_by(source=source, name=name).one_or_none()
+            if dataset is None:
+                dataset = Dataset(source=source, name=name)
+                session.add(dataset)
+            dataset.file_type = file_type
+            dataset.storage_path = storage_path
+            dataset.size_bytes = size_bytes
+            dataset.num_rows = num_rows
+            dataset.num_columns = len(schema['columns']) if schema else 0
+            dataset.column_types = schema
+            dataset.is_cleaned = is_cleaned
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to save schema of {name}: {str(e)}")
+
+
+def load_schema(source, name):
+    """Return the stored schema of a dataset of ``source``, or None."""
+    if database.Session is None:
+        return None
+    try:
+        with database.get_db_session() as session:
+            dataset = session.query(Dataset).filter_by(source=source, name=name).one_or_none()
+            return dataset.column_types if dataset is not None else None
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to load schema of {name}: {str(e)}")
+        return None
+
+
+def delete_schema(source, name):
+    """Remove the catalog entry of a dataset of ``source``."""
+    if database.Session is None:
+        return
+    try:
+        with database.get_db_session() as session:
+            session.query(Dataset).filter_by(source=source, name=name).delete()
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to delete schema of {name}: {str(e)}")
@@ -0,0 +1,186 @@
+import bisect
+import os
+import re
+import threading
+import time
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Upload timestamps (name_YYYYMMDD_HHMMSS.ext) and the cleaned-output marker
+# (name_YYYYMMDD_HHMMSS_cleaned_YYYYMMDD_HHMMSS.ext) are stripped to get the
+# logical name shared by every version of a dataset
+VERSION_SUFFIX = re.compile(r'(?:_cleaned)?_\d{8}_\d{6}')
+
+# Seconds between checks of the upload folder's mtime for outside changes
+POLL_INTERVAL = 2.0
+
+# Folder, inside the upload folder, of the files whose mtimes record reads
+ACCESS_FOLDER = '.access'
+
+# Seconds between recorded reads of the same file, so lookups do not write on every request
+ACCESS_RESOLUTION = 3600.0
+
+
+def logical_name(filename):
+    """Return the logical dataset name of a stored filename."""
+    name, ext = os.path.splitext(filename)
+    return f"{VERSION_SUFFIX.sub('', name)}{ext}"
+
+
+class UploadCatalog:
+    """In-memory index of the upload folder.
+    
+    Maps each logical dataset name to its stored versions, ordered by their
+    timestamped filenames, and keeps the size and mtime of every file, so
+    lookups and listings never scan the folder. The index is built from disk
+    once, updated by :meth:`add` and :meth:`remove`, and rebuilt when the
+    folder's mtime shows that files were added or removed by someone else.
+    ``on_rebuild`` is called with the :meth:`entries` after every rebuild.
+    
+    Lookups through :meth:`resolve` record when each file was last used, in
+    the mtime of a marker file under ``.access/``, so every process (and
+    retention) sees it, whatever the mount does with access times.
+    """
+    
+    def __init__(self, folder, allowed_extensions, poll_interval=POLL_INTERVAL, on_rebuild=None):
+        self.folder = folder
+        self.allowed_extensions = {ext.lower() for ext in allowed_extensions}
+        self.poll_interval = poll_interval
+        self.on_rebuild = on_rebuild
+        self._lock = threading.RLock()
+        self._files = {}
+        self._versions = {}
+        self._folder_mtime = None
+        self._checked_at = 0.0
+        self._accessed = {}
+        self.rebuild()
+    
+    def _allowed(self, filename):
+        return '.' in filename and filename.rsplit('.', 1)[1].lower() in self.allowed_extensions
+    
+    def _index(self, filename, size, mtime):
+        if filename not in self._files:
+            bisect.insort(self._versions.setdefault(logical_name(filename), []), filename)
+        self._files[filename] = {'size': size, 'modified': mtime}
+    
+    def _folder_stat(self):
+        try:
+            return os.stat(self.folder).st_mtime_ns
+        except FileNotFoundError:
+            return None
+    
+    def rebuild(self):
+        """Re-read the upload folder from disk."""
+        with self._lock:
+            files = {}
+            versions = {}
+            self._folder_mtime = self._folder_stat()
+            if self._folder_mtime is not None:
+                with os.scandir(self.folder) as entries:
+                    for entry in entries:
+                        if not self._allowed(entry.name) or not entry.is_file():
+                            continue
+                        stat = entry.stat()
+                        files[entry.name] = {'size': stat.st_size, 'modified': stat.st_mtime}
+                        versions.setdefault(logical_name(entry.name), []).append(entry.name)
+            for names in versions.values():
+                names.sort()
+            self._files, self._versions = files, versions
+            self._checked_at = time.monotonic()
+            logger.info(f"Indexed {len(files)} uploads in {len(versions)} datasets")
+            if self.on_rebuild:
+                self.on_rebuild(self._entries())
+    
+    def refresh(self):
+        """Rebuild the index if the folder changed outside this catalog since the last check."""
+        if time.monotonic() - self._checked_at < self.poll_interval:
+            return
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if self._folder_stat() != self._folder_mtime:
+                logger.info(f"Upload folder {self.folder} changed on disk, rebuilding the catalog")
+                self.rebuild()
+    
+    def add(self, filename):
+        """Index a file just written to the upload folder."""
+        if not self._allowed(filename):
+            return
+        stat = os.stat(os.path.join(self.folder, filename))
+        with self._lock:
+            self._index(filename, stat.st_size, stat.st_mtime)
+            # Our own write changed the folder mtime; do not mistake it for an outside change
+            self._folder_mtime = self._folder_stat()
+    
+    def remove(self, filename):
+        """Drop a file just deleted from the upload folder."""
+        with self._lock:
+            if self._files.pop(filename, None) is None:
+                return
+            key = logical_name(filename)
+            names = self._versions[key]
+            names.remove(filename)
+            if not names:
+                del self._versions[key]
+            self._folder_mtime = self._folder_stat()
+            self._accessed.pop(filename, None)
+        try:
+            os.remove(self._access_path(filename))
+        except FileNotFoundError:
+            pass
+    
+    def _access_path(self, filename):
+        return os.path.join(self.folder, ACCESS_FOLDER, filename)
+    
+    def record_access(self, filename):
+        """Note that ``filename`` was used now (at most once per ACCESS_RESOLUTION per process)."""
+        now = time.time()
+        with self._lock:
+            if now - self._accessed.get(filename, 0.0) < ACCESS_RESOLUTION:
+                return
+            self._accessed[filename] = now
+        path = self._access_path(filename)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'a'):
+                pass
+            os.utime(path, (now, now))
+        except OSError as e:
+            logger.warning(f"Could not record access to {filename}: {str(e)}")
+    
+    def last_access(self, filename):
+        """Time ``filename`` was last used by any process, or None if never recorded."""
+        try:
+            return os.stat(self._access_path(filename)).st_mtime
+        except FileNotFoundError:
+            return None
+    
+    def resolve(self, name):
+        """Return the stored filename for ``name``: the file itself if it
+        exists, otherwise the most recent version of its logical dataset.
+        The file found is recorded as used."""
+        self.refresh()
+        with self._lock:
+            if name in self._files:
+                filename = name
+            else:
+                names = self._versions.get(logical_name(name))
+                filename = names[-1] if names else None
+        if filename is not None:
+            self.record_access(filename)
+        return filename
+    
+    def versions(self, name):
+        """Return every stored version of a logical dataset, oldest first."""
+        self.refresh()
+        with self._lock:
+            return list(self._versions.get(logical_name(name), []))
+    
+    def _entries(self):
+        return [dict(info, name=filename) for filename, info in self._files.items()]
+    
+    def entries(self):
+        """Return name, size and modified time of every indexed file."""
+        self.refresh()
+        with self._lock:
+            return self._entries()
@@ -2,6 +2,7 @@ import requests
 import json
 import os
 import pytest
+import uuid
 
 def test_list_datasets():
     """Test listing all datasets."""
@@ -11,6 +12,21 @@ def test_list_datasets():
     assert 'datasets' in data
     assert isinstance(data['datasets'], list)
 
+def test_list_datasets_pagination():
+    """Test paging through the dataset listing with a cursor."""
+    response = requests.get('http://localhost:5000/api/datasets', params={'limit': 1, 'sort': 'name'})
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data['datasets']) <= 1
+    
+    if data['next_cursor']:
+        next_page = requests.get('http://localhost:5000/api/datasets',
+                                 params={'limit': 1, 'sort': 'name', 'cursor': data['next_cursor']}).json()
+        assert next_page['datasets'][0]['name'] > data['datasets'][0]['name']
+    
+    response = requests.get('http://localhost:5000/api/datasets', params={'sort': 'unknown'})
+    assert response.status_code == 400
+
 def test_preview_dataset():
     """Test previewing a dataset."""
     # First upload a test file
@@ -73,3 +89,443 @@ def test_invalid_dataset_operations():
     # Test delete of non-existent dataset
     response = requests.delete('http://localhost:5000/api/datasets/nonexistent.csv')
     assert response.status_code == 404
+
+def test_cache_stats():
+    """Test the DataFrame cache counters."""
+    response = requests.get('http://localhost:5000/api/cache/stats')
+    assert response.status_code == 200
+    stats = response.json()['cache']
+    for counter in ('hits', 'misses', 'evictions', 'entries', 'bytes'):
+        assert stats[counter] >= 0
+    assert stats['bytes'] <= stats['max_bytes']
+
+def test_run_maintenance():
+    """Test running upload retention on demand."""
+    response = requests.post('http://localhost:5000/api/maintenance')
+    assert response.status_code in (200, 409)
+    if response.status_code == 200:
+        data = response.json()
+        assert data['retention']['bytes_reclaimed'] >= 0
+        assert isinstance(data['retention']['deleted'], list)
+        # Retention is opt-in; while disabled, it only reports what it would delete
+        if data['retention']['dry_run']:
+            assert data['retention']['deleted'] == []
+            assert data['retention']['bytes_reclaimed'] == 0
+
+def test_clean_explain_plan():
+    """Test that explain returns the compiled cleaning plan with its timings."""
+    body = 'id,name,score\n' + ''.join(f'{i % 20}, Name{i % 20} ,{i % 5}\n' for i in range(100))
+    response = requests.post(
+        'http://localhost:5000/api/data/upload/stream',
+        params={'filename': 'explain.csv', 'dataset_name': 'explain'},
+        data=body.encode()
+    )
+    assert response.status_code == 200
+    
+    response = requests.post('http://localhost:5000/api/data/clean', json={
+        'dataset_name': 'explain',
+        'explain': True,
+        'options': {'removeDuplicates': True, 'handleMissingValues': 'none',
+                    'normalizeText': True, 'detectOutliers': False}
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert data['final_stats']['rows'] == 20
+    plan = data['cleaning_report']['plan']
+    assert [step['operation'] for step in plan['steps']] == ['dedupe', 'normalize_text']
+    assert all(step['actual_seconds'] is not None for step in plan['steps'])
+
+def test_clean_out_of_core():
+    """Test that out-of-core cleaning reports what in-memory cleaning does."""
+    body = 'id,name,score\n' + ''.join(f'{i % 30}, Name{i % 7} ,{"" if i % 9 == 0 else i % 5}\n' for i in range(300))
+    files = {'file': ('out_of_core.csv', body.encode(), 'text/csv')}
+    upload_response = requests.post('http://localhost:5000/api/datasets', files=files)
+    assert upload_response.status_code == 200
+    filename = upload_response.json()['filename']
+    
+    operations = {'normalizeText': True, 'handleMissingValues': 'impute', 'removeDuplicates': True}
+    in_memory = requests.post('http://localhost:5000/api/clean', json={
+        'filename': filename, 'operations': operations})
+    out_of_core = requests.post('http://localhost:5000/api/clean', json={
+        'filename': filename, 'operations': operations, 'out_of_core': True})
+    assert in_memory.status_code == 200
+    assert out_of_core.status_code == 200
+    assert out_of_core.json()['report'] == in_memory.json()['report']
+    assert out_of_core.json()['out_of_core']['fit_passes'] == 1
+
+def test_out_of_core_reuses_quantile_sketches():
+    """Test that outlier bounds of a streamed upload come from its stored sketches."""
+    body = 'id,score\n' + ''.join(f'{i},{i % 50 if i % 97 else 5000}\n' for i in range(1000))
+    upload_response = requests.post('http://localhost:5000/api/datasets/stream',
+                                    params={'filename': 'sketched.csv'}, data=body.encode())
+    assert upload_response.status_code == 200
+    
+    response = requests.post('http://localhost:5000/api/clean', json={
+        'filename': upload_response.json()['filename'],
+        'operations': {'detectOutliers': True},
+        'out_of_core': True
+    })
+    assert response.status_code == 200
+    assert response.json()['out_of_core']['fit_passes'] == 0
+
+def test_clean_text_options():
+    """Test that text normalization options are applied and validated."""
+    body = 'id,name\n' + ''.join(f'{i},"  Café　  LATTE!! "\n' for i in range(10))
+    response = requests.post(
+        'http://localhost:5000/api/data/upload/stream',
+        params={'filename': 'text_options.csv', 'dataset_name': 'text_options'},
+        data=body.encode()
+    )
+    assert response.status_code == 200
+    
+    options = {'removeDuplicates': False, 'handleMissingValues': 'none', 'normalizeText': True,
+               'detectOutliers': False,
+               'textOptions': {'collapse_whitespace': True, 'strip_punctuation': True}}
+    response = requests.post('http://localhost:5000/api/data/clean', json={
+        'dataset_name': 'text_options', 'options': options})
+    assert response.status_code == 200
+    assert {row['name'] for row in response.json()['preview']} == {'café latte'}
+    
+    options['textOptions'] = {'nulls': 'drop'}
+    response = requests.post('http://localhost:5000/api/data/clean', json={
+        'dataset_name': 'text_options', 'options': options})
+    assert response.status_code == 400
+
+def test_clean_imputes_most_frequent_values():
+    """Test that imputation fills every column, numeric ones included, with its most frequent value."""
+    body = 'id,name,score\n1,a,1\n2,a,1\n3,b,10\n4,,12\n5,a,\n'
+    response = requests.post(
+        'http://localhost:5000/api/data/upload/stream',
+        params={'filename': 'impute_mode.csv', 'dataset_name': 'impute_mode'},
+        data=body.encode()
+    )
+    assert response.status_code == 200
+    
+    response = requests.post('http://localhost:5000/api/data/clean', json={
+        'dataset_name': 'impute_mode',
+        'options': {'removeDuplicates': False, 'handleMissingValues': 'impute',
+                    'normalizeText': False, 'detectOutliers': False}
+    })
+    assert response.status_code == 200
+    preview = response.json()['preview']
+    assert [row['name'] for row in preview] == ['a', 'a', 'b', 'a', 'a']
+    assert [row['score'] for row in preview] == [1, 1, 10, 12, 1]
+
+def test_clean_apply_stored_fit():
+    """Test that apply mode cleans new data with the statistics fitted on earlier data."""
+    def upload(name, body):
+        files = {'file': (name, body.encode(), 'text/csv')}
+        response = requests.post('http://localhost:5000/api/datasets', files=files)
+        assert response.status_code == 200
+        return response.json()['filename']
+    
+    first = upload('fit_day1.csv', 'id,name,score\n' + ''.join(
+        f'{i}, Name{i % 5} ,{"" if i % 7 == 0 else i % 10}\n' for i in range(200)))
+    delta = upload('fit_day2.csv', 'id,name,score\n' + ''.join(
+        f'{i}, NAME{i % 8} ,{"" if i % 3 == 0 else 100}\n' for i in range(30)))
+    
+    fitted = requests.post('http://localhost:5000/api/clean', json={
+        'filename': first, 'operations': {'normalizeText': True, 'handleMissingValues': 'impute'}})
+    assert fitted.status_code == 200
+    assert fitted.json()['fit']['mode'] == 'fit'
+    
+    for out_of_core in (False, True):
+        applied = requests.post('http://localhost:5000/api/clean', json={
+            'filename': delta, 'mode': 'apply', 'fit': fitted.json()['cleaned_dataset_name'],
+            'out_of_core': out_of_core})
+        assert applied.status_code == 200
+        data = applied.json()
+        assert data['fit']['mode'] == 'apply'
+        assert data['fit']['fitted_on'] == first
+        assert data['fit']['unseen_values'] == {'name': 3}
+        assert data['report']['operations_applied'] == ['text_normalization', 'missing_values']
+        
+        preview = requests.get(f"http://localhost:5000/api/datasets/{data['cleaned_dataset_name']}/preview")
+        assert preview.status_code == 200
+    
+    response = requests.post('http://localhost:5000/api/clean', json={'filename': delta, 'mode': 'apply', 'fit': first})
+    assert response.status_code == 400
+
+def test_clean_apply_fills_columns_complete_when_fitted():
+    """Test that a stored fit fills columns that had no missing values in the fitted data."""
+    def upload(name, body):
+        files = {'file': (name, body.encode(), 'text/csv')}
+        response = requests.post('http://localhost:5000/api/datasets', files=files)
+        assert response.status_code == 200
+        return response.json()['filename']
+    
+    first = upload('complete_day1.csv', 'id,score\n' + ''.join(f'{i},{i % 4}\n' for i in range(100)))
+    delta = upload('complete_day2.csv', 'id,score\n1,\n2,3\n')
+    
+    fitted = requests.post('http://localhost:5000/api/clean', json={
+        'filename': first, 'operations': {'handleMissingValues': 'impute'}})
+    assert fitted.status_code == 200
+    
+    applied = requests.post('http://localhost:5000/api/clean', json={
+        'filename': delta, 'mode': 'apply', 'fit': fitted.json()['cleaned_dataset_name']})
+    assert applied.status_code == 200
+    preview = requests.get(f"http://localhost:5000/api/datasets/{applied.json()['cleaned_dataset_name']}/preview")
+    assert [row['score'] for row in preview.json()['preview']] == [1.5, 3.0]
+
+def test_dataset_names_stay_in_storage():
+    """Test that dataset names reaching outside the storage folder are rejected."""
+    for name in ('../victim', '..', 'nested/name'):
+        response = requests.post(
+            'http://localhost:5000/api/data/upload/stream',
+            params={'filename': 'escape.csv', 'dataset_name': name},
+            data=b'a,b\n1,2\n'
+        )
+        assert response.status_code == 400
+    
+    response = requests.delete('http://localhost:5000/api/data/datasets/..%2Fvictim')
+    assert response.status_code in (400, 404)
+
+def test_uploads_keep_a_typed_canonical_copy():
+    """Test that uploads are read back typed from their Parquet copy, or from the raw file when Parquet cannot hold them."""
+    body = 'id,price,label\n' + ''.join(f'{i},{i * 1.5},item{i}\n' for i in range(50))
+    files = {'file': ('canonical_typed.csv', body.encode(), 'text/csv')}
+    upload_response = requests.post('http://localhost:5000/api/datasets', files=files)
+    assert upload_response.status_code == 200
+    filename = upload_response.json()['filename']
+    
+    preview = requests.get(f'http://localhost:5000/api/datasets/{filename}/preview').json()
+    assert preview['preview'][1] == {'id': 1, 'price': 1.5, 'label': 'item1'}
+    response = requests.post('http://localhost:5000/api/clean', json={
+        'filename': filename, 'operations': {'removeDuplicates': True}, 'out_of_core': True})
+    assert response.status_code == 200
+    
+    body = '{"id": 1, "value": 1}\n{"id": 2, "value": "x"}\n'
+    files = {'file': ('canonical_mixed.jsonl', body.encode(), 'application/json')}
+    upload_response = requests.post('http://localhost:5000/api/datasets', files=files)
+    assert upload_response.status_code == 200
+    filename = upload_response.json()['filename']
+    
+    preview = requests.get(f'http://localhost:5000/api/datasets/{filename}/preview')
+    assert preview.status_code == 200
+    assert [row['value'] for row in preview.json()['preview']] == [1, 'x']
+    response = requests.post('http://localhost:5000/api/clean', json={
+        'filename': filename, 'operations': {'removeDuplicates': True}, 'out_of_core': True})
+    assert response.status_code == 400
+    assert 'canonical' in response.json()['error']
+
+def test_preview_reads_only_requested_rows():
+    """Test that previews return the requested rows with the dataset's full row count."""
+    body = 'id,value\n' + ''.join(f'{i},{i % 13}\n' for i in range(5000))
+    files = {'file': ('bounded_preview.csv', body.encode(), 'text/csv')}
+    upload_response = requests.post('http://localhost:5000/api/datasets', files=files)
+    assert upload_response.status_code == 200
+    filename = upload_response.json()['filename']
+    
+    data = requests.get(f'http://localhost:5000/api/datasets/{filename}/preview', params={'rows': 5}).json()
+    assert [row['id'] for row in data['preview']] == [0, 1, 2, 3, 4]
+    assert data['total_rows'] == 5000
+    assert len(requests.get(f'http://localhost:5000/api/datasets/{filename}/preview').json()['preview']) == 10
+    
+    response = requests.post('http://localhost:5000/api/data/upload/stream',
+                             params={'filename': 'bounded_preview.csv', 'dataset_name': 'bounded_preview'},
+                             data=body.encode())
+    assert response.status_code == 200
+    data = requests.get('http://localhost:5000/api/data/datasets/bounded_preview/preview', params={'rows': 3}).json()
+    assert len(data['preview']) == 3
+    assert data['total_rows'] == 5000
+
+def test_row_counts_skip_newlines_in_quoted_fields():
+    """Test that a preview counted by the newline scan does not count newlines inside quoted fields."""
+    # A date column that turns to text after the first batch leaves the cleaned file without a canonical copy
+    body = ('day,note\n2023-01-01,"two\nlines"\n'
+            + ''.join(f'2023-01-{i % 28 + 1:02d},n{i}\n' for i in range(100000))
+            + f'soon,{uuid.uuid4().hex}\n')
+    upload_response = requests.post('http://localhost:5000/api/datasets/stream',
+                                    params={'filename': 'quoted_rows.csv'}, data=body.encode())
+    assert upload_response.status_code == 200
+    assert upload_response.json()['rows'] == 100002
+    
+    response = requests.post('http://localhost:5000/api/clean', json={
+        'filename': upload_response.json()['filename'], 'operations': {'removeDuplicates': True}, 'out_of_core': True})
+    assert response.status_code == 200
+    cleaned = response.json()['cleaned_dataset_name']
+    data = requests.get(f'http://localhost:5000/api/datasets/{cleaned}/preview', params={'rows': 1}).json()
+    assert data['preview'] == [{'day': '2023-01-01', 'note': 'two\nlines'}]
+    assert data['total_rows'] == 100002
+
+def test_dataset_names_resolve_to_their_own_versions():
+    """Test that a dataset name resolves to its stored file and never to a dataset it prefixes."""
+    name = f'catalog_{uuid.uuid4().hex[:8]}'
+    files = {'file': (f'{name}_2023.csv', b'id,year\n1,2023\n', 'text/csv')}
+    assert requests.post('http://localhost:5000/api/datasets', files=files).status_code == 200
+    response = requests.get(f'http://localhost:5000/api/datasets/{name}.csv/preview')
+    assert response.status_code == 404
+    
+    files = {'file': (f'{name}.csv', f'id,token\n1,{name}\n'.encode(), 'text/csv')}
+    assert requests.post('http://localhost:5000/api/datasets', files=files).status_code == 200
+    response = requests.get(f'http://localhost:5000/api/datasets/{name}.csv/preview')
+    assert response.status_code == 200
+    assert response.json()['preview'] == [{'id': 1, 'token': name}]
+    response = requests.get(f'http://localhost:5000/api/datasets/{name}_2023.csv/preview')
+    assert response.json()['preview'] == [{'id': 1, 'year': 2023}]
+    
+    listed = requests.get('http://localhost:5000/api/datasets', params={'prefix': name}).json()['datasets']
+    assert len(listed) == 2
+    assert requests.delete(f'http://localhost:5000/api/datasets/{name}.csv').status_code == 200
+    assert requests.get(f'http://localhost:5000/api/datasets/{name}.csv/preview').status_code == 404
+    assert requests.get(f'http://localhost:5000/api/datasets/{name}_2023.csv/preview').status_code == 200
+
+def test_out_of_core_clean_reads_missing_counts_of_every_row_group():
+    """Test that missing values only in a later row group of the Parquet copy are counted from its footer."""
+    # Streamed uploads write a row group per 100000 rows
+    token = uuid.uuid4().hex
+    body = 'id,score,label\n' + ''.join(
+        f'{i},{"" if i >= 100000 and i % 2 else i % 7},{token if i == 0 else "x"}\n' for i in range(100010))
+    upload_response = requests.post('http://localhost:5000/api/datasets/stream',
+                                    params={'filename': 'footer_stats.csv'}, data=body.encode())
+    assert upload_response.status_code == 200
+    filename = upload_response.json()['filename']
+    
+    # A text fill takes the columns with missing values out of outlier clipping
+    operations = {'handleMissingValues': 'custom', 'customMissingValue': 'unknown', 'detectOutliers': True}
+    in_memory = requests.post('http://localhost:5000/api/clean', json={
+        'filename': filename, 'operations': operations})
+    out_of_core = requests.post('http://localhost:5000/api/clean', json={
+        'filename': filename, 'operations': operations, 'out_of_core': True})
+    assert out_of_core.status_code == 200
+    report = out_of_core.json()['report']
+    assert report['changes']['missing_values_handled'] == 5
+    assert report['final_stats']['missing_values'] == 0
+    assert report == in_memory.json()['report']
+
+def test_hot_datasets_serve_current_rows():
+    """Test that reads of a promoted dataset match the stored rows and follow later writes."""
+    name = f'hot_{uuid.uuid4().hex[:8]}'
+    
+    def upload(body):
+        response = requests.post('http://localhost:5000/api/data/upload/stream',
+                                 params={'filename': f'{name}.csv', 'dataset_name': name}, data=body.encode())
+        assert response.status_code == 200
+    
+    def query():
+        response = requests.post(f'http://localhost:5000/api/data/datasets/{name}/query', json={
+            'columns': ['id', 'region'], 'filters': [['score', '>', 95]]})
+        assert response.status_code == 200
+        return response.json()['rows']
+    
+    upload('id,region,score\n' + ''.join(f'{i},{["east", "west"][i % 2]},{i}\n' for i in range(100)))
+    # Reads past the promotion threshold are served from the hot copy
+    for _ in range(5):
+        assert query() == [{'id': 96, 'region': 'east'}, {'id': 97, 'region': 'west'},
+                           {'id': 98, 'region': 'east'}, {'id': 99, 'region': 'west'}]
+        preview = requests.get(f'http://localhost:5000/api/data/datasets/{name}/preview', params={'rows': 2}).json()
+        assert preview['preview'] == [{'id': 0, 'region': 'east', 'score': 0}, {'id': 1, 'region': 'west', 'score': 1}]
+    
+    upload('id,region,score\n' + ''.join(f'{i},north,{i * 10}\n' for i in range(20)))
+    assert query() == [{'id': i, 'region': 'north'} for i in range(10, 20)]
+    
+    assert requests.delete(f'http://localhost:5000/api/data/datasets/{name}').status_code == 200
+    assert requests.get(f'http://localhost:5000/api/data/datasets/{name}/preview').status_code == 404
+
+def test_datasets_store_with_the_requested_codec():
+    """Test choosing the Parquet codec of a dataset, rejecting unknown ones and benchmarking all of them."""
+    name = f'codec_{uuid.uuid4().hex[:8]}'
+    body = ('id,region\n' + ''.join(f'{i},{["east", "west"][i % 2]}\n' for i in range(500))).encode()
+    
+    def upload(**params):
+        return requests.post('http://localhost:5000/api/data/upload/stream',
+                             params=dict(params, filename=f'{name}.csv', dataset_name=name), data=body)
+    
+    file_info = upload().json()['storage_info']['storage_info']['file']
+    assert (file_info['codec'], file_info['codec_level']) == ('zstd', 3)
+    file_info = upload(codec='gzip', codec_level=5).json()['storage_info']['storage_info']['file']
+    assert (file_info['codec'], file_info['codec_level']) == ('gzip', 5)
+    assert upload(codec='brotli2').status_code == 400
+    assert upload(codec='zstd', codec_level=99).status_code == 400
+    assert upload(codec='none', codec_level=1).status_code == 400
+    
+    preview = requests.get(f'http://localhost:5000/api/data/datasets/{name}/preview', params={'rows': 2}).json()
+    assert preview['preview'] == [{'id': 0, 'region': 'east'}, {'id': 1, 'region': 'west'}]
+    assert preview['total_rows'] == 500
+    
+    response = requests.get(f'http://localhost:5000/api/data/datasets/{name}/codecs', params={'rows': 200})
+    assert response.status_code == 200
+    results = {(result['codec'], result['level']): result for result in response.json()['results']}
+    assert results[('none', None)]['ratio'] == 1
+    assert results[('zstd', 9)]['size'] < results[('none', None)]['size']
+    assert requests.get('http://localhost:5000/api/data/datasets/missing_codecs/codecs').status_code == 404
+
+def test_clean_counts_duplicates_like_drop_duplicates():
+    """Test duplicate counts and removal treat -0.0 as 0.0 and missing values as equal, on all or selected columns."""
+    body = f'id,score,note\n1,0.0,a\n1,-0.0,a\n2,,b\n2,,b\n3,1.5,c\n3,1.5,d\n4,2.0,{uuid.uuid4().hex}\n'
+    files = {'file': ('fingerprints.csv', body.encode(), 'text/csv')}
+    upload_response = requests.post('http://localhost:5000/api/datasets', files=files)
+    assert upload_response.status_code == 200
+    filename = upload_response.json()['filename']
+    
+    def clean(operations):
+        response = requests.post('http://localhost:5000/api/clean', json={
+            'filename': filename, 'operations': operations})
+        assert response.status_code == 200
+        return response.json()
+    
+    report = clean({'removeDuplicates': True})['report']
+    assert report['initial_stats']['duplicates'] == 2
+    assert report['changes']['duplicates_removed'] == 2
+    assert report['final_stats'] == {'rows': 5, 'missing_values': 1, 'duplicates': 0}
+    
+    result = clean({'removeDuplicates': True, 'selectedColumns': {'duplicateCheckColumns': ['id', 'score']}})
+    assert result['report']['changes']['duplicates_removed'] == 3
+    assert result['report']['final_stats']['rows'] == 4
+    download = requests.get(f"http://localhost:5000/api/datasets/{result['cleaned_dataset_name']}/download")
+    assert [line.split(',')[2] for line in download.content.decode().splitlines()[1:4]] == ['a', 'b', 'c']
+    
+    # Rows dropped for missing values leave the remaining rows' duplicates to count
+    report = clean({'handleMissingValues': 'remove', 'removeDuplicates': True})['report']
+    assert report['changes']['rows_removed'] == 3
+    assert report['final_stats'] == {'rows': 4, 'missing_values': 0, 'duplicates': 0}
+
+def test_large_clean_matches_out_of_core():
+    """Test that a pass large enough to split across worker processes cleans like the chunked pass."""
+    # 400000 rows of 6 columns are over the 2000000 cells that run serially
+    token = uuid.uuid4().hex
+    body = 'id,a,b,c,name,city\n' + ''.join(
+        f'{i},{"" if i % 11 == 0 else i % 97},{5000 if i % 997 == 0 else i % 13},{i % 7 * 0.5},'
+        f'{token if i == 0 else f" Name{i % 5} "},{["PARIS", "lyon ", "Nice"][i % 3]}\n'
+        for i in range(400000))
+    files = {'file': ('parallel_clean.csv', body.encode(), 'text/csv')}
+    upload_response = requests.post('http://localhost:5000/api/datasets', files=files)
+    assert upload_response.status_code == 200
+    filename = upload_response.json()['filename']
+    
+    operations = {'normalizeText': True, 'handleMissingValues': 'impute', 'detectOutliers': True}
+    in_memory = requests.post('http://localhost:5000/api/clean', json={
+        'filename': filename, 'operations': operations})
+    out_of_core = requests.post('http://localhost:5000/api/clean', json={
+        'filename': filename, 'operations': operations, 'out_of_core': True})
+    assert in_memory.status_code == 200
+    assert out_of_core.status_code == 200
+    report = in_memory.json()['report']
+    assert report['changes']['missing_values_handled'] == 36364
+    assert report['final_stats']['missing_values'] == 0
+    assert out_of_core.json()['report'] == report
+    
+    preview = requests.get(
+        f"http://localhost:5000/api/datasets/{in_memory.json()['cleaned_dataset_name']}/preview").json()
+    assert [(row['name'], row['city']) for row in preview['preview'][1:4]] == [
+        ('name1', 'lyon'), ('name2', 'nice'), ('name3', 'paris')]
+
+def test_uploads_and_stored_datasets_keep_separate_schemas():
+    """Test that an upload and a stored dataset with the same name do not share a catalog entry."""
+    body = f'id,joined,token\n1,01/03/2023,{uuid.uuid4().hex}\n2,02/03/2023,b\n'
+    files = {'file': ('shared_name.csv', body.encode(), 'text/csv')}
+    upload_response = requests.post('http://localhost:5000/api/datasets', files=files)
+    assert upload_response.status_code == 200
+    filename = upload_response.json()['filename']
+    
+    response = requests.post('http://localhost:5000/api/data/upload/stream',
+                             params={'filename': 'other.csv', 'dataset_name': filename}, data=b'id,score\n1,2.5\n')
+    assert response.status_code == 200
+    
+    def upload_dates():
+        preview = requests.get(f'http://localhost:5000/api/datasets/{filename}/preview').json()
+        return [row['joined'] for row in preview['preview']]
+    
+    assert upload_dates() == ['01/03/2023', '02/03/2023']
+    assert requests.delete(f'http://localhost:5000/api/data/datasets/{filename}').status_code == 200
+    assert upload_dates() == ['01/03/2023', '02/03/2023']
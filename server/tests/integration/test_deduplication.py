@@ -0,0 +1,52 @@
+import requests
+import uuid
+
+def upload(name, body):
+    files = {'file': (name, body, 'text/csv')}
+    response = requests.post('http://localhost:5000/api/datasets', files=files)
+    assert response.status_code == 200
+    return response.json()
+
+def stored_names(prefix):
+    response = requests.get('http://localhost:5000/api/datasets', params={'prefix': prefix})
+    assert response.status_code == 200
+    return [dataset['name'] for dataset in response.json()['datasets']]
+
+def test_identical_uploads_share_one_copy():
+    """Test that the same bytes uploaded twice, by form or stream, resolve to one stored dataset."""
+    body = f'id,token\n1,{uuid.uuid4().hex}\n2,b\n'.encode()
+    first = upload('dedup_first.csv', body)
+    assert not first.get('duplicate')
+    
+    second = upload('dedup_second.csv', body)
+    assert second['duplicate'] is True
+    assert second['filename'] == first['filename']
+    assert second['rows'] == 2
+    assert stored_names('dedup_second') == []
+    
+    streamed = requests.post('http://localhost:5000/api/datasets/stream',
+                             params={'filename': 'dedup_streamed.csv'}, data=body)
+    assert streamed.status_code == 200
+    assert streamed.json()['duplicate'] is True
+    assert streamed.json()['filename'] == first['filename']
+    assert stored_names('dedup_streamed') == []
+
+def test_different_uploads_are_stored_separately():
+    """Test that uploads differing in a single byte are stored as separate datasets."""
+    token = uuid.uuid4().hex
+    first = upload('distinct_first.csv', f'id,token\n1,{token}\n'.encode())
+    second = upload('distinct_second.csv', f'id,token\n2,{token}\n'.encode())
+    assert not second.get('duplicate')
+    assert second['filename'] != first['filename']
+    assert stored_names('distinct_second') == [second['filename']]
+
+def test_deleted_dataset_releases_its_content():
+    """Test that content uploaded again after its dataset was deleted is stored anew."""
+    body = f'id,token\n1,{uuid.uuid4().hex}\n'.encode()
+    first = upload('released.csv', body)
+    response = requests.delete(f"http://localhost:5000/api/datasets/{first['filename']}")
+    assert response.status_code == 200
+    
+    again = upload('released_again.csv', body)
+    assert not again.get('duplicate')
+    assert stored_names('released_again') == [again['filename']]
@@ -1,7 +1,9 @@
 import requests
 import json
+import io
 import os
 import pytest
+import uuid
 
 def test_valid_file_formats():
     """Test uploading files with valid formats."""
@@ -88,3 +90,123 @@ def test_missing_dataset_name():
     data = response.json()
     assert data['success'] is False
     assert 'error' in data
+
+def test_json_lines_upload_flattens_nested_fields():
+    """Test uploading a JSON Lines file with nested records."""
+    test_file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'nested.ndjson')
+    with open(test_file_path, 'w') as f:
+        for i in range(2500):
+            f.write(json.dumps({'id': i, 'user': {'name': f'user{i}', 'geo': {'lat': i / 10}}}) + '\n')
+    
+    try:
+        files = {
+            'file': ('nested.ndjson', open(test_file_path, 'rb'), 'application/x-ndjson')
+        }
+        upload_data = {'dataset_name': 'test_ndjson'}
+        
+        response = requests.post('http://localhost:5000/api/data/upload', files=files, data=upload_data)
+        assert response.status_code == 200
+        data = response.json()
+        assert data['success'] is True
+        assert data['dataset_info']['rows'] == 2500
+        assert data['dataset_info']['column_names'] == ['id', 'user.name', 'user.geo.lat']
+    finally:
+        if os.path.exists(test_file_path):
+            os.remove(test_file_path)
+
+def test_csv_engine_reads_nulls_and_falls_back_on_short_rows():
+    """Test that CSV uploads read the pandas null markers and parse rows with missing fields."""
+    body = 'id,score,label\n1,2.5,a\n2,NA,b\n3,4.0,NULL\n'
+    files = {'file': ('engine_nulls.csv', body.encode(), 'text/csv')}
+    response = requests.post('http://localhost:5000/api/datasets', files=files)
+    assert response.status_code == 200
+    preview = requests.get(f"http://localhost:5000/api/datasets/{response.json()['filename']}/preview").json()
+    assert preview['preview'] == [
+        {'id': 1, 'score': 2.5, 'label': 'a'},
+        {'id': 2, 'score': None, 'label': 'b'},
+        {'id': 3, 'score': 4.0, 'label': None}
+    ]
+    
+    # The Arrow reader rejects rows with fewer fields than the header
+    body = 'id,score,label\n1,2.5,a\n2,3.5\n'
+    files = {'file': ('engine_short_rows.csv', body.encode(), 'text/csv')}
+    response = requests.post('http://localhost:5000/api/datasets', files=files)
+    assert response.status_code == 200
+    assert response.json()['rows'] == 2
+    preview = requests.get(f"http://localhost:5000/api/datasets/{response.json()['filename']}/preview").json()
+    assert preview['preview'][1] == {'id': 2, 'score': 3.5, 'label': None}
+
+def workbook_bytes(sheets):
+    from openpyxl import Workbook
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    for title, rows in sheets.items():
+        sheet = workbook.create_sheet(title)
+        for row in rows:
+            sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+def test_workbook_sheets_upload_separately():
+    """Test uploading one chosen sheet of a workbook and every sheet as its own dataset."""
+    body = workbook_bytes({
+        'Orders': [['order_id', 'amount']] + [[i, i * 2] for i in range(2500)],
+        'Notes': [['note'], ['first'], ['second']]
+    })
+    xlsx = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    files = {'file': ('sheets.xlsx', body, xlsx)}
+    response = requests.post('http://localhost:5000/api/datasets', files=files, data={'sheet': 'Notes'})
+    assert response.status_code == 200
+    assert response.json()['detection']['sheets'] == ['Orders', 'Notes']
+    preview = requests.get(f"http://localhost:5000/api/datasets/{response.json()['filename']}/preview").json()
+    assert preview['preview'] == [{'note': 'first'}, {'note': 'second'}]
+    
+    files = {'file': ('sheets.xlsx', body, xlsx)}
+    response = requests.post('http://localhost:5000/api/data/upload', files=files,
+                             data={'dataset_name': 'sheets', 'all_sheets': 'true'})
+    assert response.status_code == 200
+    datasets = response.json()['datasets']
+    assert [(dataset['dataset_name'], dataset['rows']) for dataset in datasets] == [
+        ('sheets_Orders', 2500), ('sheets_Notes', 2)]
+
+def test_upload_infers_schema_and_keeps_date_formats():
+    """Test that uploads store an inferred schema and cleaned outputs keep the source date format."""
+    # The token keeps the upload from matching the content of an earlier run
+    body = 'id,region,joined\n' + ''.join(
+        f'{i},{["north", "south"][i % 2]},{i % 28 + 1:02d}/03/2023\n' for i in range(40)) + \
+        f'0,north,01/03/2023\n40,{uuid.uuid4().hex},\n'
+    files = {'file': ('schema_dates.csv', body.encode(), 'text/csv')}
+    response = requests.post('http://localhost:5000/api/datasets', files=files)
+    assert response.status_code == 200
+    columns = response.json()['schema']['columns']
+    assert columns['id']['dtype'] == 'int64'
+    assert columns['region']['categorical'] is True
+    assert columns['joined']['date_format'] == '%d/%m/%Y'
+    assert columns['joined']['nullable'] is True
+    
+    response = requests.post('http://localhost:5000/api/clean', json={
+        'filename': response.json()['filename'], 'operations': {'removeDuplicates': True}})
+    assert response.status_code == 200
+    cleaned = response.json()['cleaned_dataset_name']
+    download = requests.get(f'http://localhost:5000/api/datasets/{cleaned}/download')
+    assert download.status_code == 200
+    lines = download.content.decode().splitlines()
+    assert lines[1:3] == ['0,north,01/03/2023', '1,south,02/03/2023']
+    assert len(lines) == 42
+    assert lines[-1].endswith(',')
+
+def test_workbook_sheets_with_clashing_names_get_separate_datasets():
+    """Test that sheets whose names sanitize to the same dataset name are not stored over each other."""
+    body = workbook_bytes({'Q1 2024': [['quarter'], ['space']], 'Q1-2024': [['quarter'], ['dash']]})
+    xlsx = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    files = {'file': ('clashing_sheets.xlsx', body, xlsx)}
+    response = requests.post('http://localhost:5000/api/data/upload', files=files,
+                             data={'dataset_name': 'clashing', 'all_sheets': 'true'})
+    assert response.status_code == 200
+    names = [dataset['dataset_name'] for dataset in response.json()['datasets']]
+    assert names == ['clashing_Q1_2024', 'clashing_Q1_2024_2']
+    
+    for name, value in zip(names, ('space', 'dash')):
+        preview = requests.get(f'http://localhost:5000/api/data/datasets/{name}/preview').json()
+        assert preview['preview'] == [{'quarter': value}]
@@ -0,0 +1,26 @@
+import requests
+import os
+import pytest
+
+def test_upload_reports_detected_format():
+    """Test that the upload response carries the sniffed file format."""
+    test_file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'semicolon_latin1.csv')
+    with open(test_file_path, 'wb') as f:
+        f.write('id;name;city\n1;José;Málaga\n2;Zoë;Köln\n'.encode('cp1252'))
+
+    try:
+        files = {
+            'file': ('semicolon_latin1.csv', open(test_file_path, 'rb'), 'text/csv')
+        }
+
+        response = requests.post('http://localhost:5000/api/datasets', files=files)
+        assert response.status_code == 200
+        data = response.json()
+        assert data['success'] is True
+        assert data['columns'] == ['id', 'name', 'city']
+        assert data['detection']['delimiter'] == ';'
+        assert data['detection']['encoding'] == 'cp1252'
+        assert data['detection']['has_header'] is True
+    finally:
+        if os.path.exists(test_file_path):
+            os.remove(test_file_path)
@@ -0,0 +1,118 @@
+import requests
+import os
+import pytest
+
+def test_stream_upload_above_form_limit():
+    """Test streaming a file larger than the 16MB form upload limit."""
+    large_file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'large_stream.csv')
+    with open(large_file_path, 'w') as f:
+        f.write('header1,header2\n')
+        for i in range(1000000):  # This should create a file > 16MB
+            f.write(f'data{i},value{i}\n')
+    
+    try:
+        with open(large_file_path, 'rb') as f:
+            response = requests.post(
+                'http://localhost:5000/api/data/upload/stream',
+                params={'filename': 'large_stream.csv', 'dataset_name': 'large_stream'},
+                data=f
+            )
+        assert response.status_code == 200
+        data = response.json()
+        assert data['success'] is True
+        assert data['dataset_info']['rows'] == 1000000
+        assert data['dataset_info']['file_size'] == os.path.getsize(large_file_path)
+        assert len(data['dataset_info']['sha256']) == 64
+    finally:
+        if os.path.exists(large_file_path):
+            os.remove(large_file_path)
+
+def test_stream_upload_without_filename():
+    """Test streaming upload request without a filename."""
+    response = requests.post('http://localhost:5000/api/data/upload/stream', data=b'a,b\n1,2\n')
+    assert response.status_code == 400
+    data = response.json()
+    assert 'error' in data
+
+def test_partitioned_upload_and_query():
+    """Test storing a dataset partitioned by a column and querying it with filters."""
+    body = 'region,amount,note\n' + ''.join(f'{["north", "south"][i % 2]},{i},n{i}\n' for i in range(100))
+    response = requests.post(
+        'http://localhost:5000/api/data/upload/stream',
+        params={'filename': 'regions.csv', 'dataset_name': 'regions', 'partition_by': 'region'},
+        data=body.encode()
+    )
+    assert response.status_code == 200
+    assert response.json()['storage_info']['storage_info']['file']['partition_by'] == 'region'
+    
+    response = requests.post('http://localhost:5000/api/data/datasets/regions/query', json={
+        'columns': ['amount'],
+        'filters': [['region', '==', 'south'], ['amount', '<', 10]]
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert data['columns'] == ['amount']
+    assert sorted(row['amount'] for row in data['rows']) == [1, 3, 5, 7, 9]
+    
+    response = requests.post('http://localhost:5000/api/data/datasets/regions/query', json={'columns': ['missing']})
+    assert response.status_code == 400
+
+def test_stream_upload_keeps_dates_that_break_the_first_chunk_format():
+    """Test a date column whose later rows use another format is kept as text rather than lost."""
+    body = 'id,day,joined\n' + ''.join(
+        f'{i},{i % 28 + 1:02d}/01/2024,{i % 28 + 1:02d}/03/2023\n' if i < 1000 else
+        f'{i},2024-02-{i % 28 + 1:02d},{i % 28 + 1:02d}/03/2023\n'
+        for i in range(1500))
+    response = requests.post(
+        'http://localhost:5000/api/data/upload/stream',
+        params={'filename': 'mixed_dates.csv', 'dataset_name': 'mixed_dates'},
+        data=body.encode()
+    )
+    assert response.status_code == 200
+    assert response.json()['dataset_info']['rows'] == 1500
+    
+    response = requests.post('http://localhost:5000/api/data/datasets/mixed_dates/query',
+                             json={'columns': ['day'], 'filters': [['id', '>=', 1498]]})
+    assert response.status_code == 200
+    assert [row['day'] for row in response.json()['rows']] == ['2024-02-15', '2024-02-16']
+    
+    # The column that is a date throughout keeps its type, and previews show its source format
+    response = requests.get('http://localhost:5000/api/data/datasets/mixed_dates/preview', params={'rows': 2})
+    assert response.status_code == 200
+    assert [row['joined'] for row in response.json()['preview']] == ['01/03/2023', '02/03/2023']
+
+def test_stream_upload_keeps_column_types_across_chunks():
+    """Test that chunks after the first are read with the first chunk's types, not inferred again."""
+    body = 'code,count,flag\n' + ''.join(
+        f'A{i},{i},True\n' if i < 1000 else f'{i:05d},{"" if i % 2 else i},\n' for i in range(1500))
+    response = requests.post(
+        'http://localhost:5000/api/data/upload/stream',
+        params={'filename': 'codes.csv', 'dataset_name': 'codes'},
+        data=body.encode()
+    )
+    assert response.status_code == 200
+    
+    response = requests.post('http://localhost:5000/api/data/datasets/codes/query',
+                             json={'filters': [['count', '>=', 1497]]})
+    assert response.status_code == 200
+    assert response.json()['rows'] == [{'code': '01498', 'count': 1498, 'flag': None}]
+    
+    # Columns the first chunk typed as numbers and later chunks hold text in are read again as text
+    body = 'id,score,ratio\n' + ''.join(
+        f'{i},{i:03d},{i / 4}\n' if i < 1000 else f'{i},n/a{i},{"-" if i == 1499 else i / 4}\n' for i in range(1500))
+    response = requests.post(
+        'http://localhost:5000/api/data/upload/stream',
+        params={'filename': 'scores.csv', 'dataset_name': 'scores'},
+        data=body.encode()
+    )
+    assert response.status_code == 200
+    columns = response.json()['storage_info']['schema']['columns']
+    assert columns['score']['dtype'] == 'object'
+    assert columns['ratio']['dtype'] == 'object'
+    assert columns['id']['dtype'] == 'int64'
+    
+    response = requests.post('http://localhost:5000/api/data/datasets/scores/query',
+                             json={'filters': [['id', 'in', [7, 1499]]]})
+    assert response.status_code == 200
+    assert response.json()['rows'] == [{'id': 7, 'score': '007', 'ratio': '1.75'},
+                                       {'id': 1499, 'score': 'n/a1499', 'ratio': '-'}]
@@ -0,0 +1,101 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from utils.file_detection import read_csv_kwargs
+from utils.schema_inference import apply_schema, arrow_column_types, pandas_read_options
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+ENGINES = ('pandas', 'pyarrow')
+
+# Same strings pandas.read_csv treats as missing by default
+DEFAULT_NULL_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+]
+
+
+def _arrow_encoding(encoding):
+    # Arrow skips a UTF-8 BOM itself and only transcodes other encodings
+    return 'utf8' if encoding in ('utf-8', 'utf-8-sig') else encoding
+
+
+def read_csv_arrow(filepath, detection, column_types=None, null_values=None,
+                   use_threads=True, block_size=None, dtype_backend=None):
+    """Parse a delimited text file with the multi-threaded Arrow CSV reader.
+    
+    Args:
+        filepath: path of the file
+        detection: format detected by ``detect_file_format``
+        column_types: optional mapping of column name to Arrow type
+        null_values: strings read as missing (defaults to the pandas list)
+        use_threads: parse blocks in parallel on all cores
+        block_size: bytes per parse block (Arrow default if None)
+        dtype_backend: 'pyarrow' to keep Arrow-backed columns in the DataFrame
+    """
+    has_header = detection.get('has_header', True)
+    read_options = pacsv.ReadOptions(
+        encoding=_arrow_encoding(detection.get('encoding', 'utf-8')),
+        skip_rows=detection.get('header_row', 0) or 0,
+        autogenerate_column_names=not has_header,
+        use_threads=use_threads,
+        **({'block_size': block_size} if block_size else {})
+    )
+    parse_options = pacsv.ParseOptions(
+        delimiter=detection.get('delimiter', ','),
+        quote_char=detection.get('quotechar', '"')
+    )
+    convert_options = pacsv.ConvertOptions(
+        column_types=column_types or {},
+        null_values=null_values if null_values is not None else DEFAULT_NULL_VALUES,
+        strings_can_be_null=True
+    )
+    table = pacsv.read_csv(filepath, read_options=read_options,
+                           parse_options=parse_options, convert_options=convert_options)
+    if not has_header:
+        # Match pandas' integer column labels for headerless files
+        table = table.rename_columns([str(i) for i in range(table.num_columns)])
+    
+    if dtype_backend == 'pyarrow':
+        df = table.to_pandas(types_mapper=pd.ArrowDtype)
+    else:
+        # Dates become datetime64 columns rather than object columns of datetime.date
+        df = table.to_pandas(date_as_object=False)
+    if not has_header:
+        df.columns = range(len(df.columns))
+    return df
+
+
+def read_delimited(filepath, detection, engine='pandas', column_types=None, null_values=None,
+                   dtype_backend=None, schema=None, **kwargs):
+    """Parse a delimited text file with the selected engine.
+    
+    The Arrow engine falls back to the pandas parser for files it rejects
+    (ragged rows, values that do not fit the inferred type, ...). Explicit
+    ``column_types`` only apply to the Arrow reader. A stored ``schema``
+    (see ``utils.schema_inference``) is passed to either parser as explicit
+    column types, so no type inference runs.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unsupported CSV engine: {engine}")
+    has_header = detection.get('has_header', True)
+    
+    if engine == 'pyarrow':
+        try:
+            types = dict(arrow_column_types(schema, has_header), **(column_types or {}))
+            df = read_csv_arrow(filepath, detection, column_types=types,
+                                null_values=null_values, dtype_backend=dtype_backend, **kwargs)
+            return apply_schema(df, schema)
+        except (pa.ArrowException, LookupError, UnicodeDecodeError) as e:
+            logger.warning(f"Arrow CSV reader rejected {os.path.basename(filepath)}, "
+                           f"falling back to pandas: {str(e)}")
+    
+    options = read_csv_kwargs(detection)
+    if null_values is not None:
+        options.update({'na_values': null_values, 'keep_default_na': False})
+    if dtype_backend:
+        options['dtype_backend'] = dtype_backend
+    options.update(pandas_read_options(schema, has_header))
+    return apply_schema(pd.read_csv(filepath, **options), schema)
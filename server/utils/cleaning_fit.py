@@ -0,0 +1,97 @@
+import pandas as pd
+from utils.cleaning_plan import Step, FITS
+from utils.errors import InvalidRequest
+
+# Distinct values kept per column in a normalization vocabulary; a column
+# with more values stores none
+VOCABULARY_LIMIT = 10000
+
+# The range of the data a step was fitted on says nothing about new data
+RANGE_KEYS = ('min', 'max')
+
+
+class Vocabulary:
+    """Distinct values of the normalized text columns of cleaned data,
+    gathered from a frame or from a stream of chunks."""
+    
+    def __init__(self, columns, limit=VOCABULARY_LIMIT):
+        self.limit = limit
+        self.values = {column: set() for column in columns}
+    
+    def update(self, chunk):
+        for column, values in self.values.items():
+            if values is None or column not in chunk.columns:
+                continue
+            values.update(pd.unique(chunk[column].dropna()))
+            if len(values) > self.limit:
+                self.values[column] = None
+    
+    def to_dict(self):
+        return {str(column): None if values is None else sorted(values, key=str)
+                for column, values in self.values.items()}
+    
+    def unseen(self, stored):
+        """Count the values of each column missing from ``stored``, a vocabulary
+        from :meth:`to_dict`; columns either side gave up on are left out."""
+        return {str(column): len(values - set(stored[str(column)]))
+                for column, values in self.values.items()
+                if values is not None and stored.get(str(column)) is not None}
+
+
+def normalized_columns(steps):
+    """Columns the normalize_text steps among ``steps`` rewrite, in order."""
+    return list(dict.fromkeys(column for step in steps if step.operation == 'normalize_text'
+                              for column in step.columns))
+
+
+def fit_record(steps, vocabulary=None):
+    """Fitted parameters of cleaning steps that have run, to store with the
+    cleaned dataset: each step with its options and the statistics it fitted
+    per column (imputation values, outlier bounds), plus the vocabulary of the
+    normalized text columns.
+    
+    Args:
+        steps: list of Step in requested order, after the plan ran
+        vocabulary: Vocabulary of the cleaned data, or None
+    
+    Returns:
+        dict: JSON-serialisable record (see :func:`fitted_steps`)
+    """
+    return {
+        'steps': [{
+            'operation': step.operation,
+            'columns': None if step.columns is None else [str(column) for column in step.columns],
+            'params': step.params,
+            'fitted': {str(column): {key: value for key, value in fitted.items() if key not in RANGE_KEYS}
+                       for column, fitted in step.fitted.items()} if step.operation in FITS else {}
+        } for step in steps],
+        'vocabulary': vocabulary.to_dict() if vocabulary is not None else {}
+    }
+
+
+def fitted_steps(record, columns):
+    """Rebuild the steps of a stored fit for data with ``columns``.
+    
+    Steps keep the statistics they were fitted with, so running them on new
+    data is a single pass with no aggregates, and batches cleaned with the
+    same fit get the same fill values and bounds.
+    
+    Raises:
+        InvalidRequest: if the data lacks columns the fit cleans
+    
+    Returns:
+        list: Step in requested order
+    """
+    labels = {str(column): column for column in columns}
+    steps = []
+    for stored in record['steps']:
+        names = stored['columns']
+        if names is not None:
+            absent = [name for name in names if name not in labels]
+            if absent:
+                raise InvalidRequest(f"Columns {absent} of the stored fit are missing from the dataset")
+            names = [labels[name] for name in names]
+        step = Step(stored['operation'], names, **stored['params'])
+        step.fitted = {labels[name]: fitted for name, fitted in stored['fitted'].items()}
+        steps.append(step)
+    return steps
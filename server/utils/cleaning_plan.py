@@ -0,0 +1,572 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from utils.logging import get_logger
+from utils.row_fingerprint import RowFingerprints
+from utils.shared_frames import share_table, read_shared, release_shared
+from utils.text_normalization import normalize_text
+from utils.errors import InvalidRequest
+
+logger = get_logger(__name__)
+
+# Rough cost per cell, in nanoseconds, of each operation; used to estimate plans
+NS_PER_CELL = {
+    'normalize_text': 200,
+    'impute': 100,
+    'fill_missing': 5,
+    'clip_outliers': 50,
+    'replace_outliers': 35,
+    'drop_missing': 15,
+    'dedupe': 40,
+}
+
+# Operations that keep or drop whole rows; all others rewrite the cells of their columns
+ROW_FILTERS = {'drop_missing', 'dedupe'}
+
+# Fused passes over fewer cells (rows times columns) than this run on the
+# request thread even when worker processes are configured
+PARALLEL_MIN_CELLS = 2000000
+
+class Step:
+    """One operation of a cleaning plan.
+    
+    Column operations rewrite ``columns``. Row filters read ``columns``,
+    None meaning every column. ``params`` holds the operation's options
+    (imputation strategy, fill value, outlier threshold) and ``fitted`` the
+    statistics fitted for each column (means, modes, outlier bounds).
+    ``persist_fit`` is set when the statistics are stored to clean new data,
+    so they are fitted even where this data has no use for them.
+    """
+    
+    def __init__(self, operation, columns=None, **params):
+        if operation not in NS_PER_CELL:
+            raise InvalidRequest(f"Unsupported cleaning operation: {operation}")
+        self.operation = operation
+        self.columns = None if columns is None else list(columns)
+        self.params = params
+        self.note = None
+        self.fused_pass = None
+        self.estimated_seconds = 0.0
+        self.seconds = 0.0
+        self.rows_in = None
+        self.rows_out = None
+        self.cells = 0
+        self.fitted = {}
+        self.persist_fit = False
+    
+    @property
+    def filters_rows(self):
+        return self.operation in ROW_FILTERS
+    
+    def copy(self, note):
+        step = Step(self.operation, self.columns, **self.params)
+        step.note = note
+        step.persist_fit = self.persist_fit
+        return step
+    
+    def describe(self):
+        return {
+            'operation': self.operation,
+            'columns': self.columns,
+            'params': self.params,
+            'fused_pass': self.fused_pass,
+            'note': self.note,
+            'estimated_seconds': round(self.estimated_seconds, 6),
+            'actual_seconds': round(self.seconds, 6),
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out
+        }
+
+
+def _fit_impute(values, step):
+    # Nothing to fill, so the (for modes, costly) statistic is not needed,
+    # unless a stored fit is to fill new data with it
+    if not values.hasnans and not step.persist_fit:
+        return {'value': None}
+    if step.params.get('strategy', 'mean') == 'mean':
+        return {'value': float(values.astype('float64').mean())}
+    mode = values.mode()
+    return {'value': mode.iloc[0] if len(mode) else None}
+
+
+def tukey_fences(q1, q3, minimum, maximum):
+    """Fitted clip_outliers statistics: 1.5 interquartile ranges beyond the quartiles."""
+    iqr = q3 - q1
+    return {'lower': q1 - 1.5 * iqr, 'upper': q3 + 1.5 * iqr, 'min': minimum, 'max': maximum}
+
+
+def _fit_clip_outliers(values, step):
+    q1, q3 = values.quantile([0.25, 0.75])
+    return tukey_fences(float(q1), float(q3), float(values.min()), float(values.max()))
+
+
+def _fit_clip_outliers_frame(frame, step):
+    # Both quartiles of every column from one vectorized partition per column
+    quartiles = frame.quantile([0.25, 0.75])
+    minimum, maximum = frame.min(), frame.max()
+    return {column: tukey_fences(float(quartiles.at[0.25, column]), float(quartiles.at[0.75, column]),
+                                 float(minimum[column]), float(maximum[column]))
+            for column in frame.columns}
+
+
+def _fit_replace_outliers(values, step):
+    return {'mean': values.mean(), 'std': values.std(),
+            'min': float(values.min()), 'max': float(values.max())}
+
+
+def _holds(values, value):
+    # Whether writing ``value`` into the column keeps its integer dtype
+    if values.dtype.kind not in 'iu':
+        return True
+    info = np.iinfo(values.dtype)
+    return float(value).is_integer() and info.min <= value <= info.max
+
+
+def _normalize_text(values, step, fitted):
+    return normalize_text(values, **step.params)
+
+
+def _impute(values, step, fitted):
+    if step.params.get('strategy', 'mean') == 'mean':
+        # Mean imputation yields floats whether or not anything is missing
+        values = values.astype('float64')
+    if not values.hasnans or fitted['value'] is None:
+        return values
+    return values.fillna(fitted['value'])
+
+
+def _fill_missing(values, step, fitted):
+    if fitted and fitted.get('to_object'):
+        values = values.astype(object)
+    return values.fillna(step.params['value']) if values.hasnans else values
+
+
+# An integer column turns float when a fractional value is written into it.
+# Whether that happens is decided from the range of the whole column, which
+# matches pandas on a full column and keeps the chunks of a stream in step.
+# A stored fit applied to new data has no range, so any fence may be crossed.
+def _clip_outliers(values, step, fitted):
+    lower, upper = fitted['lower'], fitted['upper']
+    if ((fitted.get('min', -np.inf) < lower and not _holds(values, lower)) or
+            (fitted.get('max', np.inf) > upper and not _holds(values, upper))):
+        values = values.astype('float64')
+    return values.clip(lower=lower, upper=upper)
+
+
+def _replace_outliers(values, step, fitted):
+    mean = fitted['mean']
+    limit = step.params.get('sigma', 3) * fitted['std']
+    if ((fitted.get('max', np.inf) - mean > limit or mean - fitted.get('min', -np.inf) > limit)
+            and not _holds(values, mean)):
+        values = values.astype('float64')
+    return values.mask(np.abs(values - mean) > limit, mean)
+
+
+# Column statistics a step needs before it can rewrite a column, computed
+# from the column as it stands at that step
+FITS = {
+    'impute': _fit_impute,
+    'clip_outliers': _fit_clip_outliers,
+    'replace_outliers': _fit_replace_outliers,
+}
+
+# Fit several columns at once, on the frame of those columns
+FRAME_FITS = {
+    'clip_outliers': _fit_clip_outliers_frame,
+}
+
+# Rewrite a column given the statistics fitted for it (None when the operation has none)
+COLUMN_OPERATIONS = {
+    'normalize_text': _normalize_text,
+    'impute': _impute,
+    'fill_missing': _fill_missing,
+    'clip_outliers': _clip_outliers,
+    'replace_outliers': _replace_outliers,
+}
+
+
+def is_row_wise(step):
+    """Whether a column step computes each cell from that cell alone.
+    
+    The result of such a step does not depend on which other rows are
+    present, so row filters may run before it. Filling with text is not:
+    whether a numeric column turns into text depends on whether any of its
+    rows is missing.
+    """
+    if step.operation == 'normalize_text':
+        return True
+    return step.operation == 'fill_missing' and isinstance(step.params['value'], (int, float))
+
+
+def _run_chain(values, column, chain, stats):
+    """Run the steps of one column's chain in order.
+    
+    Steps fit their statistics on the column unless ``step.fitted`` already
+    holds them (from an earlier pass over the data or a
+    stored fit).
+    
+    Args:
+        values: the column
+        column: its label
+        chain: (number, step) pairs, numbered by position in their pass
+        stats: step number -> [seconds, cells, fitted statistics by column], added to
+    """
+    for number, step in chain:
+        start = time.perf_counter()
+        record = stats.setdefault(number, [0.0, 0, {}])
+        fitted = step.fitted.get(column)
+        if fitted is None and step.operation in FITS:
+            fitted = record[2][column] = FITS[step.operation](values, step)
+        missing = int(values.isna().sum()) if step.operation in ('impute', 'fill_missing') else 0
+        values = COLUMN_OPERATIONS[step.operation](values, step, fitted)
+        if missing:
+            record[1] += missing - int(values.isna().sum())
+        record[0] += time.perf_counter() - start
+    return values
+
+
+def _to_arrow(values):
+    """Arrow array of a column that converts back to the same dtype, or None."""
+    if values.dtype != object and values.dtype.kind not in 'biufM':
+        return None
+    try:
+        array = pa.Array.from_pandas(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return None
+    # Object columns only qualify when they hold text (or nothing at all)
+    if values.dtype == object and not (pa.types.is_string(array.type) or pa.types.is_null(array.type)):
+        return None
+    return array
+
+
+def _clean_shared_columns(name, size, chains):
+    """Run column chains in a worker process on columns the parent shared.
+    
+    Args:
+        name, size: shared block holding the input columns, named by position
+        chains: label and chain of each shared column, in the same order
+    
+    Returns:
+        tuple: name and size of the shared block holding the cleaned columns
+        (None when there are none), step stats per column position, and the
+        positions of columns whose result cannot go back through Arrow
+    """
+    frame = read_shared(name, size)
+    arrays, names, stats, failed = [], [], {}, []
+    for position, (column, chain) in enumerate(chains):
+        column_stats = {}
+        array = _to_arrow(_run_chain(frame[str(position)], column, chain, column_stats))
+        if array is None:
+            failed.append(position)
+            continue
+        arrays.append(array)
+        names.append(str(position))
+        stats[position] = column_stats
+    if not arrays:
+        return None, 0, stats, failed
+    out_name, out_size = share_table(pa.Table.from_arrays(arrays, names=names))
+    return out_name, out_size, stats, failed
+
+
+def _balance(columns, chains, workers):
+    # Longest first onto the least loaded batch, costed by NS_PER_CELL
+    cost = {column: sum(NS_PER_CELL[step.operation] for _, step in chains[column]) for column in columns}
+    batches = [[] for _ in range(min(workers, len(columns)))]
+    loads = [0] * len(batches)
+    for column in sorted(columns, key=cost.get, reverse=True):
+        lightest = loads.index(min(loads))
+        batches[lightest].append(column)
+        loads[lightest] += cost[column]
+    return batches
+
+
+def _run_parallel(df, chains, workers, stats):
+    """Run column chains across worker processes.
+    
+    Columns go to the workers, and come back, as Arrow tables in shared
+    memory blocks rather than pickled through the pool's pipes. Columns
+    Arrow cannot carry without changing their dtype (mixed-type objects,
+    extension dtypes) are left for the caller to run serially.
+    
+    Returns:
+        dict: cleaned values of the columns the workers ran
+    """
+    shareable = {}
+    for column in chains:
+        array = _to_arrow(df[column])
+        if array is not None:
+            shareable[column] = array
+    if len(shareable) < 2:
+        return {}
+    
+    batches = _balance(list(shareable), chains, workers)
+    blocks = []
+    results = {}
+    error = None
+    try:
+        with ProcessPoolExecutor(max_workers=len(batches)) as executor:
+            futures = []
+            for batch in batches:
+                table = pa.Table.from_arrays([shareable[column] for column in batch],
+                                             names=[str(position) for position in range(len(batch))])
+                name, size = share_table(table)
+                blocks.append(name)
+                futures.append((batch, executor.submit(_clean_shared_columns, name, size,
+                                                       [(column, chains[column]) for column in batch])))
+            # Every result is collected, even after a failure, so no block leaks
+            for batch, future in futures:
+                try:
+                    out_name, out_size, column_stats, failed = future.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                if out_name is None:
+                    continue
+                blocks.append(out_name)
+                frame = read_shared(out_name, out_size)
+                for position, column in enumerate(batch):
+                    if position in failed:
+                        continue
+                    results[column] = frame[str(position)].set_axis(df.index)
+                    for number, (seconds, cells, fitted) in column_stats[position].items():
+                        record = stats.setdefault(number, [0.0, 0, {}])
+                        record[0] += seconds
+                        record[1] += cells
+                        record[2].update(fitted)
+    finally:
+        for name in blocks:
+            release_shared(name)
+    
+    if isinstance(error, BrokenProcessPool):
+        logger.warning(f"Cleaning workers died, running the pass serially: {str(error)}")
+        stats.clear()
+        return {}
+    if error is not None:
+        raise error
+    logger.info(f"Cleaned {len(results)} columns in {len(batches)} worker processes")
+    return results
+
+
+def _filters_commute(first, second):
+    # A dedupe and a missing-value filter select the same rows in either
+    # order when the filter only reads columns the dedupe compares: rows
+    # the dedupe treats as equal are then all kept or all dropped together
+    operations = {first.operation, second.operation}
+    if operations == {'drop_missing'}:
+        return True
+    if operations != {'drop_missing', 'dedupe'}:
+        return False
+    dedupe, drop = (first, second) if first.operation == 'dedupe' else (second, first)
+    if dedupe.columns is None:
+        return True
+    return drop.columns is not None and set(drop.columns) <= set(dedupe.columns)
+
+
+def _can_pass(row_filter, step):
+    """Tell whether ``row_filter`` may run before ``step`` instead of after it."""
+    if step.filters_rows:
+        return _filters_commute(row_filter, step)
+    if not is_row_wise(step):
+        return False
+    if row_filter.operation == 'dedupe':
+        # Equal rows stay equal under a row-wise transform, so deduping
+        # earlier only drops rows the later dedupe would drop too
+        return True
+    # The transform must not change which cells the filter sees as missing
+    return row_filter.columns is not None and not set(row_filter.columns) & set(step.columns)
+
+
+def _writes_into(steps, columns):
+    return any(not step.filters_rows and (columns is None or set(step.columns) & set(columns))
+               for step in steps)
+
+
+class CleaningPlan:
+    """An ordered list of cleaning steps compiled from the requested operations.
+    
+    :func:`compile_plan` moves row filters (dedupe, dropping rows with missing
+    values) ahead of per-cell transforms where that leaves the result
+    unchanged, so the expensive transforms run on fewer rows, and groups
+    consecutive column operations into fused passes that read and write each
+    column once.
+    """
+    
+    def __init__(self, steps, rows, columns):
+        self.steps = steps
+        self.rows = rows
+        self.columns = columns
+        self.seconds = None
+    
+    def passes(self):
+        """Yield the steps grouped into the passes they execute in."""
+        group = []
+        for step in self.steps:
+            if step.filters_rows:
+                if group:
+                    yield group
+                    group = []
+                yield [step]
+            else:
+                group.append(step)
+        if group:
+            yield group
+    
+    def _filter(self, df, step, fingerprints):
+        start = time.perf_counter()
+        step.rows_in = len(df)
+        if step.operation == 'dedupe':
+            keep = ~fingerprints.duplicated(step.columns)
+        else:
+            subset = df if step.columns is None else df[step.columns]
+            keep = subset.notna().all(axis=1).to_numpy()
+            step.cells = int(df[~keep].isna().sum().sum())
+        df = df[keep]
+        fingerprints.take(df, keep)
+        step.rows_out = len(df)
+        if step.operation == 'dedupe':
+            step.cells = step.rows_in - step.rows_out
+        step.seconds += time.perf_counter() - start
+        return df
+    
+    def _fused(self, df, steps, fingerprints, workers, min_cells):
+        columns = list(dict.fromkeys(column for step in steps for column in step.columns))
+        chains = {column: [(number, step) for number, step in enumerate(steps) if column in step.columns]
+                  for column in columns}
+        for step in steps:
+            step.rows_in = step.rows_out = len(df)
+        
+        # Columns the pass has not changed yet are fitted together, before the chains run
+        stats = {}
+        for number, step in enumerate(steps):
+            fit_frame = FRAME_FITS.get(step.operation)
+            unchanged = [column for column in step.columns
+                         if column not in step.fitted and chains[column][0][1] is step]
+            if fit_frame is None or len(unchanged) < 2:
+                continue
+            start = time.perf_counter()
+            step.fitted.update(fit_frame(df[unchanged], step))
+            stats[number] = [time.perf_counter() - start, 0, {}]
+        
+        # Columns are independent within a pass, so wide frames split them across processes
+        results = {}
+        if workers > 1 and len(columns) > 1 and len(df) * len(columns) >= min_cells:
+            results = _run_parallel(df, chains, workers, stats)
+        
+        # A shallow copy owns its columns, so replacing them never writes
+        # into the caller's frame or a frame it was filtered from
+        df = df.copy(deep=False)
+        for column in columns:
+            values = results.get(column)
+            if values is None:
+                values = _run_chain(df[column], column, chains[column], stats)
+            df[column] = values
+        for number, (seconds, cells, fitted) in stats.items():
+            steps[number].seconds += seconds
+            steps[number].cells += cells
+            steps[number].fitted.update(fitted)
+        fingerprints.invalidate(df, columns)
+        return df
+    
+    def execute(self, df, fingerprints=None, workers=1, min_cells=PARALLEL_MIN_CELLS):
+        """Run the plan on ``df`` and return the cleaned frame.
+        
+        Args:
+            df: frame the plan was compiled for; it is not modified
+            fingerprints: RowFingerprints of ``df``, updated to follow the
+                cleaned frame (created if None)
+            workers: processes running the columns of fused passes over at
+                least ``min_cells`` cells (0 for one per CPU, 1 to run serially);
+                step timings then add up the time spent in every worker
+        """
+        fingerprints = fingerprints or RowFingerprints(df)
+        workers = workers or os.cpu_count() or 1
+        start = time.perf_counter()
+        for steps in self.passes():
+            if steps[0].filters_rows:
+                df = self._filter(df, steps[0], fingerprints)
+            else:
+                df = self._fused(df, steps, fingerprints, workers, min_cells)
+        self.seconds = time.perf_counter() - start
+        logger.info(f"Ran cleaning plan of {len(self.steps)} steps in {self.seconds:.3f}s: "
+                    f"{self.rows} rows in, {len(df)} out")
+        return df
+    
+    def cells(self, *operations):
+        """Cells filled or rows removed by the steps running ``operations``."""
+        return sum(step.cells for step in self.steps if step.operation in operations)
+    
+    def explain(self):
+        """Describe the plan: its steps in execution order with estimated and
+        actual timings (actual ones are None until it has run)."""
+        steps = []
+        for step in self.steps:
+            description = step.describe()
+            if self.seconds is None:
+                description['actual_seconds'] = None
+            steps.append(description)
+        return {
+            'rows': self.rows,
+            'columns': self.columns,
+            'passes': len(list(self.passes())),
+            'estimated_seconds': round(sum(step.estimated_seconds for step in self.steps), 6),
+            'actual_seconds': None if self.seconds is None else round(self.seconds, 6),
+            'steps': steps
+        }
+
+
+def compile_plan(steps, df, rows=None):
+    """Compile cleaning steps, given in the order they were requested, into a plan.
+    
+    Each row filter is moved ahead of the preceding steps it can safely
+    pass: row-wise transforms that do not touch the columns it reads, and
+    row filters it commutes with. A dedupe may also pass row-wise transforms
+    of the columns it compares (equal rows stay equal); it then runs both
+    ahead of them and again at its requested place, where it only removes
+    rows the transforms made equal. Imputation and outlier handling compute
+    column statistics over the rows present, so no filter moves past them.
+    
+    Args:
+        steps: list of Step, in requested order
+        df: frame the plan will run on, used for estimates
+        rows: row count of the data when ``df`` only samples it
+    
+    Returns:
+        CleaningPlan
+    """
+    planned = []
+    for step in steps:
+        if not step.filters_rows:
+            planned.append(step)
+            continue
+        position = len(planned)
+        while position and _can_pass(step, planned[position - 1]):
+            position -= 1
+        # Swapping filters alone gains nothing; only pass them on the way past a transform
+        while position < len(planned) and planned[position].filters_rows:
+            position += 1
+        passed = planned[position:]
+        if not passed:
+            planned.append(step)
+        elif step.operation == 'dedupe' and _writes_into(passed, step.columns):
+            planned.insert(position, step.copy(
+                f"early dedupe ahead of {', '.join(s.operation for s in passed)}"))
+            step.note = f"repeated after {', '.join(s.operation for s in passed if not s.filters_rows)}"
+            planned.append(step)
+        else:
+            step.note = f"moved ahead of {', '.join(s.operation for s in passed)}"
+            planned.insert(position, step)
+    
+    rows = len(df) if rows is None else rows
+    plan = CleaningPlan(planned, rows, len(df.columns))
+    for number, steps_in_pass in enumerate(plan.passes()):
+        for step in steps_in_pass:
+            step.fused_pass = number
+            # Filters are assumed to keep every row, so estimates are upper bounds
+            width = len(df.columns) if step.columns is None else len(step.columns)
+            step.estimated_seconds = rows * width * NS_PER_CELL[step.operation] * 1e-9
+    logger.info(f"Compiled cleaning plan: {' -> '.join(step.operation for step in planned)}")
+    return plan
@@ -0,0 +1,117 @@
+import argparse
+import os
+import tempfile
+import time
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from utils.logging import get_logger
+from utils.parquet import open_dataset, resolve_codec
+
+logger = get_logger(__name__)
+
+# Codec and level pairs compared by default, from fastest to smallest
+BENCHMARK_CODECS = [
+    ('none', None),
+    ('snappy', None),
+    ('lz4', None),
+    ('zstd', 1),
+    ('zstd', 3),
+    ('zstd', 9),
+    ('gzip', None),
+]
+
+# Rows of a dataset written with each codec
+SAMPLE_ROWS = 100000
+
+# Writes and reads per codec; the fastest run is reported
+REPEAT = 3
+
+
+def _best_time(action, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        action()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark_codecs(df, codecs=None, repeat=REPEAT, row_group_size=None):
+    """Write a DataFrame with each codec and time writing and reading it back.
+    
+    The frame is converted to Arrow once, so the timings only differ by the
+    codec's own encoding and decoding cost. Reads decode the whole file into
+    an Arrow table, which is what every ``get_dataset`` call pays.
+    
+    Args:
+        df: sample to write
+        codecs: (codec, level) pairs (None for BENCHMARK_CODECS)
+        repeat: runs per codec; the fastest is reported
+        row_group_size: rows per row group, as used by stored datasets
+    
+    Returns:
+        list: per codec, its ``codec``, ``level``, ``size`` in bytes, ``ratio``
+        to the uncompressed size, ``write_seconds`` and ``read_seconds``, or
+        an ``error`` if the codec cannot be used
+    """
+    if not all(isinstance(col, str) for col in df.columns):
+        df = df.set_axis([str(col) for col in df.columns], axis=1)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    results = []
+    
+    with tempfile.TemporaryDirectory() as folder:
+        for codec, level in codecs or BENCHMARK_CODECS:
+            try:
+                codec, level = resolve_codec(codec, level)
+            except ValueError as e:
+                results.append({'codec': codec, 'level': level, 'error': str(e)})
+                continue
+            path = os.path.join(folder, f"{codec}-{level}.parquet")
+            write_seconds = _best_time(lambda: pq.write_table(table, path, compression=codec, compression_level=level,
+                                                              row_group_size=row_group_size), repeat)
+            read_seconds = _best_time(lambda: pq.read_table(path), repeat)
+            results.append({
+                'codec': codec,
+                'level': level,
+                'size': os.path.getsize(path),
+                'write_seconds': round(write_seconds, 6),
+                'read_seconds': round(read_seconds, 6)
+            })
+    
+    uncompressed = next((r['size'] for r in results if r.get('codec') == 'none'), None)
+    for result in results:
+        if uncompressed and 'size' in result:
+            result['ratio'] = round(result['size'] / uncompressed, 4)
+    logger.info(f"Benchmarked {len(results)} codecs on {len(df)} rows")
+    return results
+
+
+def load_sample(path, rows=SAMPLE_ROWS):
+    """Read the first ``rows`` rows of a Parquet file or dataset directory, or of a CSV file."""
+    if os.path.isdir(path) or path.endswith('.parquet'):
+        return open_dataset(path).head(rows).to_pandas()
+    return pd.read_csv(path, nrows=rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Parquet codecs on a sample of a dataset")
+    parser.add_argument('path', help="Parquet file, partitioned dataset directory or CSV file")
+    parser.add_argument('--rows', type=int, default=SAMPLE_ROWS, help="rows to sample")
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="runs per codec")
+    args = parser.parse_args()
+    
+    df = load_sample(args.path, args.rows)
+    print(f"{len(df)} rows, {len(df.columns)} columns")
+    print(f"{'codec':<8}{'level':>6}{'size':>14}{'ratio':>8}{'write s':>10}{'read s':>10}")
+    for result in benchmark_codecs(df, repeat=args.repeat):
+        if 'error' in result:
+            print(f"{result['codec']:<8}{str(result['level'] or ''):>6}  {result['error']}")
+            continue
+        print(f"{result['codec']:<8}{str(result['level'] or ''):>6}{result['size']:>14}"
+              f"{result.get('ratio', 1):>8.3f}{result['write_seconds']:>10.4f}{result['read_seconds']:>10.4f}")
+
+
+if __name__ == '__main__':
+    main()
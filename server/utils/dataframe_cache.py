@@ -0,0 +1,112 @@
+import os
+import threading
+from collections import OrderedDict
+from utils.config import load_config
+from utils.logging import get_logger
+from utils.schema_inference import schema_digest
+
+logger = get_logger(__name__)
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def file_key(path, schema, *variant):
+    """Cache key of data loaded from ``path``, or None if the file is missing.
+    
+    The file's mtime and size are part of the key, so a rewritten file never
+    hits entries loaded from its previous content. So is a digest of the
+    dataset's stored ``schema`` (None if it has none), so frames typed by a
+    schema that was since inferred again or changed are not served either.
+    ``variant`` holds any read option that changes the loaded frame (e.g.
+    categorical conversion).
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, schema_digest(schema)) + variant
+
+
+class DataFrameCache:
+    """Process-wide LRU cache of loaded DataFrames bounded by their memory use.
+    
+    Entries are sized once with ``memory_usage(deep=True)`` when stored and
+    the least recently used ones are evicted to stay under ``max_bytes``.
+    Frames are copied on the way out, so callers may modify what they get.
+    """
+    
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key, copy=True):
+        """Return the cached frame for ``key``, or None.
+        
+        Args:
+            key: key built by :func:`file_key`
+            copy: return a copy (pass False only when the frame is not modified)
+        """
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        df = entry[0]
+        return df.copy() if copy else df
+    
+    def put(self, key, df):
+        """Store a copy of ``df`` under ``key``, evicting older entries as needed."""
+        if key is None or df is None or self.max_bytes <= 0:
+            return
+        size = int(df.memory_usage(deep=True).sum())
+        if size > self.max_bytes:
+            logger.info(f"Not caching a {size} byte frame over the {self.max_bytes} byte budget")
+            return
+        df = df.copy()
+        with self._lock:
+            # Entries of an older version of the same file can never be hit again
+            for stale in [k for k in self._entries if k == key or (k[0] == key[0] and k[1:4] != key[1:4])]:
+                self._bytes -= self._entries.pop(stale)[1]
+            self._entries[key] = (df, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+    
+    def invalidate(self, path):
+        """Drop every entry loaded from ``path``."""
+        path = os.path.abspath(path)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == path]:
+                self._bytes -= self._entries.pop(key)[1]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def stats(self):
+        """Return hit, miss and eviction counters and the current memory use."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
+
+
+# Shared by every request handler and agent in the process
+dataframe_cache = DataFrameCache(load_config()['storage'].get('dataframe_cache_size', DEFAULT_MAX_BYTES))
@@ -0,0 +1,6 @@
+class InvalidRequest(ValueError):
+    """A request names data or options that do not exist or are not supported:
+    unknown columns, dataset names, codecs, filters or cleaning options.
+    
+    Endpoints answer it with 400. Any other ValueError is an internal error.
+    """
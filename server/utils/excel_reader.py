@@ -0,0 +1,78 @@
+import pandas as pd
+from openpyxl import load_workbook
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _is_xlsx(filepath):
+    # Legacy .xls workbooks are binary BIFF files that openpyxl cannot stream
+    return not filepath.lower().endswith('.xls')
+
+
+def list_sheets(filepath):
+    """Return the sheet names of a workbook without loading any cells."""
+    if not _is_xlsx(filepath):
+        with pd.ExcelFile(filepath) as workbook:
+            return list(workbook.sheet_names)
+    workbook = load_workbook(filepath, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def _header(values):
+    return [str(value) if value is not None else f"Unnamed: {i}" for i, value in enumerate(values)]
+
+
+def iter_excel_batches(filepath, sheet_name=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Stream the rows of one sheet as DataFrame batches.
+    
+    .xlsx workbooks are opened in openpyxl's read-only mode, which parses the
+    sheet XML as it goes instead of building the workbook in memory. The first
+    non-empty row is the header and fully empty rows are skipped.
+    
+    Args:
+        filepath: path of the workbook
+        sheet_name: sheet to read (the first sheet if None)
+        batch_size: rows per DataFrame
+    """
+    if not _is_xlsx(filepath):
+        df = pd.read_excel(filepath, sheet_name=sheet_name or 0)
+        for start in range(0, len(df), batch_size):
+            yield df.iloc[start:start + batch_size]
+        return
+    
+    workbook = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        columns = None
+        batch = []
+        yielded = False
+        for row in worksheet.iter_rows(values_only=True):
+            if all(value is None for value in row):
+                continue
+            if columns is None:
+                columns = _header(row)
+                continue
+            batch.append(row[:len(columns)] + (None,) * (len(columns) - len(row)))
+            if len(batch) >= batch_size:
+                yield pd.DataFrame.from_records(batch, columns=columns)
+                yielded = True
+                batch = []
+        if batch or not yielded:
+            # Always yield at least one frame so a header-only sheet keeps its columns
+            yield pd.DataFrame.from_records(batch, columns=columns or [])
+    finally:
+        workbook.close()
+
+
+def read_excel_sheet(filepath, sheet_name=None, batch_size=50000):
+    """Read one sheet into a single DataFrame through the streaming reader."""
+    batches = list(iter_excel_batches(filepath, sheet_name, batch_size))
+    if not batches:
+        return pd.DataFrame()
+    return pd.concat(batches, ignore_index=True)
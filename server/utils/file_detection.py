@@ -0,0 +1,237 @@
+import codecs
+import csv
+import io
+import mmap
+import os
+from collections import Counter
+import numpy as np
+import pandas as pd
+from utils.excel_reader import list_sheets
+from utils.json_reader import JSON_EXTENSIONS, json_layout
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Number of bytes read from the head of a file to detect its format
+SAMPLE_SIZE = 64 * 1024
+
+# Number of sample lines used to score candidate delimiters
+SAMPLE_LINES = 50
+
+DELIMITERS = [',', ';', '\t', '|']
+
+BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+# Encodings tried, in order, on files without a BOM
+FALLBACK_ENCODINGS = ['utf-8', 'cp1252', 'latin1']
+
+
+def _read_sample(filepath, sample_size=SAMPLE_SIZE):
+    with open(filepath, 'rb') as f:
+        return f.read(sample_size)
+
+
+def detect_encoding(sample):
+    """Detect the encoding of a byte sample.
+
+    Returns:
+        tuple: (encoding, has_bom)
+    """
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding, True
+
+    # UTF-16 without a BOM shows up as NUL bytes on every other position
+    if len(sample) >= 4:
+        even_nuls = sample[0::2].count(0)
+        odd_nuls = sample[1::2].count(0)
+        half = len(sample) / 2
+        if odd_nuls > 0.4 * half and even_nuls < 0.1 * half:
+            return 'utf-16le', False
+        if even_nuls > 0.4 * half and odd_nuls < 0.1 * half:
+            return 'utf-16be', False
+
+    for encoding in FALLBACK_ENCODINGS:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            # final=False tolerates a multi-byte character cut by the sample boundary
+            decoder.decode(sample, final=False)
+            return encoding, False
+        except UnicodeDecodeError:
+            continue
+
+    return 'latin1', False
+
+
+def _decode_sample(sample, encoding):
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    text = decoder.decode(sample, final=False)
+    lines = text.splitlines()
+    # Drop the last line if the sample boundary cut it short
+    if len(sample) >= SAMPLE_SIZE and len(lines) > 1:
+        lines = lines[:-1]
+    return lines[:SAMPLE_LINES]
+
+
+def _score_delimiter(lines, delimiter, quotechar):
+    """Score a delimiter by how consistently it splits the sample lines."""
+    reader = csv.reader(io.StringIO('\n'.join(lines)), delimiter=delimiter, quotechar=quotechar)
+    try:
+        counts = [len(row) for row in reader]
+    except csv.Error:
+        return 0, 0, 0
+    # Blank lines parse as empty rows and say nothing about the delimiter
+    non_blank = [count for count in counts if count]
+    if not non_blank:
+        return 0, 0, 0
+    field_count, frequency = Counter(non_blank).most_common(1)[0]
+    if field_count < 2:
+        return 0, 0, 0
+    return frequency / len(non_blank), field_count, counts.index(field_count)
+
+
+def _detect_quotechar(lines, delimiter):
+    try:
+        dialect = csv.Sniffer().sniff('\n'.join(lines), delimiters=delimiter)
+        if dialect.quotechar in ('"', "'"):
+            return dialect.quotechar
+    except csv.Error:
+        pass
+    return '"'
+
+
+def _looks_numeric(value):
+    try:
+        float(value.replace(',', ''))
+        return True
+    except ValueError:
+        return False
+
+
+def _detect_header(lines, delimiter, quotechar, header_row):
+    """A row made only of numbers is data rather than column names."""
+    row = next(csv.reader([lines[header_row]], delimiter=delimiter, quotechar=quotechar), [])
+    values = [value.strip() for value in row if value.strip()]
+    return not values or not all(_looks_numeric(value) for value in values)
+
+
+def detect_file_format(filepath, file_type='csv', sample_size=SAMPLE_SIZE):
+    """Detect encoding, delimiter, quote character and header row from a bounded sample.
+
+    Only the first ``sample_size`` bytes of the file are read. The result can be
+    passed to :func:`read_csv_kwargs` to parse the full file exactly once.
+    """
+    detection = {'file_type': file_type}
+    if file_type in ('xls', 'xlsx'):
+        sheets = list_sheets(filepath)
+        detection.update({'sheets': sheets, 'sheet_name': sheets[0] if sheets else None})
+        return detection
+
+    sample = _read_sample(filepath, sample_size)
+    encoding, has_bom = detect_encoding(sample)
+    detection.update({'encoding': encoding, 'bom': has_bom})
+    if file_type in JSON_EXTENSIONS:
+        text = codecs.getincrementaldecoder(encoding)(errors='replace').decode(sample, final=False)
+        detection['json_layout'] = json_layout(text, file_type)
+        return detection
+
+    lines = _decode_sample(sample, encoding)
+    # Tab is the conventional delimiter for .txt files, so it wins ties there
+    candidates = ['\t'] + [d for d in DELIMITERS if d != '\t'] if file_type == 'txt' else DELIMITERS
+
+    best = None
+    for delimiter in candidates:
+        quotechar = _detect_quotechar(lines, delimiter)
+        consistency, field_count, first_row = _score_delimiter(lines, delimiter, quotechar)
+        score = (consistency, field_count)
+        if field_count and (best is None or score > best[0]):
+            best = (score, delimiter, quotechar, first_row)
+
+    if best is None:
+        # Single column file
+        delimiter, quotechar, header_row = candidates[0], '"', 0
+    else:
+        _, delimiter, quotechar, header_row = best
+
+    has_header = _detect_header(lines, delimiter, quotechar, header_row) if lines else True
+    detection.update({
+        'delimiter': delimiter,
+        'quotechar': quotechar,
+        'header_row': header_row,
+        'has_header': has_header,
+    })
+    logger.info(f"Detected format for {filepath}: {detection}")
+    return detection
+
+
+def read_csv_kwargs(detection):
+    """Translate a detection result into keyword arguments for ``pd.read_csv``."""
+    return {
+        'encoding': detection.get('encoding', 'utf-8'),
+        'sep': detection.get('delimiter', ','),
+        'quotechar': detection.get('quotechar', '"'),
+        'skiprows': detection.get('header_row', 0) or None,
+        'header': 0 if detection.get('has_header', True) else None,
+    }
+
+
+def count_rows(filepath, detection, block_size=16 * 1024 * 1024):
+    """Count the data rows of a delimited text file without parsing it.
+    
+    Newlines are counted over a memory map in fixed-size blocks, so the cost is a
+    sequential scan with constant memory. The scan walks code units of the
+    encoding, so a UTF-16 newline is only matched on a character boundary, and a
+    newline preceded by an odd number of quote characters lies in a quoted field
+    and does not end a row. A quote left open at the end of the file means the
+    quotes do not pair up, and the rows are counted by the parser instead.
+    """
+    if os.path.getsize(filepath) == 0:
+        return 0
+    
+    encoding = detection.get('encoding', 'utf-8')
+    unit = np.dtype('u1')
+    if encoding.startswith('utf-16'):
+        # The BOM tells the byte order; newline must be searched in that order
+        with open(filepath, 'rb') as f:
+            little = encoding.endswith('le') or (not encoding.endswith('be') and f.read(2) == codecs.BOM_UTF16_LE)
+        unit = np.dtype('<u2' if little else '>u2')
+    newline = ord('\n')
+    quote = ord(detection.get('quotechar') or '"')
+    block_size -= block_size % unit.itemsize
+    
+    lines, quoted = 0, False
+    with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm) - len(mm) % unit.itemsize
+        if not size:
+            return 0
+        for start in range(0, size, block_size):
+            units = np.frombuffer(mm[start:min(start + block_size, size)], dtype=unit)
+            newlines = units == newline
+            quotes = np.flatnonzero(units == quote)
+            if len(quotes) or quoted:
+                # Quotes before each newline, counting one still open from the previous block
+                before = np.searchsorted(quotes, np.flatnonzero(newlines)) + quoted
+                lines += int(np.count_nonzero(before % 2 == 0))
+                quoted ^= bool(len(quotes) % 2)
+            else:
+                lines += int(np.count_nonzero(newlines))
+        if units[-1] != newline:
+            # Last line has no trailing newline
+            lines += 1
+    
+    if quoted:
+        return _parsed_rows(filepath, detection)
+    skipped = detection.get('header_row', 0) or 0
+    if detection.get('has_header', True):
+        skipped += 1
+    return max(lines - skipped, 0)
+
+
+def _parsed_rows(filepath, detection, chunksize=100000):
+    """Count data rows by parsing the first column of the file in chunks."""
+    reader = pd.read_csv(filepath, usecols=[0], chunksize=chunksize, **read_csv_kwargs(detection))
+    return sum(len(chunk) for chunk in reader)
@@ -0,0 +1,181 @@
+import json
+import pandas as pd
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Extensions of JSON Lines files (one JSON record per line)
+JSON_LINES_EXTENSIONS = ('ndjson', 'jsonl')
+JSON_EXTENSIONS = ('json',) + JSON_LINES_EXTENSIONS
+
+# Characters read from the file per refill of the array parser's buffer
+READ_SIZE = 1024 * 1024
+
+# Separator between parent and child keys of flattened nested fields
+FLATTEN_SEP = '.'
+
+DEFAULT_BATCH_SIZE = 1000
+
+_decoder = json.JSONDecoder()
+
+
+def _skip_whitespace(text, pos):
+    while pos < len(text) and text[pos] in ' \t\r\n':
+        pos += 1
+    return pos
+
+
+def json_layout(text, file_type='json'):
+    """Tell how the records of a JSON file are laid out from its first characters.
+    
+    Returns:
+        str: 'lines' for one record per line, 'array' for a top-level array of
+        records, or 'document' for any other JSON value (read in one piece)
+    """
+    if file_type in JSON_LINES_EXTENSIONS:
+        return 'lines'
+    pos = _skip_whitespace(text, 0)
+    if text[pos:pos + 1] == '[':
+        return 'array'
+    try:
+        _, end = _decoder.raw_decode(text, pos)
+    except json.JSONDecodeError:
+        # The first value does not fit in the sample, so it is one large document
+        return 'document'
+    rest = text[end:].lstrip(' \t\r')
+    if rest.startswith('\n') and rest.lstrip().startswith(('{', '[')):
+        return 'lines'
+    return 'document'
+
+
+def iter_json_lines(filepath, encoding='utf-8'):
+    """Yield the records of a JSON Lines file one line at a time."""
+    with open(filepath, 'r', encoding=encoding) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON on line {number}: {e.msg}")
+
+
+def iter_json_array(filepath, encoding='utf-8', read_size=READ_SIZE):
+    """Yield the elements of a top-level JSON array without loading the file.
+    
+    The file is read in ``read_size`` blocks and each element is decoded with
+    ``JSONDecoder.raw_decode`` as soon as it is complete, so memory is bounded
+    by the largest element rather than by the whole document.
+    """
+    with open(filepath, 'r', encoding=encoding) as f:
+        buffer = f.read(read_size)
+        eof = not buffer
+        pos = _skip_whitespace(buffer, 0)
+        if buffer[pos:pos + 1] != '[':
+            raise ValueError("JSON content is not an array")
+        pos += 1
+        expect_value = True
+        
+        while True:
+            pos = _skip_whitespace(buffer, pos)
+            if pos >= len(buffer):
+                if eof:
+                    raise ValueError("Unexpected end of JSON array")
+                buffer, pos = f.read(read_size), 0
+                eof = not buffer
+                continue
+            
+            char = buffer[pos]
+            if char == ']':
+                return
+            if not expect_value:
+                if char != ',':
+                    raise ValueError(f"Expected ',' or ']' in JSON array, found {char!r}")
+                pos += 1
+                expect_value = True
+                continue
+            
+            try:
+                value, end = _decoder.raw_decode(buffer, pos)
+                # A number or literal ending at the buffer edge may continue in the next block
+                complete = end < len(buffer) or eof
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise ValueError(f"Invalid JSON at character {e.pos}: {e.msg}")
+                complete = False
+            if not complete:
+                more = f.read(read_size)
+                eof = not more
+                # Drop what has already been parsed before growing the buffer
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            
+            yield value
+            pos = end
+            expect_value = False
+
+
+def flatten_records(records):
+    """Build a DataFrame from JSON records, expanding nested objects into columns."""
+    if records and all(isinstance(record, dict) for record in records):
+        return pd.json_normalize(records, sep=FLATTEN_SEP)
+    return pd.DataFrame(records)
+
+
+def iter_json_batches(filepath, detection, batch_size=DEFAULT_BATCH_SIZE):
+    """Stream a JSON or JSON Lines file as flattened DataFrame batches.
+    
+    Records are grouped ``batch_size`` at a time and nested objects become
+    ``parent.child`` columns. Every batch carries the columns of the batches
+    before it so they can be appended to one table; a field first seen in a
+    later batch is added after the existing columns (which a Parquet writer
+    that fixed its schema on the first batch rejects). JSON documents that are
+    not arrays of records (e.g. pandas' column-oriented output) are read with
+    ``pd.read_json`` in one piece and then sliced.
+    
+    Args:
+        filepath: path of the file
+        detection: format detected by ``detect_file_format``
+        batch_size: records per DataFrame
+    """
+    encoding = detection.get('encoding', 'utf-8')
+    layout = detection.get('json_layout', 'document')
+    if layout == 'document':
+        df = pd.read_json(filepath, encoding=encoding)
+        for start in range(0, len(df), batch_size):
+            yield df.iloc[start:start + batch_size]
+        if len(df) == 0:
+            yield df
+        return
+    
+    records = iter_json_lines(filepath, encoding) if layout == 'lines' else iter_json_array(filepath, encoding)
+    columns = []
+    batch = []
+    yielded = False
+    
+    def emit(batch):
+        df = flatten_records(batch)
+        new_columns = [col for col in df.columns if col not in columns]
+        if new_columns and columns:
+            logger.info(f"JSON fields first seen after the first batch: {new_columns}")
+        columns.extend(new_columns)
+        return df.reindex(columns=columns)
+    
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield emit(batch)
+            yielded = True
+            batch = []
+    if batch or not yielded:
+        yield emit(batch)
+
+
+def read_json_file(filepath, detection):
+    """Read a whole JSON or JSON Lines file into one flattened DataFrame."""
+    if detection.get('json_layout', 'document') == 'document':
+        return pd.read_json(filepath, encoding=detection.get('encoding', 'utf-8'))
+    batches = list(iter_json_batches(filepath, detection, batch_size=50000))
+    columns = batches[-1].columns
+    return pd.concat([batch.reindex(columns=columns) for batch in batches], ignore_index=True)
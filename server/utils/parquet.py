@@ -0,0 +1,459 @@
+import itertools
+import math
+import os
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from utils.logging import get_logger
+from utils.errors import InvalidRequest
+from utils.schema_inference import SchemaMismatch
+
+logger = get_logger(__name__)
+
+# Root file of a partitioned dataset holding the schema of the whole dataset
+COMMON_METADATA = '_common_metadata'
+
+# Schema metadata key recording the partition column of a partitioned dataset
+PARTITION_KEY = b'partition_by'
+
+# Codecs stored datasets can be written with; 'none' leaves pages uncompressed
+CODECS = ('zstd', 'snappy', 'lz4', 'gzip', 'none')
+
+# Rows per row group of stored datasets when no size is configured
+DEFAULT_ROW_GROUP_SIZE = 1024 * 1024
+
+# Comparison operators accepted in read filters
+FILTER_OPS = ('==', '!=', '<', '<=', '>', '>=', 'in', 'not in')
+
+
+def arrow_schema(df):
+    """Build the Arrow schema for a DataFrame chunk.
+    
+    Columns that are entirely null in the chunk have no type yet, so they are
+    widened to string so that later chunks with values can still be appended.
+    """
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(i, field.with_type(pa.string()))
+    return schema
+
+
+def _untyped_columns(df):
+    # Columns arrow_schema widened to string for lack of values
+    return {field.name for field in pa.Schema.from_pandas(df, preserve_index=False) if pa.types.is_null(field.type)}
+
+
+def resolve_codec(codec, level=None):
+    """Validate a codec and compression level for the Parquet writers.
+    
+    Returns:
+        tuple: (codec, level), with level None when the codec's default is used
+    """
+    codec = str(codec or 'none').lower()
+    if codec not in CODECS:
+        raise InvalidRequest(f"Unsupported codec: {codec}. Supported: {list(CODECS)}")
+    if level is None:
+        return codec, None
+    level = int(level)
+    if codec == 'none' or not pa.Codec.supports_compression_level(codec):
+        raise InvalidRequest(f"Codec {codec} does not take a compression level")
+    low, high = pa.Codec.minimum_compression_level(codec), pa.Codec.maximum_compression_level(codec)
+    if not low <= level <= high:
+        raise InvalidRequest(f"Compression level of {codec} must be between {low} and {high}")
+    return codec, level
+
+
+def _string_columns(chunk):
+    # Parquet column names must be strings (headerless files use integers)
+    if not all(isinstance(col, str) for col in chunk.columns):
+        chunk = chunk.set_axis([str(col) for col in chunk.columns], axis=1)
+    return chunk
+
+
+def _chunk_table(chunk, schema, rows, untyped=()):
+    """Convert a chunk to an Arrow table with the schema of the first chunk.
+    
+    Values are not cast to fit the schema (numbers to text, say), which would
+    change them without notice. Only ``untyped`` columns, which had no values
+    in the first chunk, take later values as text.
+    
+    Raises:
+        SchemaMismatch: for a later chunk with values the schema cannot hold,
+            which the caller may fix by reading the column as text
+    """
+    extra = [col for col in chunk.columns if col not in schema.names]
+    if extra:
+        # from_pandas would silently drop them
+        raise InvalidRequest(f"Chunk starting at row {rows} adds columns {extra} "
+                             f"missing from the first chunk")
+    try:
+        return pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    arrays = []
+    for field in schema:
+        try:
+            arrays.append(pa.Array.from_pandas(chunk[field.name], type=field.type))
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            if field.name not in untyped:
+                message = (f"Chunk starting at row {rows} does not match the schema "
+                           f"of the first chunk: {str(e)}")
+                raise SchemaMismatch(field.name, message) if rows else InvalidRequest(message)
+            arrays.append(pa.Array.from_pandas(chunk[field.name]).cast(pa.string()))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def write_parquet(data, path, compression=None, row_group_size=None, compression_level=None):
+    """Write a DataFrame or an iterable of DataFrame chunks to a Parquet file.
+    
+    Each chunk is appended as its own row group, so peak memory tracks the
+    chunk size rather than the dataset size. The first chunk fixes the schema.
+    
+    Returns:
+        dict: rows, columns and row_groups written
+    """
+    chunks = [data] if isinstance(data, pd.DataFrame) else data
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    writer = None
+    schema = None
+    untyped = ()
+    rows = 0
+    
+    try:
+        for chunk in chunks:
+            chunk = _string_columns(chunk)
+            if schema is None:
+                schema = arrow_schema(chunk)
+                untyped = _untyped_columns(chunk)
+                writer = pq.ParquetWriter(tmp_path, schema, compression=compression or 'none',
+                                          compression_level=compression_level)
+            writer.write_table(_chunk_table(chunk, schema, rows, untyped), row_group_size=row_group_size)
+            rows += len(chunk)
+        
+        if writer is None:
+            raise ValueError("No data to write")
+        writer.close()
+        writer = None
+        os.replace(tmp_path, path)
+        row_groups = pq.ParquetFile(path).metadata.num_row_groups
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    
+    logger.info(f"Wrote {rows} rows in {row_groups} row groups to {path}")
+    return {
+        "rows": rows,
+        "columns": schema.names,
+        "row_groups": row_groups
+    }
+
+
+def _partition_field(field):
+    # Partition values live in directory names, so categories are stored as plain values
+    if pa.types.is_dictionary(field.type):
+        return pa.field(field.name, field.type.value_type)
+    return field
+
+
+def delete_parquet(path):
+    """Remove a Parquet file or a partitioned dataset directory, if it exists.
+    
+    Raises:
+        InvalidRequest: if ``path`` is a directory without ``_common_metadata``,
+            which :func:`write_partitioned` never leaves behind
+    """
+    if os.path.isdir(path):
+        if not os.path.exists(os.path.join(path, COMMON_METADATA)):
+            raise InvalidRequest(f"{path} is a directory but not a partitioned dataset")
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def write_partitioned(data, root, partition_by, compression=None, row_group_size=None, compression_level=None):
+    """Write a DataFrame or an iterable of DataFrame chunks as a hive-partitioned dataset.
+    
+    Rows go to ``root/<partition_by>=<value>/`` directories, one file per
+    chunk and value, so reads filtering on the partition column skip whole
+    directories. The schema of the whole dataset, including the partition
+    column, is kept in ``root/_common_metadata``. ``root`` is replaced
+    atomically, whether it was a file or a directory.
+    
+    Returns:
+        dict: rows, columns, row_groups and files written
+    """
+    chunks = iter([data] if isinstance(data, pd.DataFrame) else data)
+    first = next(chunks, None)
+    if first is None:
+        raise ValueError("No data to write")
+    first = _string_columns(first)
+    schema = arrow_schema(first)
+    untyped = _untyped_columns(first)
+    if partition_by not in schema.names:
+        raise InvalidRequest(f"Partition column {partition_by} is not in the dataset")
+    index = schema.get_field_index(partition_by)
+    write_schema = schema.set(index, _partition_field(schema.field(index)))
+    tmp_root = f"{root}.{os.getpid()}.tmp"
+    rows = 0
+    
+    def batches():
+        nonlocal rows
+        for chunk in itertools.chain([first], chunks):
+            chunk = _string_columns(chunk)
+            table = _chunk_table(chunk, schema, rows, untyped).cast(write_schema)
+            rows += len(chunk)
+            yield from table.to_batches()
+    
+    try:
+        shutil.rmtree(tmp_root, ignore_errors=True)
+        ds.write_dataset(
+            batches(), tmp_root, schema=write_schema, format='parquet',
+            partitioning=ds.partitioning(pa.schema([write_schema.field(index)]), flavor='hive'),
+            basename_template='part-{i}.parquet',
+            max_rows_per_group=row_group_size or DEFAULT_ROW_GROUP_SIZE,
+            min_rows_per_group=0,
+            file_options=ds.ParquetFileFormat().make_write_options(compression=compression or 'none',
+                                                                   compression_level=compression_level))
+        metadata = dict(schema.metadata or {})
+        metadata[PARTITION_KEY] = partition_by.encode()
+        pq.write_metadata(schema.with_metadata(metadata), os.path.join(tmp_root, COMMON_METADATA))
+        delete_parquet(root)
+        os.replace(tmp_root, root)
+    finally:
+        # The temporary directory is ours even when a failed write left it without metadata
+        shutil.rmtree(tmp_root, ignore_errors=True)
+    
+    dataset = open_dataset(root)
+    row_groups = sum(fragment.num_row_groups for fragment in dataset.get_fragments())
+    logger.info(f"Wrote {rows} rows in {row_groups} row groups and {len(dataset.files)} files to {root}")
+    return {
+        "rows": rows,
+        "columns": schema.names,
+        "row_groups": row_groups,
+        "files": len(dataset.files)
+    }
+
+
+def open_dataset(path):
+    """Open a Parquet file or a partitioned dataset directory for scanning.
+    
+    Partitioned datasets get the schema stored in their ``_common_metadata``,
+    so the partition column keeps its type instead of one guessed from the
+    directory names.
+    """
+    if not os.path.isdir(path):
+        return ds.dataset(path, format='parquet')
+    schema = pq.read_schema(os.path.join(path, COMMON_METADATA))
+    partition_by = (schema.metadata or {})[PARTITION_KEY].decode()
+    index = schema.get_field_index(partition_by)
+    schema = schema.set(index, _partition_field(schema.field(index)))
+    return ds.dataset(path, format='parquet', schema=schema,
+                      partitioning=ds.partitioning(pa.schema([schema.field(index)]), flavor='hive'))
+
+
+def filter_expression(filters):
+    """Build a dataset filter from ``[(column, op, value), ...]``, all of which must hold.
+    
+    Filters are applied while scanning: row groups whose footer statistics
+    exclude the condition, and partitions whose value does, are never read.
+    """
+    if not filters:
+        return None
+    expression = None
+    for condition in filters:
+        try:
+            column, op, value = condition
+        except (TypeError, ValueError):
+            raise InvalidRequest(f"Filters must be (column, op, value) triples, got {condition!r}")
+        if op not in FILTER_OPS:
+            raise InvalidRequest(f"Unsupported filter operator: {op}. Supported: {list(FILTER_OPS)}")
+        field = ds.field(column)
+        if op in ('in', 'not in'):
+            term = field.isin(list(value))
+            term = ~term if op == 'not in' else term
+        else:
+            term = {
+                '==': field == value, '!=': field != value,
+                '<': field < value, '<=': field <= value,
+                '>': field > value, '>=': field >= value
+            }[op]
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def dataset_size(path):
+    """Size in bytes of a Parquet file or of every file of a partitioned dataset."""
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(folder, name))
+               for folder, _, names in os.walk(path) for name in names)
+
+
+def _file_codec(path):
+    """Codec the first column chunk of a Parquet file was written with."""
+    metadata = pq.read_metadata(path)
+    if metadata.num_row_groups == 0 or metadata.num_columns == 0:
+        return 'none'
+    codec = metadata.row_group(0).column(0).compression.lower()
+    return {'uncompressed': 'none', 'lz4_raw': 'lz4'}.get(codec, codec)
+
+
+def _needs_compaction(files, row_group_size):
+    # More files or row groups than the rows they hold need
+    footers = [pq.read_metadata(file) for file in files]
+    rows = sum(footer.num_rows for footer in footers)
+    row_groups = sum(footer.num_row_groups for footer in footers)
+    return len(files) > 1 or row_groups > max(1, math.ceil(rows / row_group_size))
+
+
+def _write_compacted(files, path, row_group_size, compression):
+    """Rewrite ``files`` (sharing one schema) as a single file of full row groups."""
+    schema = pq.read_schema(files[0])
+    buffered, rows = [], 0
+    with pq.ParquetWriter(path, schema, compression=compression) as writer:
+        for batch in ds.dataset(files, schema=schema, format='parquet').to_batches():
+            buffered.append(batch)
+            rows += batch.num_rows
+            while rows >= row_group_size:
+                table = pa.Table.from_batches(buffered, schema=schema)
+                writer.write_table(table.slice(0, row_group_size), row_group_size=row_group_size)
+                rest = table.slice(row_group_size)
+                buffered, rows = rest.to_batches(), rest.num_rows
+        if rows:
+            writer.write_table(pa.Table.from_batches(buffered, schema=schema), row_group_size=row_group_size)
+
+
+def compact_parquet(path, row_group_size=None, compression=None):
+    """Merge the small row groups and files left by appended chunks into full-size ones.
+    
+    Every chunk written by :func:`write_parquet` becomes its own row group,
+    and in a partitioned dataset its own file per partition, so datasets
+    stored in small chunks are slow to scan. They are rewritten with row
+    groups of ``row_group_size`` rows and one file per partition, streaming
+    one row group at a time, and swapped in like a new write. Datasets that
+    are already compact are left alone.
+    
+    Args:
+        path: Parquet file or partitioned dataset directory
+        row_group_size: rows per row group (None for DEFAULT_ROW_GROUP_SIZE)
+        compression: codec to rewrite with (None to keep the current one)
+    
+    Returns:
+        dict: compacted, bytes_before, bytes_after, files_before and files_after
+    """
+    row_group_size = row_group_size or DEFAULT_ROW_GROUP_SIZE
+    if os.path.isdir(path):
+        partitions = {}
+        for file in open_dataset(path).files:
+            partitions.setdefault(os.path.dirname(file), []).append(file)
+    else:
+        partitions = {os.path.dirname(path): [path]}
+    files_before = sum(len(files) for files in partitions.values())
+    bytes_before = dataset_size(path)
+    if not any(_needs_compaction(files, row_group_size) for files in partitions.values()):
+        return {'compacted': False, 'bytes_before': bytes_before, 'bytes_after': bytes_before,
+                'files_before': files_before, 'files_after': files_before}
+    
+    compression = compression or _file_codec(next(iter(partitions.values()))[0])
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        delete_parquet(tmp_path)
+        if os.path.isdir(path):
+            os.makedirs(tmp_path)
+            shutil.copy2(os.path.join(path, COMMON_METADATA), tmp_path)
+            for folder, files in partitions.items():
+                target = os.path.join(tmp_path, os.path.relpath(folder, path))
+                os.makedirs(target, exist_ok=True)
+                if _needs_compaction(files, row_group_size):
+                    _write_compacted(files, os.path.join(target, 'part-0.parquet'), row_group_size, compression)
+                else:
+                    shutil.copy2(files[0], target)
+            delete_parquet(path)
+        else:
+            _write_compacted([path], tmp_path, row_group_size, compression)
+        os.replace(tmp_path, path)
+    finally:
+        delete_parquet(tmp_path)
+    
+    bytes_after = dataset_size(path)
+    logger.info(f"Compacted {path}: {files_before} files, {bytes_before} bytes -> "
+                f"{len(partitions)} files, {bytes_after} bytes")
+    return {'compacted': True, 'bytes_before': bytes_before, 'bytes_after': bytes_after,
+            'files_before': files_before, 'files_after': len(partitions)}
+
+
+def _stat_value(value):
+    # Footer statistics come back as Python scalars, dates, datetimes or bytes
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def read_footer(path):
+    """Summarise a Parquet file from its footer, without decoding any data page.
+    
+    Per-column statistics are merged across row groups; ``min``/``max`` are
+    None when a row group was written without them. For a partitioned
+    dataset the footers of all its files are merged; the partition column
+    has no statistics.
+    
+    Returns:
+        dict: rows, columns, dtypes, row_groups and column_stats
+            (null_count, min and max per column)
+    """
+    if os.path.isdir(path):
+        dataset = open_dataset(path)
+        footers = [pq.read_metadata(file) for file in dataset.files]
+        schema = pq.read_schema(os.path.join(path, COMMON_METADATA))
+    else:
+        footers = [pq.read_metadata(path)]
+        schema = footers[0].schema.to_arrow_schema()
+    row_groups = [footer.row_group(i) for footer in footers for i in range(footer.num_row_groups)]
+    stats = {}
+    for row_group in row_groups:
+        for j in range(row_group.num_columns):
+            column = row_group.column(j)
+            name = column.path_in_schema
+            merged = stats.setdefault(name, {'null_count': 0, 'min': None, 'max': None, 'complete': True})
+            statistics = column.statistics
+            if statistics is None:
+                merged['complete'] = False
+                merged['null_count'] = None
+                continue
+            if merged['null_count'] is not None and statistics.has_null_count:
+                merged['null_count'] += statistics.null_count
+            else:
+                merged['null_count'] = None
+            if not statistics.has_min_max:
+                # An all-null row group has no min/max but does not widen the range
+                if statistics.has_null_count and statistics.null_count == column.num_values:
+                    continue
+                merged['complete'] = False
+                continue
+            if merged['min'] is None or statistics.min < merged['min']:
+                merged['min'] = statistics.min
+            if merged['max'] is None or statistics.max > merged['max']:
+                merged['max'] = statistics.max
+    
+    column_stats = {}
+    for name, merged in stats.items():
+        complete = merged.pop('complete')
+        column_stats[name] = {
+            'null_count': merged['null_count'],
+            'min': _stat_value(merged['min']) if complete else None,
+            'max': _stat_value(merged['max']) if complete else None
+        }
+    return {
+        'rows': sum(footer.num_rows for footer in footers),
+        'columns': schema.names,
+        'dtypes': {field.name: str(field.type) for field in schema},
+        'row_groups': len(row_groups),
+        'column_stats': column_stats
+    }
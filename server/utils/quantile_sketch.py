@@ -0,0 +1,220 @@
+import math
+import numpy as np
+
+# Items kept by the top compactor; the rank error shrinks roughly as 1/k
+DEFAULT_K = 200
+
+# Smallest capacity of the lower compactors
+MIN_CAPACITY = 8
+
+# Each compactor below the top holds this share of the capacity of the one above
+CAPACITY_RATIO = 2 / 3
+
+
+def rank_error(k=DEFAULT_K):
+    """Normalized rank error of a quantile from a sketch with parameter ``k``,
+    at 99% confidence (about 1.3% for the default k=200)."""
+    return 2.296 / k ** 0.9723
+
+
+def k_for_error(error):
+    """Smallest ``k`` whose :func:`rank_error` is at most ``error`` (a fraction, e.g. 0.01)."""
+    if not 0 < error < 1:
+        raise ValueError(f"Quantile error must be between 0 and 1, got {error}")
+    return max(MIN_CAPACITY, int(math.ceil((2.296 / error) ** (1 / 0.9723))))
+
+
+class QuantileSketch:
+    """KLL quantile sketch of a stream of numbers.
+    
+    Values are added in batches to the bottom compactor. A compactor that
+    outgrows its capacity sorts its items and promotes every other one,
+    starting at a random offset, to the compactor above, where each item
+    stands for twice as many values. Memory stays O(k log(n / k)) however
+    many values are added, and a quantile's rank is off by at most
+    :func:`rank_error` of the count with high probability. Until the first
+    compaction the sketch holds every value and answers exactly, with the
+    same linear interpolation as ``Series.quantile``. The minimum and maximum
+    are tracked exactly.
+    
+    Sketches of parts of a stream (chunks, or the rows a worker process saw)
+    combine with :meth:`merge` into a sketch of the whole with the same error
+    bound, and round-trip through :meth:`to_dict` so they can be stored.
+    """
+    
+    def __init__(self, k=DEFAULT_K, seed=0):
+        self.k = k
+        self.count = 0
+        self.min = float('nan')
+        self.max = float('nan')
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+    
+    @classmethod
+    def for_error(cls, error, seed=0):
+        """Sketch whose quantiles are within ``error`` in rank (see :func:`k_for_error`)."""
+        return cls(k_for_error(error), seed)
+    
+    @property
+    def error(self):
+        return rank_error(self.k)
+    
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(MIN_CAPACITY, int(math.ceil(self.k * CAPACITY_RATIO ** depth)))
+    
+    def update(self, values):
+        """Add a batch of values; missing values are skipped."""
+        values = np.asarray(values, dtype='float64')
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        self.min = float(np.fmin(self.min, values.min()))
+        self.max = float(np.fmax(self.max, values.max()))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+    
+    def merge(self, other):
+        """Add the values summarised by ``other``, a sketch with the same ``k``.
+        
+        Returns:
+            QuantileSketch: this sketch
+        """
+        if other.k != self.k:
+            raise ValueError(f"Cannot merge sketches with k={self.k} and k={other.k}")
+        if not other.count:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self.min = float(np.fmin(self.min, other.min))
+        self.max = float(np.fmax(self.max, other.max))
+        self._compress()
+        return self
+    
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays behind at this level
+                keep = len(items) % 2
+                promoted = items[keep:][self._rng.integers(2)::2]
+                self.levels[level] = items[:keep]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+    
+    def to_dict(self):
+        """JSON-serialisable state of the sketch (see :meth:`from_dict`)."""
+        return {
+            'k': self.k,
+            'count': self.count,
+            'min': None if math.isnan(self.min) else self.min,
+            'max': None if math.isnan(self.max) else self.max,
+            'levels': [level.tolist() for level in self.levels]
+        }
+    
+    @classmethod
+    def from_dict(cls, data, seed=0):
+        sketch = cls(data['k'], seed)
+        sketch.count = data['count']
+        sketch.min = float('nan') if data['min'] is None else data['min']
+        sketch.max = float('nan') if data['max'] is None else data['max']
+        sketch.levels = [np.asarray(level, dtype='float64') for level in data['levels']]
+        return sketch
+    
+    def quantiles(self, qs):
+        """Estimate the quantiles ``qs`` (each in [0, 1]); NaN for an empty sketch."""
+        if not self.count:
+            return [float('nan')] * len(qs)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2 ** h, dtype='int64')
+                                  for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items = items[order]
+        # Position of the last value each item stands for, in the sorted stream
+        last = np.cumsum(weights[order]) - 1
+        total = last[-1] + 1
+        
+        def value_at(rank):
+            return items[min(np.searchsorted(last, rank), len(items) - 1)]
+        
+        results = []
+        for q in qs:
+            position = q * (total - 1)
+            low = math.floor(position)
+            fraction = position - low
+            value = value_at(low)
+            if fraction:
+                value += (value_at(low + 1) - value) * fraction
+            results.append(float(value))
+        return results
+
+
+class ColumnSketches:
+    """Quantile sketches of the numeric columns of a stream of DataFrame chunks.
+    
+    Columns are keyed by name as a string. A column that is not numeric in
+    every chunk is not sketched. ``rows`` counts the rows seen, so stored
+    sketches can be checked against the data they describe.
+    """
+    
+    def __init__(self, k=DEFAULT_K):
+        self.k = k
+        self.rows = 0
+        self.columns = {}
+        self._skipped = set()
+    
+    def update(self, chunk):
+        """Add the numeric values of a chunk."""
+        self.rows += len(chunk)
+        numeric = {str(column) for column in chunk.select_dtypes(include=np.number).columns}
+        for column in chunk.columns:
+            name = str(column)
+            if name not in numeric:
+                self._skipped.add(name)
+                self.columns.pop(name, None)
+            elif name not in self._skipped:
+                sketch = self.columns.setdefault(name, QuantileSketch(self.k))
+                sketch.update(chunk[column].to_numpy(dtype='float64', na_value=np.nan))
+    
+    def merge(self, other):
+        """Add the sketches of another part of the same data (same ``k``), e.g.
+        rows another worker process sketched.
+        
+        Returns:
+            ColumnSketches: these sketches
+        """
+        self.rows += other.rows
+        self._skipped |= other._skipped
+        for name, sketch in other.columns.items():
+            if name in self._skipped:
+                self.columns.pop(name, None)
+            elif name in self.columns:
+                self.columns[name].merge(sketch)
+            else:
+                self.columns[name] = QuantileSketch.from_dict(sketch.to_dict())
+        return self
+    
+    def track(self, chunks):
+        """Pass ``chunks`` through, sketching each one on the way."""
+        for chunk in chunks:
+            self.update(chunk)
+            yield chunk
+    
+    def to_dict(self):
+        return {'k': self.k, 'rows': self.rows,
+                'columns': {name: sketch.to_dict() for name, sketch in self.columns.items()}}
+    
+    @classmethod
+    def from_dict(cls, data):
+        sketches = cls(data['k'])
+        sketches.rows = data['rows']
+        sketches.columns = {name: QuantileSketch.from_dict(sketch) for name, sketch in data['columns'].items()}
+        return sketches
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+# Seed and multiplier that fold column hashes into one row hash
+FOLD_SEED = np.uint64(0x345678)
+FOLD_MULTIPLIER = np.uint64(1000003)
+
+
+def _column_hash(values):
+    """Hash every value of a column to 64 bits."""
+    if values.dtype.kind == 'f':
+        # drop_duplicates treats -0.0 as 0.0 and every NaN as equal, but the
+        # raw bits differ
+        values = values.where(values.notna(), np.nan) + 0.0
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+
+class RowFingerprints:
+    """64-bit fingerprints of the rows of a DataFrame, kept in step with it.
+    
+    Every column is hashed once with ``pd.util.hash_pandas_object`` and the
+    column hashes are folded into one fingerprint per row, so duplicate
+    counts and dedupe masks, for all columns or any subset, come from a
+    single pass over a uint64 vector instead of rehashing the frame.
+    
+    The fingerprints follow the frame as it is cleaned: :meth:`take` drops
+    the same rows from every cached hash, and :meth:`invalidate` forgets the
+    hashes of columns whose values changed, which are recomputed on next use.
+    Two different rows share a fingerprint with probability about 2**-64 per
+    pair, so counts match ``drop_duplicates`` for any realistic row count.
+    """
+    
+    def __init__(self, df):
+        self.df = df
+        self._columns = {}
+        self._rows = {}
+    
+    def _column_hashes(self, column):
+        hashes = self._columns.get(column)
+        if hashes is None:
+            hashes = _column_hash(self.df[column])
+            self._columns[column] = hashes
+        return hashes
+    
+    def fingerprints(self, subset=None):
+        """Return the fingerprint of every row over ``subset`` (all columns if None)."""
+        columns = tuple(self.df.columns if subset is None else
+                        [subset] if isinstance(subset, str) else subset)
+        rows = self._rows.get(columns)
+        if rows is None:
+            rows = np.full(len(self.df), FOLD_SEED, dtype=np.uint64)
+            for column in columns:
+                rows ^= self._column_hashes(column)
+                rows *= FOLD_MULTIPLIER
+            self._rows[columns] = rows
+        return rows
+    
+    def duplicated(self, subset=None, keep='first'):
+        """Boolean mask of duplicate rows, as ``DataFrame.duplicated`` returns."""
+        return pd.Series(self.fingerprints(subset), copy=False).duplicated(keep=keep).to_numpy()
+    
+    def duplicate_count(self, subset=None):
+        """Number of rows ``drop_duplicates(subset)`` would remove."""
+        return int(self.duplicated(subset).sum())
+    
+    def take(self, df, mask):
+        """Follow ``df``, the rows of the tracked frame where ``mask`` is True."""
+        mask = np.asarray(mask, dtype=bool)
+        if len(mask) != len(self.df) or len(df) != int(mask.sum()):
+            raise ValueError("Row mask does not match the tracked frame")
+        self.df = df
+        self._columns = {column: hashes[mask] for column, hashes in self._columns.items()}
+        self._rows = {columns: rows[mask] for columns, rows in self._rows.items()}
+    
+    def invalidate(self, df, columns=None):
+        """Follow ``df``, the tracked frame with new values in ``columns`` (all if None)."""
+        if len(df) != len(self.df):
+            raise ValueError("Frame does not have the tracked number of rows")
+        self.df = df
+        if columns is None:
+            self._columns.clear()
+            self._rows.clear()
+            return
+        columns = set(columns)
+        for column in columns:
+            self._columns.pop(column, None)
+        self._rows = {key: rows for key, rows in self._rows.items() if not columns.intersection(key)}
@@ -0,0 +1,281 @@
+import hashlib
+import itertools
+import json
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Bumped when the layout of inferred schemas changes
+SCHEMA_VERSION = 1
+
+# A text column is a categorical candidate when it has at most this many
+# distinct values and they make up at most this share of its non-null values
+CATEGORICAL_MAX_UNIQUE = 1000
+CATEGORICAL_MAX_RATIO = 0.5
+
+# Text values tried against each date format before parsing the whole column
+DATE_SAMPLE_SIZE = 1000
+
+# Date formats recognised in text columns, tried in order (ISO first, then day-first)
+DATE_FORMATS = [
+    '%Y-%m-%d',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y/%m/%d',
+    '%d/%m/%Y',
+    '%m/%d/%Y',
+    '%d-%m-%Y',
+    '%d.%m.%Y',
+    '%d/%m/%Y %H:%M',
+    '%m/%d/%Y %H:%M',
+    '%d %b %Y',
+    '%b %d, %Y',
+]
+
+# Format of date columns the CSV reader parsed itself
+ISO_FORMAT = 'ISO8601'
+
+_ARROW_TYPES = {
+    'int64': pa.int64(),
+    'float64': pa.float64(),
+    'bool': pa.bool_(),
+    'object': pa.string(),
+    'string': pa.string(),
+    'category': pa.dictionary(pa.int32(), pa.string()),
+}
+
+
+class SchemaMismatch(ValueError):
+    """A chunk of a stream has values its schema, inferred from an earlier
+    chunk, cannot represent."""
+    
+    def __init__(self, column, message):
+        super().__init__(message)
+        self.column = column
+
+
+def _date_format(values):
+    """Return the format every value of a text column parses with, or None."""
+    values = values.dropna()
+    sample = values.head(DATE_SAMPLE_SIZE)
+    if sample.empty or not all(isinstance(value, str) for value in sample):
+        return None
+    for fmt in DATE_FORMATS:
+        if pd.to_datetime(sample, format=fmt, errors='coerce').notna().all():
+            # The sample may not show every value, so check the full column once
+            if pd.to_datetime(values, format=fmt, errors='coerce').notna().all():
+                return fmt
+            return None
+    return None
+
+
+def _is_categorical(values):
+    values = values.dropna()
+    if values.empty:
+        return False
+    try:
+        unique = values.nunique()
+    except TypeError:
+        # Lists and dicts from JSON records cannot be hashed
+        return False
+    return unique <= CATEGORICAL_MAX_UNIQUE and unique <= CATEGORICAL_MAX_RATIO * len(values)
+
+
+def infer_schema(df, text_columns=(), date_formats=None):
+    """Infer column types, categorical candidates, date formats and nullability.
+    
+    Args:
+        df: DataFrame to infer the schema of
+        text_columns: names of text columns not to treat as dates
+        date_formats: format of each parsed date column, by name, for data
+            written back as text with :func:`format_dates` (other parsed
+            date columns are ISO 8601)
+    
+    Returns:
+        dict: ``version`` and ``columns``, mapping each column name to its
+        ``dtype``, ``nullable``, ``categorical`` and ``date_format``
+    """
+    columns = {}
+    for col in df.columns:
+        values = df[col]
+        info = {
+            'dtype': str(values.dtype),
+            'nullable': bool(values.isna().any()),
+            'categorical': False,
+            'date_format': None
+        }
+        if pd.api.types.is_object_dtype(values.dtype) or isinstance(values.dtype, pd.StringDtype):
+            if str(col) not in text_columns:
+                info['date_format'] = _date_format(values)
+            if info['date_format']:
+                info['dtype'] = 'datetime64[ns]'
+            elif _is_categorical(values):
+                info['categorical'] = True
+                info['dtype'] = 'category'
+        elif pd.api.types.is_datetime64_any_dtype(values.dtype):
+            # Already parsed by the reader, which only recognises ISO 8601 text
+            info['date_format'] = (date_formats or {}).get(str(col), ISO_FORMAT)
+        elif isinstance(values.dtype, pd.CategoricalDtype):
+            info['categorical'] = True
+        columns[str(col)] = info
+    
+    logger.info(f"Inferred schema: {sum(c['categorical'] for c in columns.values())} categorical, "
+                f"{sum(bool(c['date_format']) for c in columns.values())} date columns")
+    return {'version': SCHEMA_VERSION, 'columns': columns}
+
+
+def apply_schema(df, schema, categorical=True, strict=False):
+    """Convert the columns of a DataFrame to the types of a stored schema.
+    
+    Columns that already have the stored type are left untouched, so this is
+    cheap on data read with :func:`pandas_read_options`. Columns missing from
+    the schema keep their types.
+    
+    Args:
+        df: DataFrame to convert
+        schema: schema returned by :func:`infer_schema`
+        categorical: convert categorical candidates to ``category`` (if False,
+            categorical columns are returned as plain object columns)
+        strict: raise SchemaMismatch for values that do not parse with their
+            column's date format, instead of reading them as NaT
+    """
+    if not schema:
+        return df
+    # Shallow copy, so the caller's frame (possibly a slice) is not modified
+    df = df.copy(deep=False)
+    for col in df.columns:
+        info = schema['columns'].get(str(col))
+        if info is None:
+            continue
+        current = df[col].dtype
+        if info['date_format']:
+            if not pd.api.types.is_datetime64_any_dtype(current):
+                parsed = pd.to_datetime(df[col], format=info['date_format'], errors='coerce')
+                if strict:
+                    unparsed = df[col][parsed.isna() & df[col].notna()]
+                    if not unparsed.empty:
+                        raise SchemaMismatch(str(col), f"Column {col} has values such as {unparsed.iloc[0]!r} "
+                                                       f"that do not match its date format {info['date_format']}")
+                df[col] = parsed
+        elif info['categorical'] and categorical:
+            if not isinstance(current, pd.CategoricalDtype):
+                df[col] = df[col].astype('category')
+        elif isinstance(current, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+    return df
+
+
+def infer_schema_chunks(chunks, text_columns=(), date_formats=None):
+    """Infer a schema from the first of a stream of chunks and apply it to all of them.
+    
+    A date format found in the first chunk may not fit later ones. Every
+    chunk is checked, and the first value that does not parse raises
+    SchemaMismatch rather than being read as NaT. The column is then text in
+    the returned schema, so a caller that gives up on the typed chunks can
+    still store the schema; a caller that can read the data again passes the
+    column in ``text_columns``.
+    
+    Args:
+        chunks: iterable of DataFrame chunks
+        text_columns, date_formats: as for :func:`infer_schema`
+    
+    Returns:
+        tuple: (schema, iterator of converted chunks); schema is None for an empty stream
+    """
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return None, iter(())
+    schema = infer_schema(first, text_columns, date_formats)
+    
+    def typed():
+        for chunk in itertools.chain([first], chunks):
+            try:
+                yield apply_schema(chunk, schema, strict=True)
+            except SchemaMismatch as e:
+                logger.warning(f"{e}; the column is read as text")
+                schema['columns'][e.column].update(dtype='object', date_format=None)
+                raise
+    
+    return schema, typed()
+
+
+def date_formats(schema):
+    """Source formats of the date columns of a stored schema that are not ISO 8601, by name."""
+    if not schema:
+        return {}
+    return {name: info['date_format'] for name, info in schema['columns'].items()
+            if info['date_format'] and info['date_format'] != ISO_FORMAT}
+
+
+def format_dates(df, formats):
+    """Write parsed date columns back as text in the format they were read with.
+    
+    Cleaned files and previews show dates the way the uploaded file wrote
+    them. Columns missing from ``formats`` (see :func:`date_formats`) keep
+    their timestamps.
+    """
+    columns = [col for col in df.columns
+               if str(col) in formats and pd.api.types.is_datetime64_any_dtype(df[col].dtype)]
+    if not columns:
+        return df
+    df = df.copy(deep=False)
+    for col in columns:
+        # None of the formats has fractions of a second, which Arrow would print for ns timestamps
+        seconds = pa.array(df[col]).cast(pa.timestamp('s'), safe=False)
+        text = pc.strftime(seconds, format=formats[str(col)])
+        df[col] = pd.Series(text.to_pandas(), index=df.index, dtype=object)
+    return df
+
+
+def schema_digest(schema):
+    """Hash of a stored schema (None for no schema), which changes whenever
+    any column's type, date format or categorical flag does."""
+    if not schema:
+        return None
+    return hashlib.sha1(json.dumps(schema, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def pandas_read_options(schema, has_header=True):
+    """Build ``pd.read_csv`` arguments that parse columns straight to their stored types."""
+    if not schema:
+        return {}
+    key = (lambda name: name) if has_header else int
+    dtype = {}
+    parse_dates = []
+    date_format = {}
+    for name, info in schema['columns'].items():
+        if info['date_format']:
+            parse_dates.append(key(name))
+            date_format[key(name)] = info['date_format']
+        elif info['dtype'] in _ARROW_TYPES:
+            dtype[key(name)] = info['dtype']
+    options = {'dtype': dtype}
+    if parse_dates:
+        options.update({'parse_dates': parse_dates, 'date_format': date_format})
+    return options
+
+
+def arrow_column_types(schema, has_header=True):
+    """Build Arrow CSV column types for the stored schema.
+    
+    ISO 8601 dates are parsed by Arrow itself. Other date columns are read as
+    text and parsed by :func:`apply_schema` with their own format, since
+    Arrow's timestamp parsers apply to every column at once.
+    """
+    if not schema:
+        return {}
+    column_types = {}
+    for i, (name, info) in enumerate(schema['columns'].items()):
+        key = name if has_header else f'f{i}'
+        if info['date_format'] == ISO_FORMAT:
+            column_types[key] = pa.timestamp('ns')
+        elif info['date_format']:
+            column_types[key] = pa.string()
+        elif info['dtype'] in _ARROW_TYPES:
+            column_types[key] = _ARROW_TYPES[info['dtype']]
+    return column_types
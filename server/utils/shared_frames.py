@@ -0,0 +1,59 @@
+from multiprocessing import shared_memory
+import pyarrow as pa
+
+
+def _write_stream(table, sink):
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _fill(block, table):
+    # Kept apart so the Arrow views of the block are gone before it is closed
+    _write_stream(table, pa.FixedSizeBufferWriter(pa.py_buffer(block.buf)))
+
+
+def _read(block, size):
+    return pa.ipc.open_stream(pa.py_buffer(block.buf)[:size]).read_all().to_pandas()
+
+
+def share_table(table):
+    """Write ``table`` as an Arrow IPC stream into a new shared memory block.
+    
+    Other processes read it with :func:`read_shared` without it being
+    pickled or piped to them. The block outlives this call; whoever reads it
+    last frees it with :func:`release_shared`.
+    
+    Returns:
+        tuple: name and size in bytes of the block
+    """
+    sizer = pa.MockOutputStream()
+    _write_stream(table, sizer)
+    size = sizer.size()
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        _fill(block, table)
+    except BaseException:
+        block.close()
+        block.unlink()
+        raise
+    block.close()
+    return block.name, size
+
+
+def read_shared(name, size):
+    """Read the table shared under ``name`` as a DataFrame (the block is left in place)."""
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return _read(block, size)
+    finally:
+        block.close()
+
+
+def release_shared(name):
+    """Free a block created by :func:`share_table`."""
+    try:
+        block = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    block.close()
+    block.unlink()
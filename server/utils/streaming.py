@@ -0,0 +1,52 @@
+import hashlib
+import os
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Bytes read from the request body per iteration
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+def save_stream(stream, path, chunk_size=STREAM_CHUNK_SIZE, max_bytes=None):
+    """Copy a binary stream to ``path`` in fixed-size chunks.
+    
+    The content hash and line statistics are computed on the same pass, so
+    memory use is bounded by ``chunk_size`` whatever the size of the stream.
+    The file only appears at ``path`` once it is complete.
+    
+    Returns:
+        dict: sha256, bytes and lines of the written content
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    newlines = 0
+    last_byte = b''
+    tmp_path = f"{path}.{os.getpid()}.part"
+    
+    try:
+        with open(tmp_path, 'wb') as f:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise ValueError(f"Upload exceeds the maximum size of {max_bytes} bytes")
+                
+                sha256.update(chunk)
+                newlines += chunk.count(b'\n')
+                last_byte = chunk[-1:]
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    
+    lines = newlines + (1 if size and last_byte != b'\n' else 0)
+    logger.info(f"Saved {size} bytes ({lines} lines) to {path}")
+    return {
+        'sha256': sha256.hexdigest(),
+        'bytes': size,
+        'lines': lines
+    }
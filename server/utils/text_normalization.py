@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from utils.errors import InvalidRequest
+
+# Options of normalize_text and their defaults, which lowercase and trim
+TEXT_OPTIONS = {
+    'lower': True,
+    'trim': True,
+    'collapse_whitespace': False,
+    'nfkc': False,
+    'strip_punctuation': False,
+    'nulls': 'keep',
+}
+
+# What happens to missing values: 'keep' leaves them missing, 'empty' turns
+# them into empty strings, 'blank' keeps them and turns strings left empty
+# into missing values as well
+NULL_MODES = ('keep', 'empty', 'blank')
+
+# Runs of Unicode whitespace (RE2's \s alone is ASCII only)
+WHITESPACE = r'[\s\p{Z}]+'
+
+# Unicode punctuation (\p{P}); symbols such as $ or + are kept
+PUNCTUATION = r'\p{P}+'
+
+# Strings sampled, evenly spaced, to estimate how many distinct strings a column holds
+CARDINALITY_SAMPLE = 10000
+
+# Dictionary encoding a column costs about as much per row as lowercasing and
+# trimming it, so only columns estimated to have at most this share of
+# distinct strings are normalized once per distinct string...
+MAX_DISTINCT_RATIO = 0.005
+
+# ...unless costly options are on (regexes, Unicode normalization), which
+# make normalizing each row several times dearer than encoding it
+COSTLY_OPTIONS = ('collapse_whitespace', 'nfkc', 'strip_punctuation')
+MAX_DISTINCT_RATIO_COSTLY = 0.2
+
+
+def text_options(options=None):
+    """Validate normalization options and fill in the defaults.
+    
+    Raises:
+        InvalidRequest: for an unknown option or null mode
+    """
+    options = dict(options or {})
+    unknown = set(options) - set(TEXT_OPTIONS)
+    if unknown:
+        raise InvalidRequest(f"Unknown text normalization options: {sorted(unknown)}. "
+                             f"Supported: {list(TEXT_OPTIONS)}")
+    options = dict(TEXT_OPTIONS, **options)
+    if options['nulls'] not in NULL_MODES:
+        raise InvalidRequest(f"Unsupported null handling: {options['nulls']}. Supported: {list(NULL_MODES)}")
+    return options
+
+
+def normalize_strings(array, lower=True, trim=True, collapse_whitespace=False, nfkc=False,
+                      strip_punctuation=False):
+    """Normalize an Arrow string array with Arrow's compute kernels.
+    
+    Steps run in a fixed order: NFKC first (so full-width and compatibility
+    characters lowercase and match like their plain forms), then lowercase,
+    punctuation, whitespace collapsing and trimming. Nulls stay null.
+    """
+    if nfkc:
+        array = pc.utf8_normalize(array, form='NFKC')
+    if lower:
+        array = pc.utf8_lower(array)
+    if strip_punctuation:
+        array = pc.replace_substring_regex(array, PUNCTUATION, '')
+    if collapse_whitespace:
+        array = pc.replace_substring_regex(array, WHITESPACE, ' ')
+    if trim:
+        array = pc.utf8_trim_whitespace(array)
+    return array
+
+
+def estimate_distinct(array, sample_size=CARDINALITY_SAMPLE):
+    """Estimate the number of distinct non-null values of an Arrow array.
+    
+    An evenly spaced sample of ``sample_size`` values with ``c`` pairs of
+    equal values suggests about ``sample_size ** 2 / 2c`` distinct values,
+    as in the birthday problem; a sample without repeats suggests that every
+    value is distinct. Skewed columns come out lower than they are, which
+    errs towards encoding columns that do repeat their values.
+    """
+    array = array.drop_null()
+    if len(array) <= sample_size:
+        return len(pc.unique(array))
+    step = len(array) / sample_size
+    sample = array.take(pa.array((np.arange(sample_size) * step).astype('int64')))
+    counts = pc.value_counts(sample).field('counts').to_numpy().astype('float64')
+    pairs = float((counts * (counts - 1) / 2).sum())
+    if not pairs:
+        return len(array)
+    return min(len(array), sample_size * (sample_size - 1) / (2 * pairs))
+
+
+def _normalize_distinct(array, options):
+    # Columns that repeat their strings are dictionary encoded, so each
+    # distinct string is normalized once and the results are spread back by
+    # index; other columns are normalized directly
+    costly = any(options.get(option) for option in COSTLY_OPTIONS)
+    ratio = MAX_DISTINCT_RATIO_COSTLY if costly else MAX_DISTINCT_RATIO
+    if estimate_distinct(array) > ratio * len(array):
+        return normalize_strings(array, **options)
+    encoded = pc.dictionary_encode(array)
+    return pc.take(normalize_strings(encoded.dictionary, **options), encoded.indices)
+
+
+def normalize_text(values, **options):
+    """Normalize the strings of a column (see :data:`TEXT_OPTIONS`).
+    
+    The strings go through Arrow's vectorized kernels, once per distinct
+    string when the column repeats them, instead of a Python call per value.
+    A column of strings comes back as an Arrow-backed ``string`` column, so
+    the result never goes through Python objects; its missing values are
+    ``pd.NA``. Columns mixing strings with other values (numbers or dates)
+    stay object columns, with the other values left as they are. Missing
+    values stay missing unless the ``nulls`` option turns them into empty
+    strings ('empty'); with 'blank' strings that end up empty become missing
+    as well. Columns that are neither object nor string are returned
+    unchanged. Lowercasing follows Arrow's Unicode rules, which differ from
+    ``str.lower`` only on a few special cases such as the dotted capital I.
+    
+    Returns:
+        pandas.Series: the normalized column
+    """
+    options = text_options(options)
+    nulls = options.pop('nulls')
+    if values.dtype != object and not isinstance(values.dtype, pd.StringDtype):
+        return values
+    try:
+        array = pa.array(values, type=pa.large_string(), from_pandas=True)
+        strings = None
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        # Mixed column: only the strings are normalized
+        strings = values.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
+        array = pa.array(values.to_numpy()[strings], type=pa.large_string())
+    
+    normalized = _normalize_distinct(array, options)
+    if nulls == 'blank':
+        normalized = pc.if_else(pc.equal(normalized, ''), pa.scalar(None, pa.large_string()), normalized)
+    if strings is None:
+        if nulls == 'empty':
+            normalized = pc.fill_null(normalized, '')
+        return pd.Series(pd.arrays.ArrowStringArray(normalized), index=values.index, name=values.name)
+    
+    result = values.to_numpy(copy=True)
+    result[strings] = normalized.to_numpy(zero_copy_only=False)
+    if nulls == 'empty':
+        result[pd.isna(result)] = ''
+    return pd.Series(result, index=values.index, name=values.name, dtype=object)
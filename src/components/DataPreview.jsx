@@ -27,9 +27,9 @@ const DataPreview = ({ dataset, refreshTrigger }) => {
 
     // Validate file type
     const fileExt = dataset.name.split('.').pop().toLowerCase();
-    const allowedTypes = ['csv', 'json', 'xlsx', 'xls', 'txt'];
+    const allowedTypes = ['csv', 'json', 'ndjson', 'jsonl', 'xlsx', 'xls', 'txt'];
     if (!allowedTypes.includes(fileExt)) {
-      setError(`Unsupported file type: ${fileExt}. Supported types: CSV, Excel, JSON, TXT`);
+      setError(`Unsupported file type: ${fileExt}. Supported types: CSV, Excel, JSON, JSON Lines, TXT`);
       return;
     }
     
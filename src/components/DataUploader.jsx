@@ -38,6 +38,7 @@ const DataUploader = ({ onUploadSuccess }) => {
       'text/csv': ['.csv'],
       'text/plain': ['.txt'],
       'application/json': ['.json'],
+      'application/x-ndjson': ['.ndjson', '.jsonl'],
       'application/vnd.ms-excel': ['.xls'],
       'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': ['.xlsx']
     },
@@ -44,11 +44,14 @@ export const uploadDataset = async (file) => {
       'application/vnd.ms-excel',
       'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
       'application/json',
+      'application/x-ndjson',
       'text/plain'
     ];
+    // Browsers often report no MIME type for JSON Lines files
+    const extension = file.name.split('.').pop().toLowerCase();
     
-    if (!allowedTypes.includes(file.type)) {
-      throw new Error(`File type ${file.type} not allowed. Supported formats: CSV, Excel, JSON, TXT`);
+    if (!allowedTypes.includes(file.type) && !['ndjson', 'jsonl'].includes(extension)) {
+      throw new Error(`File type ${file.type} not allowed. Supported formats: CSV, Excel, JSON, JSON Lines, TXT`);
     }
 
     const formData = new FormData();
@@ -92,7 +95,8 @@ export const listDatasets = async () => {
         size: dataset.size || 0,
         modified: dataset.modified || Date.now() / 1000,
         type: dataset.type || 'unknown'
-      }))
+      })),
+      nextCursor: response.data.next_cursor || null
     };
   } catch (error) {
     console.error('Error listing datasets:', error);